@@ -1,64 +1,258 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import asyncio
+import logging
+import os
+import tempfile
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from uuid import UUID
 
+from app.core.config import settings
+from app.services.faq_synthesis import faq_synthesizer
+from app.services.llm_priority import background_queue
+from app.services.summaries import summary_builder
+from app.services.prompts import prompt_cache_stats
+from app.services.model_router import router_stats
+from app.services.ollama_pool import ollama_pool
+from app.services.cancellation import cancel_on_disconnect, cancellation_stats
+from app.services.admission import admission_snapshot, gates
+from app.services.embedding_migration import embedding_migration
+from app.services.embeddings import configured_model_id
+from app.services.metrics import current_endpoint
+from app.services.snapshot import SNAPSHOT_SUFFIX
+
 from app.services.rag_service import rag_service
 from app.services.generator import generator_service # <--- NEW
 from app.services import parser as doc_parser
 from app import schemas_ai
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+async def label_endpoint(request: Request):
+    """Метрики этапов (app.services.metrics) помечаются шаблоном маршрута запроса."""
+    route = request.scope.get("route")
+    current_endpoint.set(route.path if route is not None else request.url.path)
+
+router = APIRouter(dependencies=[Depends(label_endpoint)])
 
 def get_rag_service():
     if not rag_service:
         raise HTTPException(status_code=503, detail="RAG service unavailable")
     return rag_service
 
+def _parse_file(file_path: str, filename: str):
+    if filename.endswith('.pdf'):
+        return doc_parser.parse_pdf(file_path, filename)
+    elif filename.endswith('.docx'):
+        return doc_parser.parse_docx(file_path, filename)
+    return doc_parser.parse_txt(file_path, filename)
+
+def _extract_file_text(file_path: str, filename: str) -> str:
+    """Склеивает текст файла из чанков парсера (для генерации тестов)."""
+    docs = _parse_file(file_path, filename)
+    return "\n".join(doc.page_content for doc in docs if "error" not in doc.metadata)
+
+def _schedule_background_stages(req):
+    """Необязательные фоновые этапы индексации (LLM, низкий приоритет)."""
+    if settings.FAQ_SYNTHESIS_ON_INGEST:
+        faq_synthesizer.enqueue(req.workspace_id, req.source_id, req.organization_id)
+    if settings.SUMMARY_ON_INGEST:
+        summary_builder.enqueue(req.workspace_id, req.source_id, req.organization_id)
+
 @router.post("/process-file", status_code=status.HTTP_200_OK)
 async def process_file(
     req: schemas_ai.FileProcessingRequest,
     rag: rag_service = Depends(get_rag_service)
 ):
-    print(f"Processing file {req.filename}")
-    if req.filename.endswith('.pdf'):
-        docs = doc_parser.parse_pdf(req.file_path, req.filename)
-    elif req.filename.endswith('.docx'):
-        docs = doc_parser.parse_docx(req.file_path, req.filename)
-    else:
-        docs = doc_parser.parse_txt(req.file_path, req.filename)
-        
-    text_chunks = [doc.page_content for doc in docs]
-    metadata_list = [doc.metadata for doc in docs]
-    
-    await rag.process_and_embed_chunks(str(req.workspace_id), req.source_id, text_chunks, metadata_list)
+    async with gates["ingest"].admit():
+        logger.info(f"Processing file {req.filename}")
+        docs = await asyncio.to_thread(_parse_file, req.file_path, req.filename)
+
+        text_chunks = [doc.page_content for doc in docs]
+        metadata_list = [doc.metadata for doc in docs]
+
+        await rag.process_and_embed_chunks(str(req.workspace_id), req.source_id, text_chunks, metadata_list, organization_id=req.organization_id)
+    _schedule_background_stages(req)
     return {"status": "COMPLETED"}
 
 @router.post("/process-qa", status_code=status.HTTP_200_OK)
 async def process_qa(req: schemas_ai.QASProcessingRequest, rag: rag_service = Depends(get_rag_service)):
-    docs = doc_parser.chunk_qna(req.qa_in, "Q&A")
-    await rag.process_and_embed_chunks(str(req.workspace_id), req.source_id, [d.page_content for d in docs], [d.metadata for d in docs])
+    docs = doc_parser.chunk_qna(req.qa_in, "Q&A") + [doc_parser.qna_question_doc(req.qa_in, "Q&A")]
+    async with gates["ingest"].admit():
+        await rag.process_and_embed_chunks(
+            str(req.workspace_id), req.source_id, [d.page_content for d in docs], [d.metadata for d in docs],
+            organization_id=req.organization_id,
+            embed_texts=[docs[0].page_content, req.qa_in.question]
+        )
     return {"status": "COMPLETED"}
 
 @router.post("/process-article", status_code=status.HTTP_200_OK)
 async def process_article(req: schemas_ai.ArticleProcessingRequest, rag: rag_service = Depends(get_rag_service)):
     docs = doc_parser.chunk_article(req.article_in)
-    await rag.process_and_embed_chunks(str(req.workspace_id), req.source_id, [d.page_content for d in docs], [d.metadata for d in docs])
+    async with gates["ingest"].admit():
+        await rag.process_and_embed_chunks(str(req.workspace_id), req.source_id, [d.page_content for d in docs], [d.metadata for d in docs], organization_id=req.organization_id)
+    _schedule_background_stages(req)
     return {"status": "COMPLETED"}
 
 @router.post("/delete-embeddings")
 async def delete_embeddings(req: schemas_ai.EmbeddingDeleteRequest, rag: rag_service = Depends(get_rag_service)):
-    await rag.delete_embeddings(req.collection_name, req.source_id)
+    if rag.layout == "organization":
+        collection_names = [rag.collection_name(None, req.organization_id)]
+    else:
+        # База знаний организации - всегда: там лежат общие документы, еще не привязанные к трекам
+        workspace_ids = [*req.workspace_ids, *([req.organization_id] if req.organization_id else [])]
+        collection_names = [rag.collection_name(w) for w in workspace_ids]
+        if req.collection_name:
+            collection_names.append(req.collection_name)
+    for collection_name in dict.fromkeys(collection_names):
+        await rag.delete_embeddings(collection_name, req.source_id)
     return {"status": "DELETED"}
 
+@router.post("/source-membership", response_model=schemas_ai.SourceMembershipResponse)
+async def set_source_membership(req: schemas_ai.SourceMembershipRequest, rag: rag_service = Depends(get_rag_service)):
+    """Синхронизация принадлежности источника трекам/этапам/задачам (в обеих раскладках)."""
+    chunks, missing = await rag.set_source_membership(
+        req.organization_id, req.source_id, req.track_ids, req.stage_ids, req.task_ids, req.previous_track_ids
+    )
+    return schemas_ai.SourceMembershipResponse(chunks=chunks, missing_track_ids=missing)
+
+@router.post("/migrate-layout", response_model=schemas_ai.LayoutMigrationResponse)
+async def migrate_layout(req: schemas_ai.LayoutMigrationRequest, rag: rag_service = Depends(get_rag_service)):
+    """Перенос коллекций workspace_{id} в раскладку "organization" (без повторного эмбеддинга)."""
+    result = await rag.migrate_to_organization_layout(req.workspace_organizations, delete_old=req.delete_old)
+    return schemas_ai.LayoutMigrationResponse(**result)
+
+# --- Синтез FAQ (проверяется HR) ---
+
+@router.post("/faq/synthesize", status_code=status.HTTP_202_ACCEPTED)
+async def synthesize_faq(req: schemas_ai.FaqSynthesisRequest):
+    """Ставит источник в фоновую очередь синтеза FAQ (низкий приоритет)."""
+    queued = faq_synthesizer.enqueue(req.workspace_id, req.source_id, req.organization_id)
+    return {"status": "QUEUED" if queued else "ALREADY_QUEUED", "queue": background_queue.pending}
+
+@router.post("/faq/list", response_model=List[schemas_ai.FaqEntry])
+async def list_faq(req: schemas_ai.FaqListRequest):
+    return faq_synthesizer.list_entries(req.workspace_id, req.organization_id, req.source_id, req.status)
+
+@router.post("/faq/review", response_model=schemas_ai.FaqReviewResponse)
+async def review_faq(req: schemas_ai.FaqReviewRequest):
+    result = await faq_synthesizer.review([i.model_dump() for i in req.items], req.workspace_id, req.organization_id)
+    return schemas_ai.FaqReviewResponse(**result)
+
+@router.post("/summaries/build", status_code=status.HTTP_202_ACCEPTED)
+async def build_summaries(req: schemas_ai.SummaryBuildRequest):
+    """Ставит источник в фоновую очередь построения сводок разделов и документа."""
+    queued = summary_builder.enqueue(req.workspace_id, req.source_id, req.organization_id)
+    return {"status": "QUEUED" if queued else "ALREADY_QUEUED", "queue": background_queue.pending}
+
+# --- Снимки баз знаний треков ---
+
+@router.get("/workspaces/{workspace_id}/snapshot")
+async def export_workspace_snapshot(workspace_id: UUID, organization_id: Optional[UUID] = None, rag: rag_service = Depends(get_rag_service)):
+    """Выгружает векторы трека одним файлом *.kbsnap (импорт без повторного эмбеддинга)."""
+    fd, path = tempfile.mkstemp(suffix=SNAPSHOT_SUFFIX)
+    os.close(fd)
+    try:
+        await rag.export_workspace(workspace_id, path, organization_id=organization_id)
+    except Exception:
+        os.remove(path)
+        raise
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename=f"workspace_{workspace_id}{SNAPSHOT_SUFFIX}",
+        background=BackgroundTask(os.remove, path)
+    )
+
+@router.post("/workspaces/{workspace_id}/snapshot", response_model=schemas_ai.WorkspaceImportResponse)
+async def import_workspace_snapshot(workspace_id: UUID, request: Request, organization_id: Optional[UUID] = None, rag: rag_service = Depends(get_rag_service)):
+    """Загружает снимок (тело запроса - файл *.kbsnap как есть) в базу знаний трека."""
+    fd, path = tempfile.mkstemp(suffix=SNAPSHOT_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                f.write(chunk)
+        chunks = await rag.import_workspace(workspace_id, path, organization_id=organization_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot: {e}")
+    finally:
+        os.remove(path)
+    return schemas_ai.WorkspaceImportResponse(chunks=chunks)
+
+@router.post("/workspaces/clone", response_model=schemas_ai.WorkspaceCloneResponse)
+async def clone_workspace(req: schemas_ai.WorkspaceCloneRequest, rag: rag_service = Depends(get_rag_service)):
+    """База знаний для копии трека - без повторного эмбеддинга."""
+    chunks = await rag.clone_workspace(req.source_workspace_id, req.target_workspace_id, organization_id=req.organization_id)
+    return schemas_ai.WorkspaceCloneResponse(chunks=chunks)
+
+@router.post("/vector-store/evict", response_model=schemas_ai.VectorEvictResponse)
+async def evict_vector_collections(req: schemas_ai.VectorEvictRequest, rag: rag_service = Depends(get_rag_service)):
+    max_idle = req.max_idle_seconds if req.max_idle_seconds is not None else settings.VECTOR_EVICT_IDLE_SECONDS
+    return schemas_ai.VectorEvictResponse(evicted=rag.evict_idle(max_idle))
+
+@router.post("/embeddings/migrate", status_code=status.HTTP_202_ACCEPTED)
+async def migrate_embeddings(rag: rag_service = Depends(get_rag_service)):
+    """Переиндексация всех коллекций моделью из настроек; до переключения запросы идут в старый индекс."""
+    if embedding_migration.running:
+        raise HTTPException(status_code=409, detail="Embedding migration is already running")
+    started = embedding_migration.start(rag)
+    return {"status": "STARTED" if started else "UP_TO_DATE", "target_model": configured_model_id()}
+
+@router.get("/embeddings/status")
+async def embeddings_status(rag: rag_service = Depends(get_rag_service)):
+    """Модель индекса, модель из настроек, модели коллекций и ход миграции."""
+    return {
+        "active_model": rag.registry.active_model,
+        "configured_model": configured_model_id(),
+        "collections": rag.registry.collections,
+        "migration": embedding_migration.snapshot(),
+    }
+
+@router.get("/prompt-cache/stats")
+async def prompt_cache_statistics():
+    """Доля токенов промпта, взятых из кэша Ollama, по типам запросов."""
+    return prompt_cache_stats.snapshot()
+
+@router.get("/ollama/nodes")
+async def ollama_nodes():
+    """Состояние узлов пула Ollama: доступность, очередь, модели."""
+    return ollama_pool.snapshot()
+
+@router.get("/cancellations/stats")
+async def cancellation_statistics():
+    """Запросы, прерванные из-за отключения вызывающей стороны, по операциям."""
+    return cancellation_stats.snapshot()
+
+@router.get("/admission/stats")
+async def admission_statistics():
+    """Загрузка классов эндпоинтов: выполняется, в очереди, оценка ожидания, отказы."""
+    return admission_snapshot()
+
+@router.get("/router/stats")
+async def router_statistics():
+    """Доля запросов и задержка ответа по маршрутам (шаблон / Q&A / малая модель / основная)."""
+    return router_stats.snapshot()
+
 @router.post("/query", response_model=schemas_ai.QueryResponse)
 async def query_ai_service(
     req: schemas_ai.QueryRequest,
+    request: Request,
     rag: rag_service = Depends(get_rag_service)
 ):
-    answer, sources, emotion = await rag.answer_query(
-        workspace_id=req.workspace_id,
-        question=req.question,
-        session_id=req.session_id
-    )
+    # Перегрузка - сразу 503 с Retry-After вместо ожидания в очереди до таймаута
+    async with gates["chat"].admit():
+        answer, sources, emotion = await cancel_on_disconnect(request, rag.answer_query(
+            workspace_id=req.workspace_id,
+            question=req.question,
+            session_id=req.session_id,
+            organization_id=req.organization_id,
+            history=[turn.model_dump() for turn in req.history],
+            instructions=req.instructions,
+            extra_workspaces=req.extra_workspace_ids,
+            source_ids=req.source_ids
+        ), "query")
     return schemas_ai.QueryResponse(
         answer=answer,
         sources=sources,
@@ -68,8 +262,14 @@ async def query_ai_service(
 # --- НОВЫЙ ЭНДПОИНТ ---
 @router.post("/generate-quiz", response_model=schemas_ai.GenerateQuizResponse)
 async def generate_quiz(
-    req: schemas_ai.GenerateQuizRequest
+    req: schemas_ai.GenerateQuizRequest,
+    request: Request
 ):
-    """Генерирует тест по тексту"""
-    questions = await generator_service.generate_quiz(req.text_content)
+    """Генерирует тест по тексту (или по файлу из общего хранилища)"""
+    async with gates["generation"].admit():
+        text_content = req.text_content
+        if req.file_path:
+            # Разбор PDF/DOCX - синхронный и долгий, массовая генерация присылает несколько файлов сразу
+            text_content = await asyncio.to_thread(_extract_file_text, req.file_path, req.filename or req.file_path)
+        questions = await cancel_on_disconnect(request, generator_service.generate_quiz(text_content), "quiz")
     return schemas_ai.GenerateQuizResponse(questions=questions)
\ No newline at end of file
@@ -11,14 +11,140 @@ class Settings(BaseSettings):
 
     # Настройки RAG
     OLLAMA_HOST: AnyHttpUrl
-    CHROMA_HOST: str
-    CHROMA_PORT: int
+    # Пул узлов Ollama (app.services.ollama_pool): URL через запятую; пусто - один OLLAMA_HOST
+    OLLAMA_NODES: str = ""
+    OLLAMA_HEALTH_INTERVAL_SECONDS: int = 15
+    OLLAMA_EJECT_FAILURES: int = 3 # ошибок подряд до исключения узла
+    OLLAMA_EJECT_SECONDS: int = 30
+    OLLAMA_AFFINITY_SLACK: int = 2 # узел сессии используется, пока на нем не больше чем на N запросов больше минимума
+
+    # Дедлайны обращений к Ollama по типам операций
+    LLM_CHAT_TIMEOUT_SECONDS: float = 120
+    LLM_GENERATION_TIMEOUT_SECONDS: float = 300 # тесты, FAQ, сводки (фоновые и массовые)
+    EMBEDDING_TIMEOUT_SECONDS: float = 30
+
+    CHROMA_HOST: str = "chroma"
+    CHROMA_PORT: int = 8000
+
+    # Векторное хранилище: "chroma" (HTTP) или "numpy" (in-process точный поиск, хранится на диске)
+    VECTOR_STORE_BACKEND: str = "chroma"
+    VECTOR_STORE_PATH: str = "/app/vector_store"
+    # Квантование векторов в памяти (только для "numpy"): "none" | "float16" | "int8".
+    # Полные float32-векторы остаются на диске (mmap) и используются для пересчета top-кандидатов.
+    # Экономит память в 2-4 раза ценой скорости поиска (int8 - в 2-3 раза медленнее, float16 - на порядок,
+    # см. benchmarks.quantization): включать, только если коллекции не помещаются в память как float32
+    VECTOR_QUANTIZATION: str = "none"
+    VECTOR_RESCORE_FACTOR: int = 4 # Пересчитываем top-(k * factor) кандидатов
+    # Выгрузка из памяти коллекций без обращений дольше N секунд (только для "numpy", 0 - не выгружать)
+    VECTOR_EVICT_IDLE_SECONDS: int = 1800
+    # Записи в коллекции "numpy" сохраняются в снимок на диске не чаще раза в N секунд (фоново, при выгрузке
+    # и остановке); 0 - после каждой записи. При аварийном завершении теряются записи последних N секунд
+    VECTOR_FLUSH_SECONDS: float = 5
+    EVICT_INTERVAL_SECONDS: int = 300 # период фоновой выгрузки коллекций и сессий
     
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
     LLM_MODEL_NAME: str = 'llama3:8b-instruct'
     EMBEDDING_MODEL_NAME: str = 'nomic-embed-text'
+    # Провайдер эмбеддингов (app.services.embeddings): "ollama" | "local" (sentence-transformers на CPU) | "hash" (тесты)
+    EMBEDDING_PROVIDER: str = "ollama"
+    EMBEDDING_OLLAMA_BATCH_SIZE: int = 8 # одновременных запросов /api/embeddings
+    EMBEDDING_LOCAL_MODEL_PATH: str = "/app/models/nomic-embed-text-v1.5"
+    EMBEDDING_LOCAL_BATCH_SIZE: int = 32
+    EMBEDDING_LOCAL_THREADS: int = 4 # потоков torch на один батч (0 - по числу ядер)
+    EMBEDDING_LOCAL_WORKERS: int = 1 # батчей одновременно
+    EMBEDDING_LOCAL_TRUST_REMOTE_CODE: bool = False # нужно для моделей nomic-embed-text
+    EMBEDDING_HASH_DIM: int = 768
+    # Реестр моделей коллекций (app.services.embedding_migration); должен лежать на постоянном томе
+    EMBEDDING_REGISTRY_PATH: str = "/app/vector_store/embedding_registry.json"
+    EMBEDDING_MIGRATION_BATCH_SIZE: int = 64
+    EMBEDDING_MIGRATION_RATE: float = 20 # текстов в секунду при переиндексации (0 - без ограничения)
     RELEVANCE_THRESHOLD: float = 0.5
 
+    # Раскладка векторного хранилища:
+    #   "workspace"    - отдельная коллекция на каждый трек (workspace_{id}), legacy
+    #   "organization" - одна коллекция на организацию (org_{id}), чанк хранится один раз,
+    #                    принадлежность к трекам/этапам/задачам - флаги в метаданных
+    VECTOR_LAYOUT: str = "workspace"
+
+    # Память диалога (app.services.session_memory)
+    SESSION_MAX_TURNS: int = 6 # последних ходов дословно, более старые - в пересказе
+    SESSION_MAX_CONTEXT_TOKENS: int = 3072 # context Ollama длиннее - пересобираем (держать ниже num_ctx модели)
+    SESSION_MAX_SESSIONS: int = 1000
+    SESSION_IDLE_SECONDS: int = 3600
+    # Вопрос не длиннее N слов считается уточняющим и ищется вместе с предыдущим (как и вопрос с "это", "он", "там"...)
+    SESSION_FOLLOW_UP_MAX_WORDS: int = 2
+
+    # Сколько Ollama держит модель загруженной после запроса: с выгрузкой теряется и кэш префикса промпта
+    LLM_KEEP_ALIVE: str = "30m"
+
+    # Быстрый ответ из Q&A без генерации: косинусная близость вопроса к вопросу Q&A (0 - выключено)
+    QNA_FAST_PATH_THRESHOLD: float = 0.92
+    QNA_ANSWER_TEMPLATE: str = "{answer}" # например "Коллега, {answer}"
+
+    # Маршрутизация вопросов (app.services.model_router)
+    LLM_SMALL_MODEL_NAME: str = "" # например "qwen2.5:1.5b-instruct"; пусто - все вопросы на LLM_MODEL_NAME
+    ROUTER_SMALLTALK_TEMPLATES: bool = True # приветствия и благодарности - готовой фразой
+    ROUTER_SMALL_MAX_WORDS: int = 12
+    ROUTER_SMALL_MIN_SCORE: float = 0.75 # близость лучшего чанка, при которой хватает малой модели
+
+    # Фоновая работа LLM (FAQ, сводки) - app.services.llm_priority
+    BACKGROUND_LLM_OFFPEAK_HOURS: str = "" # например "22-7"; пусто - в любое время
+    BACKGROUND_LLM_IDLE_SECONDS: float = 10 # пауза без запросов из чата перед каждым обращением к LLM
+
+    # Офлайн-синтез FAQ по источникам (app.services.faq_synthesis), пары ждут проверки HR
+    FAQ_SYNTHESIS_ON_INGEST: bool = False # ставить источники в очередь сразу после индексации
+    FAQ_PAIRS_PER_WINDOW: int = 3
+    FAQ_WINDOW_CHARS: int = 3000
+    FAQ_MAX_WINDOWS: int = 3
+
+    # Поиск: сколько чанков в промпт и MMR-переранжирование пула кандидатов (app.services.mmr)
+    RETRIEVAL_K: int = 5
+    MMR_LAMBDA: float = 0.5 # 1.0 - без MMR (обычный top-k), меньше - разнообразнее
+    MMR_POOL_SIZE: int = 20
+
+    # Поиск сразу по нескольким базам знаний: трек + общие документы организации + SHARED_WORKSPACE_IDS (через запятую)
+    SHARED_WORKSPACE_IDS: str = ""
+    FANOUT_TIMEOUT_SECONDS: float = 2.0
+
+    # Иерархические сводки (app.services.summaries): разделы и документ целиком, уровень поиска - по вопросу
+    SUMMARY_ON_INGEST: bool = False # ставить источники в фоновую очередь сразу после индексации
+    SUMMARY_RETRIEVAL: bool = True # искать по сводкам для обзорных вопросов (если они построены)
+    SUMMARY_SECTION_CHARS: int = 4000
+    SUMMARY_MIN_SCORE: float = 0.4 # ниже - отвечаем по исходным чанкам
+
+    # Эмоция аватара: "lexicon" - локальный классификатор по тексту ответа (app.services.emotion),
+    # "none" - всегда "neutral". Отдельного запроса к LLM за эмоцией не делаем
+    EMOTION_CLASSIFIER: str = "lexicon"
+
+    # Глобальный лимит одновременных запросов генерации к LLM (на процесс)
+    LLM_MAX_CONCURRENCY: int = 2
+
+    # Контроль допуска (app.services.admission): параллельность, длина очереди и предельное
+    # ожидаемое ожидание по классам эндпоинтов; сверх них - 503 с Retry-After
+    ADMISSION_CHAT_MAX_IN_FLIGHT: int = 8
+    ADMISSION_CHAT_MAX_QUEUE: int = 32
+    ADMISSION_CHAT_MAX_WAIT_SECONDS: float = 30
+    ADMISSION_GENERATION_MAX_IN_FLIGHT: int = 2
+    ADMISSION_GENERATION_MAX_QUEUE: int = 16
+    ADMISSION_GENERATION_MAX_WAIT_SECONDS: float = 240
+    ADMISSION_INGEST_MAX_IN_FLIGHT: int = 2
+    ADMISSION_INGEST_MAX_QUEUE: int = 32
+    ADMISSION_INGEST_MAX_WAIT_SECONDS: float = 240
+
+    # Логи (app.core.log): JSON в stdout через очередь; DEBUG пишется для доли запросов
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json" # "json" | "text"
+    LOG_DEBUG_SAMPLE_RATE: float = 0.05
+    LOG_QUEUE_SIZE: int = 10000 # записей; при переполнении новые отбрасываются
+
+    # Трассировка (app.services.tracing): сохраняются только трассы дольше порога (и с ошибкой)
+    TRACE_ENABLED: bool = True
+    TRACE_SLOW_THRESHOLD_MS: float = 2000
+    TRACE_KEEP_ERRORS: bool = True
+    TRACE_EXPORTER: str = "file" # "file" | "otlp"
+    TRACE_FILE_PATH: str = "/app/traces/back-ai.jsonl"
+    TRACE_OTLP_ENDPOINT: str = "http://otel-collector:4318/v1/traces"
+
     # --- ПЕРСОНА Д.А. ТАРАНОВА ---
     PERSONA_PROMPT: str = """
 Ты — Дмитрий Александрович Таранов, заместитель генерального директора по управлению персоналом ООО «Газпром трансгаз Сургут».
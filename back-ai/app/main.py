@@ -1,22 +1,112 @@
 # (НОВЫЙ ФАЙЛ)
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
+from app.core.log import REQUEST_ID_HEADER, request_id, request_id_from_header, setup_logging, shutdown_logging
+
+# Логи настраиваются до импорта сервисов: они пишут в лог уже при инициализации
+setup_logging()
+
 from app.api.v1.api import api_router
 
 # (Важно) Инициализируем rag_service при старте
-from app.services import rag_service
+from app.services.rag_service import rag_service
+from app.services.ollama_pool import ollama_pool
+from app.services import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+
+async def _evict_idle():
+    """Периодически выгружает холодные коллекции (они остаются на диске) и простаивающие сессии."""
+    while True:
+        await asyncio.sleep(settings.EVICT_INTERVAL_SECONDS)
+        try:
+            if settings.VECTOR_EVICT_IDLE_SECONDS > 0:
+                # Выгрузка сбрасывает коллекции на диск - не блокируем event loop
+                evicted = await asyncio.to_thread(rag_service.evict_idle, settings.VECTOR_EVICT_IDLE_SECONDS)
+                if evicted:
+                    logger.info(f"Evicted idle collections: {evicted}")
+            if settings.SESSION_IDLE_SECONDS > 0:
+                sessions = rag_service.evict_idle_sessions(settings.SESSION_IDLE_SECONDS)
+                if sessions:
+                    logger.info(f"Evicted {sessions} idle chat sessions")
+        except Exception as e:
+            logger.error(f"Eviction failed: {e}")
+
+
+async def _flush_vectors():
+    """Периодически сохраняет отложенные записи коллекций "numpy" на диск."""
+    while True:
+        await asyncio.sleep(settings.VECTOR_FLUSH_SECONDS)
+        try:
+            await asyncio.to_thread(rag_service.flush_vectors)
+        except Exception as e:
+            logger.error(f"Vector flush failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    evictor = asyncio.create_task(_evict_idle())
+    health = asyncio.create_task(ollama_pool.run_health_checks(settings.OLLAMA_HEALTH_INTERVAL_SECONDS))
+    flusher = asyncio.create_task(_flush_vectors()) if settings.VECTOR_FLUSH_SECONDS > 0 else None
+    yield
+    evictor.cancel()
+    health.cancel()
+    if flusher:
+        flusher.cancel()
+    rag_service.flush_vectors()
+    rag_service.embedder.close()
+    shutdown_logging()
+
 
 app = FastAPI(
     title=settings.APP_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Продолжает трассу back из заголовка traceparent (app.services.tracing); id трассы - в X-Trace-Id."""
+    with tracing.span(f"{request.method} {request.url.path}", kind="server",
+                      traceparent=request.headers.get("traceparent"), request_id=request_id.get()) as span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            span.rename(f"{request.method} {route.path}")
+        span.set_attribute("status_code", response.status_code)
+        if response.status_code >= 500:
+            span.set_error(f"HTTP {response.status_code}")
+        trace_id = tracing.current_trace_id()
+        if trace_id:
+            response.headers["X-Trace-Id"] = trace_id
+        return response
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """X-Request-ID от back (или новый) - в каждой записи лога запроса (app.core.log) и в ответе."""
+    rid = request_id_from_header(request.headers.get(REQUEST_ID_HEADER))
+    request_id.set(rid)
+    response = await call_next(request)
+    response.headers[REQUEST_ID_HEADER] = rid
+    return response
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": f"Welcome to {settings.APP_NAME}!"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Метрики в текстовом формате Prometheus (app.services.metrics)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8001, reload=True)
\ No newline at end of file
@@ -14,29 +14,130 @@ class KnowledgeSourceCreateArticle(BaseModel):
 class FileProcessingRequest(BaseModel):
     workspace_id: UUID
     source_id: UUID
+    organization_id: Optional[UUID] = None
     file_path: str
     filename: str
 
 class QASProcessingRequest(BaseModel):
     workspace_id: UUID
     source_id: UUID
+    organization_id: Optional[UUID] = None
     qa_in: KnowledgeSourceCreateQA
 
 class ArticleProcessingRequest(BaseModel):
     workspace_id: UUID
     source_id: UUID
+    organization_id: Optional[UUID] = None
     article_in: KnowledgeSourceCreateArticle
 
 class EmbeddingDeleteRequest(BaseModel):
-    collection_name: str
+    collection_name: Optional[str] = None # legacy-раскладка: workspace_{id}
+    organization_id: Optional[UUID] = None # раскладка "organization"
     source_id: UUID
+    workspace_ids: List[UUID] = [] # раскладка "workspace": базы знаний, из которых удалить источник
+
+# --- Раскладка векторного хранилища ---
+
+class SourceMembershipRequest(BaseModel):
+    """Полный список треков/этапов/задач, к которым привязан источник."""
+    organization_id: Optional[UUID] = None
+    source_id: UUID
+    track_ids: List[UUID] = []
+    stage_ids: List[UUID] = []
+    task_ids: List[UUID] = []
+    # Треки (или id организации) до изменения: в раскладке "workspace" из их баз источник удаляется
+    previous_track_ids: List[UUID] = []
+
+class SourceMembershipResponse(BaseModel):
+    status: str = "UPDATED"
+    chunks: int
+    # Базы знаний, в которые источник нужно проиндексировать заново (чанков для копирования нет)
+    missing_track_ids: List[UUID] = []
+
+class LayoutMigrationRequest(BaseModel):
+    workspace_organizations: Dict[UUID, UUID] # workspace (track) id -> organization id
+    delete_old: bool = False
+
+class LayoutMigrationResponse(BaseModel):
+    migrated_collections: int
+    migrated_chunks: int
+    skipped: List[str] = []
+
+class WorkspaceCloneRequest(BaseModel):
+    source_workspace_id: UUID
+    target_workspace_id: UUID
+    organization_id: Optional[UUID] = None
+
+class WorkspaceCloneResponse(BaseModel):
+    chunks: int
+
+class WorkspaceImportResponse(BaseModel):
+    chunks: int
+
+class VectorEvictRequest(BaseModel):
+    max_idle_seconds: Optional[int] = None # по умолчанию VECTOR_EVICT_IDLE_SECONDS
+
+class VectorEvictResponse(BaseModel):
+    evicted: List[str] = []
+
+# --- Синтез FAQ ---
+
+class FaqSynthesisRequest(BaseModel):
+    workspace_id: UUID
+    source_id: UUID
+    organization_id: Optional[UUID] = None
+
+class FaqListRequest(BaseModel):
+    workspace_id: Optional[UUID] = None
+    organization_id: Optional[UUID] = None
+    source_id: Optional[UUID] = None
+    status: Optional[str] = None # pending / approved
+
+class FaqEntry(BaseModel):
+    id: str
+    source_id: UUID
+    source_name: Optional[str] = None
+    question: str
+    answer: str
+    status: str
+
+class FaqReviewItem(BaseModel):
+    id: str
+    action: str = Field(..., pattern="^(approve|reject)$")
+    question: Optional[str] = None # правка HR перед одобрением
+    answer: Optional[str] = None
+
+class FaqReviewRequest(BaseModel):
+    workspace_id: Optional[UUID] = None
+    organization_id: Optional[UUID] = None
+    items: List[FaqReviewItem]
+
+class FaqReviewResponse(BaseModel):
+    approved: int
+    rejected: int
+
+# --- Сводки документов ---
+
+class SummaryBuildRequest(BaseModel):
+    workspace_id: UUID
+    source_id: UUID
+    organization_id: Optional[UUID] = None
 
 # --- RAG Query ---
 
+class ChatTurn(BaseModel):
+    question: str
+    answer: str
+
 class QueryRequest(BaseModel):
     workspace_id: UUID
     question: str
     session_id: UUID
+    organization_id: Optional[UUID] = None
+    history: List[ChatTurn] = [] # последние ходы сессии (для восстановления после перезапуска)
+    instructions: Optional[str] = None # постоянные инструкции трека (кэшируемый префикс промпта)
+    extra_workspace_ids: List[UUID] = [] # другие базы знаний для поиска вместе с треком
+    source_ids: List[str] = [] # файлы текущего этапа/задачи: поиск только по ним
 
 class QueryResponseSource(BaseModel):
     name: str
@@ -46,13 +147,16 @@ class QueryResponseSource(BaseModel):
 class QueryResponse(BaseModel):
     answer: str
     sources: List[QueryResponseSource]
-    emotion: str = "neutral" # Добавлено поле эмоции
+    emotion: str = "neutral" # Добавлено поле эмоции (метки - app.services.emotion.EMOTION_LABELS)
 
 # --- НОВОЕ: Генерация Тестов ---
 
 class GenerateQuizRequest(BaseModel):
-    text_content: str # Текст, по которому генерировать
+    text_content: str = "" # Текст, по которому генерировать
     difficulty: str = "medium" # easy, medium, hard
+    # Для FILE-источников: текст извлекается из файла на стороне back-ai
+    file_path: Optional[str] = None
+    filename: Optional[str] = None
 
 class GeneratedOption(BaseModel):
     text: str
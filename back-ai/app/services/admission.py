@@ -0,0 +1,126 @@
+"""
+Контроль допуска запросов к AI-сервису по классам эндпоинтов.
+
+У каждого класса ("chat", "generation", "ingest") ограничено число одновременно выполняемых
+запросов и длина очереди. Ожидание в очереди оценивается по скользящему среднему времени
+обработки; если оценка превышает порог (или очередь полна), запрос сразу получает 503 с
+Retry-After, а не висит до таймаута. back повторяет такие запросы с backoff (AIClient._post).
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = 0.2 # вес последнего запроса в среднем времени обработки
+INITIAL_SERVICE_SECONDS = {"chat": 10.0, "generation": 60.0, "ingest": 30.0}
+
+
+class AdmissionGate:
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, max_wait_seconds: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self.waiting = 0
+        self.avg_service_seconds = INITIAL_SERVICE_SECONDS.get(name, 10.0)
+        self.admitted = 0
+        self.rejected = 0
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def estimated_wait(self) -> float:
+        """Оценка ожидания нового запроса: очереди впереди него, деленные на параллельность."""
+        if self.in_flight < self.max_in_flight:
+            return 0.0
+        return (self.waiting + 1) / self.max_in_flight * self.avg_service_seconds
+
+    def _reject(self, wait: float):
+        self.rejected += 1
+        retry_after = max(1, math.ceil(wait))
+        logger.warning(f"{self.name}: rejected (in flight {self.in_flight}, queued {self.waiting}, est. wait {wait:.1f}s)")
+        raise HTTPException(
+            status_code=503,
+            detail=f"AI service is busy ({self.name}), retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        wait = self.estimated_wait()
+        if self.waiting >= self.max_queue or wait > self.max_wait_seconds:
+            self._reject(wait)
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            with self._lock:
+                elapsed = time.monotonic() - started
+                self.avg_service_seconds += EWMA_ALPHA * (elapsed - self.avg_service_seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "avg_service_seconds": round(self.avg_service_seconds, 3),
+            "estimated_wait_seconds": round(self.estimated_wait(), 3),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+gates = {
+    "chat": AdmissionGate(
+        "chat", settings.ADMISSION_CHAT_MAX_IN_FLIGHT, settings.ADMISSION_CHAT_MAX_QUEUE, settings.ADMISSION_CHAT_MAX_WAIT_SECONDS
+    ),
+    "generation": AdmissionGate(
+        "generation", settings.ADMISSION_GENERATION_MAX_IN_FLIGHT, settings.ADMISSION_GENERATION_MAX_QUEUE,
+        settings.ADMISSION_GENERATION_MAX_WAIT_SECONDS
+    ),
+    "ingest": AdmissionGate(
+        "ingest", settings.ADMISSION_INGEST_MAX_IN_FLIGHT, settings.ADMISSION_INGEST_MAX_QUEUE, settings.ADMISSION_INGEST_MAX_WAIT_SECONDS
+    ),
+}
+
+
+def admission_snapshot() -> Dict[str, dict]:
+    return {name: gate.snapshot() for name, gate in gates.items()}
+
+
+def _collect_gates():
+    yield "kb_queue_depth", "gauge", "Requests waiting in queue", [
+        ({"queue": f"admission:{name}"}, gate.waiting) for name, gate in gates.items()
+    ]
+    yield "kb_in_flight", "gauge", "Requests being processed", [
+        ({"queue": f"admission:{name}"}, gate.in_flight) for name, gate in gates.items()
+    ]
+    yield "kb_admission_rejected_total", "counter", "Requests rejected by admission control", [
+        ({"queue": f"admission:{name}"}, gate.rejected) for name, gate in gates.items()
+    ]
+
+
+register_collector(_collect_gates)
@@ -0,0 +1,29 @@
+"""
+Ширина вопроса -> уровень иерархии базы знаний, по которому искать:
+    "document" - вопрос о документе целиком ("О чём регламент по охране труда?");
+    "section"  - обзорный вопрос о части документа ("Какие этапы согласования отпуска?");
+    "chunk"    - конкретный вопрос, ищем по исходным чанкам.
+Правила по ключевым фразам: классификатор вызывается на каждый запрос и не должен стоить LLM-вызова.
+"""
+import re
+
+LEVEL_DOCUMENT = "document"
+LEVEL_SECTION = "section"
+LEVEL_CHUNK = "chunk"
+
+_DOCUMENT_PATTERNS = re.compile(
+    r"\b(о ч[её]м|про что|кратко|вкратце|в двух словах|в целом|суть|обзор|резюм|основн\w* (положени|иде|мысл)|"
+    r"что (говорится|сказано|написано) в)"
+)
+_SECTION_PATTERNS = re.compile(
+    r"\b(какие|перечисл|этап\w*|порядок|что входит|из чего состоит|раздел\w*|список|основн\w*|правила)"
+)
+
+
+def question_level(question: str) -> str:
+    text = question.lower().replace("ё", "е")
+    if _DOCUMENT_PATTERNS.search(text):
+        return LEVEL_DOCUMENT
+    if _SECTION_PATTERNS.search(text):
+        return LEVEL_SECTION
+    return LEVEL_CHUNK
@@ -0,0 +1,328 @@
+"""
+Учет модели эмбеддингов по коллекциям и онлайн-переиндексация при ее смене.
+
+Реестр (EMBEDDING_REGISTRY_PATH) хранит модель, которой построены коллекции (active_model), и для каждой
+логической коллекции ("workspace_<id>", "org_<id>") - физическое имя и модель. RAGService работает с
+хранилищем через AliasedVectorStore: имена разрешаются по реестру, каждый записанный чанк получает
+metadata["embedding_model"]. Запросы эмбеддятся моделью из реестра, а не из настроек, поэтому смена
+EMBEDDING_PROVIDER / EMBEDDING_MODEL_NAME не портит поиск, пока не пройдет миграция.
+
+Миграция (POST /embeddings/migrate):
+    1. каждая коллекция переэмбеддится моделью из настроек в теневую "<имя>--<хэш модели>" -
+       батчами, не быстрее EMBEDDING_MIGRATION_RATE текстов в секунду и только в окна фоновой
+       работы LLM (wait_for_background_slot); запросы все это время обслуживает старый индекс;
+    2. запись в индекс приостанавливается (index_writes), досчитываются чанки, добавленные за время
+       миграции, синхронизируются удаления и метаданные;
+    3. реестр и провайдер запросов переключаются разом, старые коллекции удаляются.
+Прерванная миграция продолжается с места остановки: уже посчитанные чанки не эмбеддятся повторно.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.services.embeddings import EmbeddingProvider, create_embedding_provider
+from app.services.llm_priority import wait_for_background_slot
+from app.services.metrics import observe_stage
+from app.services.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+MODEL_KEY = "embedding_model"
+SHADOW_SEPARATOR = "--"
+# Пауза перед удалением старых коллекций: запросы, начатые до переключения, дочитывают их
+DRAIN_SECONDS = 5.0
+
+
+def shadow_name(name: str, model_id: str) -> str:
+    return f"{name}{SHADOW_SEPARATOR}{hashlib.md5(model_id.encode()).hexdigest()[:8]}"
+
+
+def embedding_text(document: str, meta: dict) -> str:
+    """Текст, по которому строился эмбеддинг: у Q&A-вопросов и FAQ - только вопрос."""
+    if meta.get("qna_part") == "question" or meta.get("source_type") == "FAQ":
+        if meta.get("question"):
+            return meta["question"]
+        if document.startswith("Вопрос: "):
+            return document[len("Вопрос: "):].split("\nОтвет:", 1)[0]
+    return document
+
+
+class EmbeddingRegistry:
+    def __init__(self, path: str, default_model: str):
+        self.path = path
+        self.active_model = default_model
+        self.collections: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.active_model = data.get("active_model", default_model)
+            self.collections = data.get("collections", {})
+        else:
+            # Существующие коллекции считаем построенными текущей моделью из настроек
+            self.save()
+
+    def physical(self, name: str) -> str:
+        entry = self.collections.get(name)
+        return entry["physical"] if entry else name
+
+    def model_of(self, name: str) -> str:
+        entry = self.collections.get(name)
+        return entry["model"] if entry else self.active_model
+
+    def forget(self, name: str):
+        if self.collections.pop(name, None) is not None:
+            self.save()
+
+    def switch(self, mapping: Dict[str, str], model_id: str):
+        self.collections.update({name: {"physical": physical, "model": model_id} for name, physical in mapping.items()})
+        self.active_model = model_id
+        self.save()
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"active_model": self.active_model, "collections": self.collections}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"Failed to save registry {self.path}: {e}")
+
+
+class AliasedVectorStore(VectorStore):
+    """Хранилище с логическими именами коллекций (по реестру) и отметкой модели в каждом чанке."""
+
+    def __init__(self, inner: VectorStore, registry: EmbeddingRegistry):
+        self.inner = inner
+        self.registry = registry
+
+    def __getattr__(self, name):
+        # evict_idle, memory_bytes и прочие возможности конкретного бэкенда
+        return getattr(self.inner, name)
+
+    def list_collections(self) -> List[str]:
+        aliases = {e["physical"]: name for name, e in self.registry.collections.items()}
+        names = []
+        for physical in self.inner.list_collections():
+            if physical in aliases:
+                names.append(aliases[physical])
+            elif SHADOW_SEPARATOR not in physical and physical not in self.registry.collections:
+                names.append(physical)
+        return sorted(names)
+
+    def has_collection(self, name):
+        return self.inner.has_collection(self.registry.physical(name))
+
+    def delete_collection(self, name):
+        self.inner.delete_collection(self.registry.physical(name))
+        self.registry.forget(name)
+
+    def upsert(self, name, ids, embeddings, documents, metadatas):
+        model_id = self.registry.model_of(name)
+        metadatas = [{**(meta or {}), MODEL_KEY: model_id} for meta in metadatas]
+        with observe_stage("upsert", model_id):
+            self.inner.upsert(self.registry.physical(name), ids, embeddings, documents, metadatas)
+
+    def get(self, name, ids=None, where=None, include_embeddings=False, limit=None, offset=0):
+        return self.inner.get(self.registry.physical(name), ids=ids, where=where, include_embeddings=include_embeddings,
+                              limit=limit, offset=offset)
+
+    def update_metadatas(self, name, ids, metadatas):
+        self.inner.update_metadatas(self.registry.physical(name), ids, metadatas)
+
+    def delete(self, name, where):
+        self.inner.delete(self.registry.physical(name), where)
+
+    def delete_ids(self, name, ids):
+        self.inner.delete_ids(self.registry.physical(name), ids)
+
+    def query(self, name, embedding, n_results, where=None, include_embeddings=False):
+        with observe_stage("retrieve", self.registry.model_of(name)):
+            return self.inner.query(self.registry.physical(name), embedding, n_results, where=where,
+                                    include_embeddings=include_embeddings)
+
+    def export_snapshot(self, name, path, where=None):
+        self.inner.export_snapshot(self.registry.physical(name), path, where)
+
+    def import_snapshot(self, name, path):
+        self.inner.import_snapshot(self.registry.physical(name), path)
+
+    def copy_collection(self, source, target):
+        self.inner.copy_collection(self.registry.physical(source), self.registry.physical(target))
+
+
+class IndexWriteGate:
+    """Эмбеддинг + запись в индекс идут под writing(); exclusive() дожидается их и не пускает новые."""
+
+    def __init__(self):
+        self.writers = 0
+        self._reopened: Optional[asyncio.Event] = None
+
+    async def wait_writable(self):
+        """Для записи без await внутри: после возврата она выполнится до любого переключения."""
+        while self._reopened is not None:
+            await self._reopened.wait()
+
+    @asynccontextmanager
+    async def writing(self):
+        await self.wait_writable()
+        self.writers += 1
+        try:
+            yield
+        finally:
+            self.writers -= 1
+
+    @asynccontextmanager
+    async def exclusive(self):
+        await self.wait_writable()
+        self._reopened = asyncio.Event()
+        try:
+            while self.writers:
+                await asyncio.sleep(0.05)
+            yield
+        finally:
+            reopened, self._reopened = self._reopened, None
+            reopened.set()
+
+
+class EmbeddingMigration:
+    def __init__(self):
+        self.status = "idle" # idle | running | switching | done | failed
+        self.target_model: Optional[str] = None
+        self.collections_total = 0
+        self.collections_done = 0
+        self.chunks_embedded = 0
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, rag) -> bool:
+        """Запускает миграцию на модель из настроек. False - уже идет или переиндексировать нечего."""
+        target = create_embedding_provider()
+        if self.running or target.model_id == rag.registry.active_model:
+            target.close()
+            return False
+        self.status, self.target_model, self.error = "running", target.model_id, None
+        self.collections_total = self.collections_done = self.chunks_embedded = 0
+        self.started_at, self.finished_at = datetime.now(timezone.utc).isoformat(), None
+        # Пустой контекст: миграция переживает запрос, который ее запустил, - ни его трасса (app.services.tracing),
+        # ни метка эндпоинта в метриках к ней не относятся
+        self._task = asyncio.create_task(self._run(rag, target), context=contextvars.Context())
+        return True
+
+    async def _sync(self, store: VectorStore, source: str, shadow: str, target: EmbeddingProvider, throttled: bool):
+        """Эмбеддит в shadow чанки source, которых там нет или у которых изменился текст."""
+        built = await asyncio.to_thread(store.get, shadow)
+        done = dict(zip(built["ids"], built["documents"]))
+        page = await asyncio.to_thread(store.get, source)
+        todo = [
+            (chunk_id, doc, meta)
+            for chunk_id, doc, meta in zip(page["ids"], page["documents"], page["metadatas"])
+            if done.get(chunk_id) != doc
+        ]
+        batch_size = settings.EMBEDDING_MIGRATION_BATCH_SIZE
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            started = time.monotonic()
+            if throttled:
+                await wait_for_background_slot()
+            with observe_stage("embed", target.model_id):
+                vectors = await target.embed([embedding_text(doc, meta or {}) for _, doc, meta in batch])
+            # Запись в in-process хранилище - работа CPU/диска: в потоке, чтобы не останавливать запросы
+            await asyncio.to_thread(
+                store.upsert,
+                shadow,
+                ids=[chunk_id for chunk_id, _, _ in batch],
+                embeddings=vectors,
+                documents=[doc for _, doc, _ in batch],
+                metadatas=[{**(meta or {}), MODEL_KEY: target.model_id} for _, _, meta in batch]
+            )
+            self.chunks_embedded += len(batch)
+            if throttled and settings.EMBEDDING_MIGRATION_RATE > 0:
+                await asyncio.sleep(max(0.0, len(batch) / settings.EMBEDDING_MIGRATION_RATE - (time.monotonic() - started)))
+
+    @staticmethod
+    def _finalize(store: VectorStore, source: str, shadow: str, model_id: str):
+        """Без await: удаления и метаданные source переносятся в shadow; расхождение текстов - ошибка."""
+        current = store.get(source)
+        built = store.get(shadow)
+        built_docs = dict(zip(built["ids"], built["documents"]))
+        stale = [chunk_id for chunk_id, doc in zip(current["ids"], current["documents"]) if built_docs.get(chunk_id) != doc]
+        if stale:
+            raise RuntimeError(f"{len(stale)} chunks of {source} changed during switch-over")
+        removed = list(set(built_docs) - set(current["ids"]))
+        if removed:
+            store.delete_ids(shadow, removed)
+        if current["ids"]:
+            store.update_metadatas(shadow, current["ids"], [{**(m or {}), MODEL_KEY: model_id} for m in current["metadatas"]])
+
+    async def _run(self, rag, target: EmbeddingProvider):
+        registry, inner = rag.registry, rag.store.inner
+        logger.info(f"Migration {registry.active_model} -> {target.model_id} started")
+        try:
+            names = rag.store.list_collections()
+            self.collections_total = len(names)
+            for name in names:
+                await self._sync(inner, registry.physical(name), shadow_name(name, target.model_id), target, throttled=True)
+                self.collections_done += 1
+
+            self.status = "switching"
+            async with index_writes.exclusive():
+                # Коллекции и чанки, появившиеся за время миграции; новые записи ждут переключения
+                names = rag.store.list_collections()
+                self.collections_total = len(names)
+                for name in names:
+                    await self._sync(inner, registry.physical(name), shadow_name(name, target.model_id), target, throttled=False)
+                previous = {name: registry.physical(name) for name in names}
+                mapping = {name: shadow_name(name, target.model_id) for name in names}
+                for name in names:
+                    self._finalize(inner, previous[name], mapping[name], target.model_id)
+                registry.switch(mapping, target.model_id)
+                self.collections_done = len(names)
+                old_embedder, rag.embedder = rag.embedder, target
+
+            await asyncio.sleep(DRAIN_SECONDS)
+            old_embedder.close()
+            live = {e["physical"] for e in registry.collections.values()}
+            for physical in inner.list_collections():
+                if physical not in live and (physical in previous.values() or SHADOW_SEPARATOR in physical):
+                    inner.delete_collection(physical)
+            self.status = "done"
+            logger.info(f"Migration to {target.model_id} finished: {len(names)} collections, {self.chunks_embedded} chunks")
+        except Exception as e:
+            # Индекс на старой модели продолжает работать; теневые коллекции остаются для повторного запуска
+            self.status, self.error = "failed", str(e)
+            if rag.embedder is not target:
+                target.close()
+            logger.error(f"Migration to {target.model_id} failed: {e}")
+        finally:
+            self.finished_at = datetime.now(timezone.utc).isoformat()
+
+    def snapshot(self) -> dict:
+        return {
+            "status": self.status,
+            "target_model": self.target_model,
+            "collections_total": self.collections_total,
+            "collections_done": self.collections_done,
+            "chunks_embedded": self.chunks_embedded,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+index_writes = IndexWriteGate()
+embedding_migration = EmbeddingMigration()
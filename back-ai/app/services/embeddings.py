@@ -0,0 +1,176 @@
+"""
+Провайдеры эмбеддингов для RAGService (EMBEDDING_PROVIDER).
+
+  - OllamaEmbeddingProvider - /api/embeddings через пул узлов Ollama (как раньше); до
+                              EMBEDDING_OLLAMA_BATCH_SIZE запросов одновременно;
+  - LocalEmbeddingProvider  - sentence-transformers в процессе на CPU: модель из локального
+                              каталога, батчи считаются в пуле потоков, эмбеддинги не стоят
+                              в очереди Ollama за генерациями;
+  - HashEmbeddingProvider   - детерминированные векторы из хэша текста для тестов и бенчмарков.
+
+Векторы разных провайдеров (и моделей) несовместимы. model_id записывается в каждый чанк и
+в реестр коллекций; после смены провайдера или модели коллекции переиндексируются фоновой
+миграцией (app.services.embedding_migration), а до ее завершения запросы эмбеддятся старой моделью.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import struct
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.services.ollama_pool import ollama_pool
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingProvider(ABC):
+    batch_size: int = 1
+
+    @property
+    @abstractmethod
+    def model_id(self) -> str:
+        """Идентификатор провайдера и модели ("ollama:nomic-embed-text") - векторы с разными id несравнимы."""
+
+    @abstractmethod
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]: ...
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            embeddings.extend(await self._embed_batch(texts[start:start + self.batch_size]))
+        return embeddings
+
+    def close(self):
+        pass
+
+
+class OllamaEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model: str, batch_size: int):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+
+    @property
+    def model_id(self) -> str:
+        return f"ollama:{self.model}"
+
+    async def _embed_one(self, text: str, model: str) -> List[float]:
+        # Некоторые версии Ollama требуют "model" и "prompt"
+        response = await ollama_pool.post("/api/embeddings", json={
+            "model": model,
+            "prompt": text
+        }, timeout=settings.EMBEDDING_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # Подмена модели при ошибке (прежний fallback на v1.5) смешала бы векторы разных моделей
+        try:
+            return list(await asyncio.gather(*(self._embed_one(t, self.model) for t in texts)))
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Error requesting embedding for model {self.model}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Connection error to Ollama: {e}")
+            raise
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model_path: str, batch_size: int, threads: int, workers: int, trust_remote_code: bool = False):
+        self.model_path = model_path
+        self.batch_size = max(1, batch_size)
+        self.threads = threads
+        self.trust_remote_code = trust_remote_code
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="embed")
+        self._model = None
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def model_id(self) -> str:
+        return f"local:{os.path.normpath(self.model_path)}"
+
+    def _load(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+        model = SentenceTransformer(self.model_path, device="cpu", trust_remote_code=self.trust_remote_code)
+        logger.info(f"Local embedding model loaded from {self.model_path} (threads: {torch.get_num_threads()})")
+        return model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False)
+        return vectors.astype(np.float32).tolist()
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        if self._model is None:
+            async with self._load_lock:
+                if self._model is None:
+                    self._model = await loop.run_in_executor(self._executor, self._load)
+        return await loop.run_in_executor(self._executor, self._encode, texts)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        # Батчи отправляются в пул одновременно: при EMBEDDING_LOCAL_WORKERS > 1 считаются параллельно
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(b) for b in batches))
+        return [vector for batch in results for vector in batch]
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class HashEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, dim: int, batch_size: int = 256):
+        self.dim = dim
+        self.batch_size = batch_size
+
+    @property
+    def model_id(self) -> str:
+        return f"hash:{self.dim}"
+
+    def vector(self, text: str) -> List[float]:
+        seed = hashlib.sha256(text.encode()).digest()
+        raw = np.array(struct.unpack(f"<{self.dim}i", hashlib.shake_256(seed).digest(4 * self.dim)), dtype=np.float32)
+        return (raw / np.linalg.norm(raw)).tolist()
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self.vector(t) for t in texts]
+
+
+def provider_for_model(model_id: str) -> EmbeddingProvider:
+    """Провайдер по model_id из реестра коллекций (настройки батчей и потоков - текущие)."""
+    kind, _, model = model_id.partition(":")
+    if kind == "local":
+        return LocalEmbeddingProvider(
+            model,
+            batch_size=settings.EMBEDDING_LOCAL_BATCH_SIZE,
+            threads=settings.EMBEDDING_LOCAL_THREADS,
+            workers=settings.EMBEDDING_LOCAL_WORKERS,
+            trust_remote_code=settings.EMBEDDING_LOCAL_TRUST_REMOTE_CODE
+        )
+    if kind == "hash":
+        return HashEmbeddingProvider(int(model))
+    if kind == "ollama":
+        return OllamaEmbeddingProvider(model, settings.EMBEDDING_OLLAMA_BATCH_SIZE)
+    raise ValueError(f"Unknown embedding model id: {model_id}")
+
+
+def configured_model_id() -> str:
+    """model_id провайдера и модели из настроек (EMBEDDING_PROVIDER и связанные параметры)."""
+    if settings.EMBEDDING_PROVIDER == "local":
+        return f"local:{os.path.normpath(settings.EMBEDDING_LOCAL_MODEL_PATH)}"
+    if settings.EMBEDDING_PROVIDER == "hash":
+        return f"hash:{settings.EMBEDDING_HASH_DIM}"
+    return f"ollama:{settings.EMBEDDING_MODEL_NAME}"
+
+
+def create_embedding_provider() -> EmbeddingProvider:
+    return provider_for_model(configured_model_id())
@@ -0,0 +1,65 @@
+"""
+Эмоция аватара по тексту ответа - локально, без обращения к LLM.
+
+Лексиконный классификатор: у каждой метки набор основ слов/фраз с весами, побеждает метка
+с наибольшей суммой, если она не ниже порога, иначе "neutral". Основа совпадает с началом слова;
+короткие основы, которые встречаются внутри других слов ("рад" - "радиация"), задаются целым
+словом с окончаниями. Все основы одной метки собраны в одно регулярное выражение,
+поэтому классификация занимает микросекунды.
+Набор меток версионирован (EMOTION_LABELS_VERSION) и совпадает с аватаром на фронтенде.
+"""
+import re
+from typing import Dict, List, Tuple
+
+EMOTION_LABELS_VERSION = "v1"
+EMOTION_LABELS = ("neutral", "happy", "thinking")
+DEFAULT_EMOTION = "neutral"
+
+# Основы (начало слова) и фразы в нижнем регистре, "ё" заменяется на "е". Это фрагменты регулярных
+# выражений: допустимы только незахватывающие группы (?:...), "\b" в конце ограничивает слово целиком
+_LEXICON: Dict[str, List[Tuple[str, float]]] = {
+    "happy": [
+        (r"рад(?:а|ы)?\b", 1.5), ("радост", 1.0), ("поздравл", 2.0), ("добро пожаловать", 2.0), ("отличн", 1.0), ("замечательн", 1.5),
+        ("прекрасн", 1.0), ("здорово", 1.0), ("молодец", 1.5), ("успех", 1.0), ("удач", 1.0),
+        ("спасибо", 0.5), ("благодар", 0.5), ("с удовольствием", 1.5), ("приятно", 1.0), ("горжусь", 1.5),
+        ("желаю", 1.0), ("получилось", 1.0), ("справил", 1.0),
+    ],
+    "thinking": [
+        ("к сожалению", 2.0), ("нет информации", 2.0), ("не нашел", 1.5), ("не удалось", 1.5),
+        ("обратитесь к наставнику", 1.5), ("уточните", 1.5), ("уточнить", 1.0), ("затрудняюсь", 2.0),
+        ("возможно", 1.0), ("вероятно", 1.0), ("не уверен", 2.0), ("зависит от", 1.0), ("сложно сказать", 2.0),
+        ("предполож", 1.0), ("неясно", 1.5), ("не могу", 1.0), ("давайте разберемся", 1.5), ("подумаем", 1.5),
+    ],
+}
+THRESHOLD = 1.0
+_EXCLAMATION_WEIGHT = 0.5 # "!" усиливает happy
+_QUESTION_WEIGHT = 0.5 # вопрос к сотруднику - скорее задумчивость
+
+
+def _compile(entries: List[Tuple[str, float]]):
+    ordered = sorted(entries, key=lambda e: -len(e[0]))
+    # Каждая основа - своя группа: вес совпадения берется по номеру группы (match.lastindex)
+    pattern = re.compile(r"\b(?:" + "|".join(f"({stem})" for stem, _ in ordered) + r")")
+    return pattern, [weight for _, weight in ordered]
+
+
+_PATTERNS = {label: _compile(entries) for label, entries in _LEXICON.items()}
+
+
+def emotion_scores(text: str) -> Dict[str, float]:
+    normalized = text.lower().replace("ё", "е")
+    scores = {}
+    for label, (pattern, weights) in _PATTERNS.items():
+        scores[label] = sum(weights[m.lastindex - 1] for m in pattern.finditer(normalized))
+    scores["happy"] += _EXCLAMATION_WEIGHT * min(normalized.count("!"), 2)
+    scores["thinking"] += _QUESTION_WEIGHT * min(normalized.count("?"), 2)
+    return scores
+
+
+def classify_emotion(text: str) -> str:
+    """Метка из EMOTION_LABELS для текста ответа."""
+    if not text:
+        return DEFAULT_EMOTION
+    scores = emotion_scores(text)
+    label = max(scores, key=scores.get)
+    return label if scores[label] >= THRESHOLD else DEFAULT_EMOTION
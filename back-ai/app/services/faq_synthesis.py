@@ -0,0 +1,170 @@
+"""
+Офлайн-синтез FAQ по источникам: LLM предлагает вероятные вопросы новичков и ответы по тексту
+источника. Пары хранятся в той же коллекции, что и чанки источника (source_id тот же, поэтому
+удаляются вместе с ним), со статусом faq_status:
+    "pending"  - ждет проверки HR, в поиск не попадает;
+    "approved" - участвует в поиске и в быстром ответе Q&A (qna_part="question").
+Отклоненные пары удаляются. Работает в общей фоновой очереди с низким приоритетом (app.services.llm_priority).
+"""
+import json
+import logging
+from typing import List, Optional
+
+from app.core.config import settings
+from app.services import prompts
+from app.services.generator import generator_service
+from app.services.ollama_pool import ollama_pool
+from app.services.llm_priority import background_queue, wait_for_background_slot
+from app.services.embedding_migration import index_writes
+from app.services.rag_service import rag_service, is_raw_chunk, MEMBERSHIP_PREFIXES, membership_key
+
+logger = logging.getLogger(__name__)
+
+FAQ_SOURCE_TYPE = "FAQ"
+
+
+def faq_filter(source_id=None, status: Optional[str] = None, workspace_id=None) -> dict:
+    conditions = [{"source_type": FAQ_SOURCE_TYPE}]
+    if source_id:
+        conditions.append({"source_id": str(source_id)})
+    if status:
+        conditions.append({"faq_status": status})
+    if workspace_id and rag_service.layout == "organization":
+        conditions.append({membership_key("track", workspace_id): True})
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class FaqSynthesizer:
+    def enqueue(self, workspace_id, source_id, organization_id=None) -> bool:
+        """Ставит источник в фоновую очередь синтеза. False - уже в очереди."""
+        async def job():
+            created = await self.synthesize(workspace_id, source_id, organization_id)
+            logger.info(f"Source {source_id}: {created} pairs waiting for review")
+        return background_queue.enqueue(f"faq:{source_id}", job)
+
+    async def _propose_pairs(self, text: str) -> List[dict]:
+        await wait_for_background_slot()
+        async with generator_service.llm_semaphore:
+            response = await ollama_pool.post("/api/generate", json={
+                "model": settings.LLM_MODEL_NAME,
+                "prompt": prompts.faq_prompt(text, settings.FAQ_PAIRS_PER_WINDOW),
+                "stream": False,
+                "format": "json",
+                "keep_alive": settings.LLM_KEEP_ALIVE,
+                "options": {"temperature": 0.2}
+            }, affinity="faq", timeout=settings.LLM_GENERATION_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        data = json.loads(generator_service._clean_json_response(response.json().get("response", "")))
+        if isinstance(data, dict):
+            data = next((v for v in data.values() if isinstance(v, list)), [])
+        return [
+            {"question": p["question"].strip(), "answer": p["answer"].strip()}
+            for p in data
+            if isinstance(p, dict) and p.get("question") and p.get("answer")
+        ]
+
+    async def synthesize(self, workspace_id, source_id, organization_id=None) -> int:
+        """Пересоздает FAQ источника (старые пары, включая одобренные, заменяются). Возвращает число пар."""
+        store = rag_service.store
+        collection_name = rag_service.collection_name(workspace_id, organization_id)
+        chunks = store.get(collection_name, where={"source_id": str(source_id)})
+        originals = [
+            (doc, meta) for doc, meta in zip(chunks["documents"], chunks["metadatas"])
+            if is_raw_chunk(meta)
+        ]
+        if not originals:
+            return 0
+
+        # Окна текста по FAQ_WINDOW_CHARS, не больше FAQ_MAX_WINDOWS на источник
+        windows, current = [], ""
+        for doc, _ in originals:
+            if current and len(current) + len(doc) > settings.FAQ_WINDOW_CHARS:
+                windows.append(current)
+                current = ""
+            current = f"{current}\n{doc}" if current else doc
+        windows.append(current)
+
+        pairs = []
+        for window in windows[:settings.FAQ_MAX_WINDOWS]:
+            pairs.extend(await self._propose_pairs(window[:settings.FAQ_WINDOW_CHARS]))
+        if not pairs:
+            return 0
+
+        first_meta = originals[0][1]
+        shared = {k: v for k, v in first_meta.items() if k.startswith(MEMBERSHIP_PREFIXES)}
+        ids = [f"{source_id}_faq_{i}" for i in range(len(pairs))]
+        metadatas = [
+            {
+                **shared,
+                "source_id": str(source_id),
+                "source_name": first_meta.get("source_name", "Документ"),
+                "source_type": FAQ_SOURCE_TYPE,
+                "faq_id": chunk_id,
+                "faq_status": "pending",
+                "question": pair["question"],
+                "answer": pair["answer"],
+            }
+            for chunk_id, pair in zip(ids, pairs)
+        ]
+        async with index_writes.writing():
+            embeddings = await rag_service.embed_texts([p["question"] for p in pairs])
+            store.delete(collection_name, where=faq_filter(source_id))
+            store.upsert(
+                collection_name,
+                ids=ids,
+                embeddings=embeddings,
+                documents=[f"Вопрос: {p['question']}\nОтвет: {p['answer']}" for p in pairs],
+                metadatas=metadatas
+            )
+        return len(pairs)
+
+    def list_entries(self, workspace_id=None, organization_id=None, source_id=None, status: Optional[str] = None) -> List[dict]:
+        collection_name = rag_service.collection_name(workspace_id, organization_id)
+        page = rag_service.store.get(collection_name, where=faq_filter(source_id, status, workspace_id))
+        return [
+            {
+                "id": meta["faq_id"],
+                "source_id": meta["source_id"],
+                "source_name": meta.get("source_name"),
+                "question": meta.get("question", ""),
+                "answer": meta.get("answer", ""),
+                "status": meta.get("faq_status", "pending"),
+            }
+            for meta in page["metadatas"]
+        ]
+
+    async def review(self, items: List[dict], workspace_id=None, organization_id=None) -> dict:
+        """items: [{"id", "action": approve|reject, "question"?, "answer"?}]"""
+        store = rag_service.store
+        collection_name = rag_service.collection_name(workspace_id, organization_id)
+        approved = rejected = 0
+        for item in items:
+            # И одобрение, и отклонение - записи: во время миграции эмбеддингов (index_writes) они ждут,
+            # иначе удаленная пара вернется из теневой копии
+            async with index_writes.writing():
+                current = store.get(collection_name, ids=[item["id"]], include_embeddings=True)
+                if not current["ids"]:
+                    continue
+                if item["action"] == "reject":
+                    store.delete(collection_name, where={"faq_id": item["id"]})
+                    rejected += 1
+                    continue
+
+                meta = current["metadatas"][0]
+                question = item.get("question") or meta["question"]
+                answer = item.get("answer") or meta["answer"]
+                embedding = current["embeddings"][0]
+                if question != meta["question"]:
+                    embedding = (await rag_service.embed_texts([question]))[0]
+                store.upsert(
+                    collection_name,
+                    ids=[item["id"]],
+                    embeddings=[embedding],
+                    documents=[f"Вопрос: {question}\nОтвет: {answer}"],
+                    metadatas=[{**meta, "question": question, "answer": answer, "faq_status": "approved", "qna_part": "question"}]
+                )
+                approved += 1
+        return {"approved": approved, "rejected": rejected}
+
+
+faq_synthesizer = FaqSynthesizer()
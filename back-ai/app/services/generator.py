@@ -1,20 +1,26 @@
-import httpx
+import asyncio
 import json
+import logging
 import re
 from typing import List
 from app.core.config import settings
 from app import schemas_ai
+from app.services import prompts
+from app.services.prompts import prompt_cache_stats
+from app.services.ollama_pool import ollama_pool
+
+logger = logging.getLogger(__name__)
 
 class QuizGenerator:
     def __init__(self):
-        # Увеличиваем таймаут до 300 секунд (5 минут), так как Llama на CPU может быть медленной
-        self.ollama_client = httpx.AsyncClient(base_url=str(settings.OLLAMA_HOST), timeout=300.0)
+        # Общий лимит на генерации: массовая генерация по треку не должна занимать всю LLM
+        self.llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
 
     def _clean_json_response(self, text: str) -> str:
         """
         Очищает ответ LLM от Markdown разметки (```json ... ```)
         """
-        print(f"[Generator DEBUG] Cleaning text: {text[:100]}...") # Log start of text
+        logger.debug("Cleaning text: %s...", text[:100])
         
         # 1. Пытаемся найти блок кода ```json ... ```
         match = re.search(r"```json\s*([\s\S]*?)\s*```", text)
@@ -40,46 +46,31 @@ class QuizGenerator:
         """
         Генерирует вопросы на основе переданного текста.
         """
-        prompt = f"""
-        You are a quiz generator. 
-        Task: Create 3 multiple-choice questions based on the text below.
-        Output format: A raw JSON list of objects. NO introduction, NO markdown formatting, just the JSON array.
-        
-        [Text]
-        {text_content[:3000]} 
-        
-        [JSON Schema]
-        [
-            {{
-                "question_text": "Question?",
-                "options": [
-                    {{"text": "Option 1", "is_correct": false}},
-                    {{"text": "Option 2", "is_correct": true}}
-                ]
-            }}
-        ]
-        """
+        # Инструкция и схема - постоянный префикс (кэшируется Ollama), текст - в конце
+        prompt = prompts.quiz_prompt(text_content[:3000])
 
-        print(f"[Generator] Sending request to Ollama ({settings.LLM_MODEL_NAME})...")
+        logger.debug("Sending request to Ollama (%s)", settings.LLM_MODEL_NAME)
         
         try:
             # Используем format="json" для принудительного JSON режима
-            response = await self.ollama_client.post("/api/generate", json={
-                "model": settings.LLM_MODEL_NAME,
-                "prompt": prompt,
-                "stream": False,
-                "format": "json", 
-                "options": {
-                    "temperature": 0.1 # Минимальная температура для строгости
-                }
-            })
+            async with self.llm_semaphore:
+                response = await ollama_pool.post("/api/generate", json={
+                    "model": settings.LLM_MODEL_NAME,
+                    "prompt": prompt,
+                    "stream": False,
+                    "format": "json", 
+                    "keep_alive": settings.LLM_KEEP_ALIVE,
+                    "options": {
+                        "temperature": 0.1 # Минимальная температура для строгости
+                    }
+                }, affinity="quiz", timeout=settings.LLM_GENERATION_TIMEOUT_SECONDS) # общий префикс - на одном узле, пока он не перегружен
             response.raise_for_status()
+            prompt_cache_stats.record("quiz", response.json())
             
             result_text = response.json().get("response", "")
             
-            # --- DEBUG LOG: Самое важное! ---
-            print(f"\n[DEBUG] OLLAMA RAW RESPONSE:\n{result_text}\n[END DEBUG]\n")
-            # --------------------------------
+            # Сырой ответ целиком - только на DEBUG и для выборки запросов (LOG_DEBUG_SAMPLE_RATE)
+            logger.debug("Ollama raw response: %s", result_text)
 
             # Очистка и парсинг
             cleaned_json = self._clean_json_response(result_text)
@@ -93,20 +84,20 @@ class QuizGenerator:
                         break
             
             if not isinstance(questions_data, list):
-                print(f"[Generator] Error: Model returned {type(questions_data)} instead of list")
+                logger.error(f"Model returned {type(questions_data).__name__} instead of list")
                 return []
 
             # Валидируем через Pydantic
             questions = [schemas_ai.GeneratedQuestion(**q) for q in questions_data]
-            print(f"[Generator] Successfully parsed {len(questions)} questions")
+            logger.info(f"Parsed {len(questions)} questions")
             return questions
 
         except json.JSONDecodeError as e:
-            print(f"[Generator] JSON Parsing Error: {e}")
-            print(f"[Generator] Faulty JSON: {cleaned_json}")
+            logger.error(f"JSON parsing error: {e}")
+            logger.debug("Faulty JSON: %s", cleaned_json)
             return []
         except Exception as e:
-            print(f"[Generator] General Error: {e}")
+            logger.error(f"Quiz generation failed: {e}")
             return []
 
 generator_service = QuizGenerator()
\ No newline at end of file
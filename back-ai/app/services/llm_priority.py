@@ -0,0 +1,119 @@
+"""
+Приоритет интерактивных запросов к LLM над фоновыми задачами.
+
+Ответы в чате помечаются через `async with llm_activity.interactive()`. Фоновая работа
+(синтез FAQ, сводки документов) идет через общую очередь `background_queue` с одним
+исполнителем и перед каждым обращением к LLM ждет `wait_for_background_slot()` - окна
+непиковых часов и паузы без интерактивных запросов.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.services import tracing
+from app.services.metrics import BACKGROUND, current_endpoint, register_collector
+
+logger = logging.getLogger(__name__)
+
+OFFPEAK_POLL_SECONDS = 300
+
+
+class LLMActivity:
+    def __init__(self):
+        self._active = 0
+        self._last_busy = 0.0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @asynccontextmanager
+    async def interactive(self):
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._last_busy = time.monotonic()
+
+    async def wait_idle(self, quiet_seconds: float, poll_seconds: float = 1.0):
+        """Ждет, пока не будет интерактивных запросов хотя бы quiet_seconds."""
+        while True:
+            if not self._active:
+                remaining = quiet_seconds - (time.monotonic() - self._last_busy)
+                if remaining <= 0:
+                    return
+                await asyncio.sleep(min(remaining, poll_seconds))
+            else:
+                await asyncio.sleep(poll_seconds)
+
+
+def in_offpeak_window(spec: str, now: Optional[datetime] = None) -> bool:
+    """spec - "22-7" (часы начала и конца, через полночь допустимо); пустая строка - всегда."""
+    if not spec:
+        return True
+    start, end = (int(part) for part in spec.split("-"))
+    hour = (now or datetime.now()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+async def wait_for_background_slot():
+    while not in_offpeak_window(settings.BACKGROUND_LLM_OFFPEAK_HOURS):
+        await asyncio.sleep(OFFPEAK_POLL_SECONDS)
+    await llm_activity.wait_idle(settings.BACKGROUND_LLM_IDLE_SECONDS)
+
+
+class BackgroundQueue:
+    """Очередь фоновых задач с одним исполнителем; задача с тем же ключом не ставится дважды."""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._keys: set = set()
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._keys)
+
+    def enqueue(self, key: str, job: Callable[[], Awaitable[object]]) -> bool:
+        if key in self._keys:
+            return False
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._keys.add(key)
+        self._queue.put_nowait((key, job))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return True
+
+    async def _run(self):
+        # Задача создается из запроса и наследует его контекст - метрики фоновых задач помечаем отдельно
+        current_endpoint.set(BACKGROUND)
+        while not self._queue.empty():
+            key, job = await self._queue.get()
+            try:
+                # Каждая задача - отдельная трасса, а не продолжение запроса, создавшего исполнителя
+                with tracing.span(f"background {key}", new_trace=True):
+                    await job()
+            except Exception as e:
+                logger.error(f"{key} failed: {e}")
+            finally:
+                self._keys.discard(key)
+
+
+llm_activity = LLMActivity()
+background_queue = BackgroundQueue()
+
+
+def _collect_queue():
+    yield "kb_queue_depth", "gauge", "Requests waiting in queue", [({"queue": "background_llm"}, background_queue.pending)]
+    yield "kb_in_flight", "gauge", "Requests being processed", [({"queue": "interactive_llm"}, llm_activity.active)]
+
+
+register_collector(_collect_queue)
@@ -0,0 +1,163 @@
+"""
+Метрики AI-сервиса в текстовом формате Prometheus (GET /metrics).
+
+    kb_stage_seconds{stage, endpoint, model}       - гистограммы этапов: parse, split, embed, upsert, retrieve, generate
+    kb_llm_tokens_total{kind, endpoint, model}     - токены промпта (prompt) и ответа (completion) по данным Ollama
+    kb_llm_tokens_per_second{endpoint, model}      - скорость генерации (eval_count / eval_duration)
+    kb_queue_depth{queue}, kb_in_flight{queue}     - очереди контроля допуска, фоновых задач и узлов Ollama
+    kb_prompt_cache_hit_ratio{kind}                - доля токенов промпта из кэша Ollama
+    kb_router_requests_total{route}                - ответы по маршрутам (шаблон / Q&A / малая / основная модель)
+    kb_traces_total{decision}                      - решения сэмплера медленных трасс (app.services.tracing)
+
+endpoint - шаблон маршрута запроса, в котором идет работа ("/query", "/process-file"), для фоновых
+задач - "background". Значения очередей и кэшей снимаются в момент запроса /metrics: модули регистрируют
+функции через register_collector, одноименные метрики разных модулей сливаются в одну.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from app.services import tracing
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND = "background"
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500)
+
+current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar("current_endpoint", default=BACKGROUND)
+
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str]):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(dict(zip(self.labelnames, key)))} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {} # key -> [counts по бакетам..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': '+Inf'})} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(labels)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(labels)} {series[-1]}")
+        return lines
+
+
+stage_seconds = Histogram("kb_stage_seconds", "Duration of pipeline stages", ("stage", "endpoint", "model"), STAGE_BUCKETS)
+llm_tokens = Counter("kb_llm_tokens_total", "Prompt and completion tokens reported by Ollama", ("kind", "endpoint", "model"))
+llm_tokens_per_second = Histogram(
+    "kb_llm_tokens_per_second", "Generation speed reported by Ollama", ("endpoint", "model"), TOKENS_PER_SECOND_BUCKETS
+)
+
+# Метрики, значения которых снимаются при запросе: fn() -> (name, type, help, [(labels, value)])
+_collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+
+def register_collector(fn: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+    _collectors.append(fn)
+
+
+@contextmanager
+def observe_stage(stage: str, model: str = ""):
+    """Гистограмма этапа и span трассировки с тем же именем."""
+    started = time.perf_counter()
+    try:
+        with tracing.span(stage, model=model):
+            yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, stage=stage, endpoint=current_endpoint.get(), model=model)
+
+
+def record_generation(model: str, response: dict):
+    """Токены и скорость из ответа Ollama /api/generate (stream=False)."""
+    endpoint = current_endpoint.get()
+    prompt_tokens = response.get("prompt_eval_count") or 0
+    completion_tokens = response.get("eval_count") or 0
+    llm_tokens.inc(prompt_tokens, kind="prompt", endpoint=endpoint, model=model)
+    llm_tokens.inc(completion_tokens, kind="completion", endpoint=endpoint, model=model)
+    eval_duration = response.get("eval_duration") # наносекунды
+    if completion_tokens and eval_duration:
+        llm_tokens_per_second.observe(completion_tokens / (eval_duration / 1e9), endpoint=endpoint, model=model)
+
+
+def _collect_traces():
+    snapshot = tracing.exporter.snapshot()
+    yield "kb_traces_total", "counter", "Finished local traces by sampling decision", [
+        ({"decision": decision}, snapshot[decision]) for decision in ("kept", "sampled_out", "dropped")
+    ]
+
+
+register_collector(_collect_traces)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in (stage_seconds, llm_tokens, llm_tokens_per_second):
+        lines.extend(metric.render())
+    families: Dict[str, Tuple[str, str, List[Sample]]] = {}
+    for collect in _collectors:
+        try:
+            for name, kind, help_text, samples in collect():
+                families.setdefault(name, (kind, help_text, []))[2].extend(samples)
+        except Exception as e:
+            logger.error(f"Collector {getattr(collect, '__name__', collect)} failed: {e}")
+    for name, (kind, help_text, samples) in families.items():
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+        lines.extend(f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,37 @@
+"""
+Maximal marginal relevance: из пула кандидатов выбирает k чанков, балансируя близость к запросу
+и непохожесть на уже выбранные (lambda_ = 1 - обычный top-k, 0 - максимум разнообразия).
+С chunk_overlap соседние чанки почти совпадают, и без MMR top-5 часто - копии одного фрагмента.
+Матрица попарных сходств считается одним умножением, цикл выбора - O(k * n) векторных операций.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, lambda_: float) -> Tuple[List[int], np.ndarray]:
+    """Возвращает (индексы выбранных кандидатов по порядку выбора, их косинусная близость к запросу)."""
+    n = candidates.shape[0]
+    if n == 0 or k <= 0:
+        return [], np.empty(0, dtype=np.float32)
+    vectors = np.asarray(candidates, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    k = min(k, n)
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    for _ in range(k - 1):
+        scores = lambda_ * relevance - (1.0 - lambda_) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected, relevance[selected]
@@ -0,0 +1,105 @@
+"""
+Маршрутизация вопросов между шаблонным ответом, малой моделью и основной LLM.
+
+Маршруты:
+    "template" - приветствие/благодарность/прощание: готовая фраза без поиска и генерации;
+    "qna"      - почти дословное совпадение с курируемым Q&A (RAGService.qna_fast_path);
+    "small"    - короткий конкретный вопрос, ответ на который явно есть в найденном чанке (LLM_SMALL_MODEL_NAME);
+    "main"     - все остальное (LLM_MODEL_NAME).
+Решение принимается по правилам и оценкам поиска: классификатор не должен стоить вызова модели.
+"""
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.services.breadth import LEVEL_CHUNK
+from app.services.metrics import register_collector
+
+ROUTE_TEMPLATE = "template"
+ROUTE_QNA = "qna"
+ROUTE_SMALL = "small"
+ROUTE_MAIN = "main"
+LATENCY_WINDOW = 1000 # сколько последних запросов маршрута учитывать в перцентилях
+
+SMALLTALK_REPLIES = {
+    "greeting": "Здравствуйте! Я помогу разобраться с адаптацией. Задайте вопрос о компании, задачах или документах.",
+    "thanks": "Пожалуйста! Если появятся еще вопросы - спрашивайте.",
+    "bye": "До свидания! Удачи в адаптации.",
+}
+# Сообщение целиком - вежливая фраза ("Спасибо, а где столовая?" сюда не попадает)
+_SMALLTALK_PATTERNS = {
+    "greeting": re.compile(r"(привет\w*|здравствуй\w*|добр\w+ (день|утро|вечер)|hi|hello)( всем| коллеги)?"),
+    "thanks": re.compile(r"(спасибо|спс|благодарю|thanks|thank you)( большое| огромное| вам| тебе| за помощь| за ответ)*"),
+    "bye": re.compile(r"(пока|до свидания|до встречи|bye)( всем)?"),
+}
+# Признаки вопроса, которому нужно рассуждение, а не пересказ одного фрагмента
+_COMPLEX_PATTERNS = re.compile(
+    r"\b(почему|зачем|сравн\w*|чем отлича\w*|разниц\w*|объясни\w*|как лучше|если)\b"
+)
+
+
+def smalltalk_reply(question: str) -> Optional[str]:
+    text = " ".join(re.sub(r"[^\w\s]", " ", question.lower().replace("ё", "е")).split())
+    for kind, pattern in _SMALLTALK_PATTERNS.items():
+        if pattern.fullmatch(text):
+            return SMALLTALK_REPLIES[kind]
+    return None
+
+
+def choose_route(question: str, level: str, results: List[dict]) -> str:
+    """Малая модель - только если она настроена и ответ почти наверняка лежит в лучшем найденном чанке."""
+    if not settings.LLM_SMALL_MODEL_NAME or level != LEVEL_CHUNK or not results:
+        return ROUTE_MAIN
+    text = question.lower().replace("ё", "е")
+    if len(text.split()) > settings.ROUTER_SMALL_MAX_WORDS or text.count("?") > 1 or _COMPLEX_PATTERNS.search(text):
+        return ROUTE_MAIN
+    if max(r["score"] for r in results) < settings.ROUTER_SMALL_MIN_SCORE:
+        return ROUTE_MAIN
+    return ROUTE_SMALL
+
+
+def route_model(route: str) -> str:
+    return settings.LLM_SMALL_MODEL_NAME if route == ROUTE_SMALL else settings.LLM_MODEL_NAME
+
+
+class RouterStats:
+    """Число запросов и задержка ответа по маршрутам."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+
+    def record(self, route: str, seconds: float):
+        with self._lock:
+            self._counts[route] = self._counts.get(route, 0) + 1
+            self._latencies.setdefault(route, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            total = sum(self._counts.values())
+            result = {}
+            for route, count in self._counts.items():
+                latencies = sorted(self._latencies[route])
+                result[route] = {
+                    "requests": count,
+                    "share": count / total,
+                    "avg_ms": 1000 * sum(latencies) / len(latencies),
+                    "p50_ms": 1000 * latencies[len(latencies) // 2],
+                    "p95_ms": 1000 * latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+                }
+            return result
+
+
+router_stats = RouterStats()
+
+
+def _collect_routes():
+    yield "kb_router_requests_total", "counter", "Chat answers by route", [
+        ({"route": route}, stats["requests"]) for route, stats in router_stats.snapshot().items()
+    ]
+
+
+register_collector(_collect_routes)
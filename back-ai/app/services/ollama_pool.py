@@ -0,0 +1,186 @@
+"""
+Пул узлов Ollama (OLLAMA_NODES) для всех обращений к LLM и эмбеддингам.
+
+Выбор узла:
+    - только здоровые узлы, на которых есть нужная модель (список моделей - из /api/tags при проверке);
+    - запрос с affinity (сессия чата, тип фоновой задачи) идет на "свой" узел (rendezvous-хэш),
+      чтобы не терять KV-кэш префикса промпта, пока этот узел не занят заметно сильнее других;
+    - иначе - узел с наименьшим числом выполняющихся запросов.
+Узел после OLLAMA_EJECT_FAILURES ошибок подряд (или сразу после неудачной проверки здоровья)
+исключается на OLLAMA_EJECT_SECONDS; проверка возвращает его раньше, если /api/tags снова отвечает. Если исключены все
+узлы, запросы идут на все (лучше попытаться, чем гарантированно вернуть ошибку).
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from app.core.config import settings
+from app.services import tracing
+from app.services.metrics import Sample, observe_stage, record_generation, register_collector
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT_SECONDS = 300.0 # если вызывающий код не задал дедлайн операции
+HEALTH_TIMEOUT_SECONDS = 5.0
+CONNECT_TIMEOUT_SECONDS = 5.0
+# Ошибки, при которых запрос точно не начал выполняться на узле - безопасно повторить на другом
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+RETRYABLE_STATUSES = (502, 503, 504)
+
+
+def _model_key(name: str) -> str:
+    """"nomic-embed-text" и "nomic-embed-text:latest" в Ollama - одна модель."""
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaNode:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.client = httpx.AsyncClient(base_url=self.url, timeout=REQUEST_TIMEOUT_SECONDS)
+        self.outstanding = 0
+        self.models: Optional[Set[str]] = None # None - еще не проверяли, считаем что модель есть
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def serves(self, model: Optional[str]) -> bool:
+        return not model or self.models is None or _model_key(model) in self.models
+
+    def mark_success(self):
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def mark_failure(self, eject: bool = False):
+        """eject - исключить сразу (не прошла активная проверка здоровья)."""
+        self.errors += 1
+        self.failures += 1
+        if eject or self.failures >= settings.OLLAMA_EJECT_FAILURES:
+            if self.available:
+                logger.warning(f"Node {self.url} ejected for {settings.OLLAMA_EJECT_SECONDS}s after {self.failures} failures")
+            self.ejected_until = time.monotonic() + settings.OLLAMA_EJECT_SECONDS
+
+
+class OllamaPool:
+    def __init__(self, urls: List[str]):
+        self.nodes = [OllamaNode(url) for url in urls]
+
+    def _affinity_rank(self, key: str, node: OllamaNode) -> bytes:
+        return hashlib.md5(f"{key}|{node.url}".encode()).digest()
+
+    def pick(self, model: Optional[str] = None, affinity: Optional[str] = None, exclude: Set[str] = frozenset()) -> OllamaNode:
+        nodes = [n for n in self.nodes if n.url not in exclude] or self.nodes
+        candidates = [n for n in nodes if n.available and n.serves(model)]
+        if not candidates:
+            candidates = [n for n in nodes if n.serves(model)] or nodes
+        least = min(candidates, key=lambda n: n.outstanding)
+        if affinity:
+            preferred = max(candidates, key=lambda n: self._affinity_rank(affinity, n))
+            if preferred.outstanding <= least.outstanding + settings.OLLAMA_AFFINITY_SLACK:
+                return preferred
+        return least
+
+    async def post(self, path: str, json: dict, affinity: Optional[str] = None,
+                   timeout: float = REQUEST_TIMEOUT_SECONDS) -> httpx.Response:
+        """
+        POST на выбранный узел; при отказе соединения, 5xx шлюза или отсутствии модели - на следующий.
+        timeout - дедлайн операции. Отмена вызова закрывает соединение, и Ollama прерывает генерацию.
+        """
+        model = json.get("model")
+        if path != "/api/generate":
+            return await self._post(path, json, affinity, timeout)
+        with observe_stage("generate", model or ""):
+            response = await self._post(path, json, affinity, timeout)
+        if response.status_code == 200 and json.get("stream") is False:
+            try:
+                record_generation(model or "", response.json())
+            except ValueError:
+                pass
+        return response
+
+    async def _post(self, path: str, json: dict, affinity: Optional[str], timeout: float) -> httpx.Response:
+        model = json.get("model")
+        tried: Set[str] = set()
+        while True:
+            node = self.pick(model, affinity, tried)
+            tried.add(node.url)
+            last_attempt = len(tried) >= len(self.nodes)
+            node.outstanding += 1
+            node.requests += 1
+            try:
+                # Span на каждую попытку: в трассе видно, на каком узле ждали и куда ушел повтор
+                with tracing.span(f"ollama POST {path}", kind="client", node=node.url, model=model or "") as span:
+                    response = await node.client.post(path, json=json, timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT_SECONDS))
+                    span.set_attribute("status_code", response.status_code)
+            except RETRYABLE_ERRORS as e:
+                node.mark_failure()
+                if last_attempt:
+                    raise
+                logger.warning(f"{node.url} failed ({type(e).__name__}), retrying on another node")
+                continue
+            except Exception:
+                node.mark_failure()
+                raise
+            finally:
+                node.outstanding -= 1
+
+            if response.status_code == 404 and model:
+                # Модели нет на узле (удалили после последней проверки) - пробуем другой
+                if node.models is not None:
+                    node.models.discard(_model_key(model))
+            elif response.status_code in RETRYABLE_STATUSES:
+                node.mark_failure()
+            else:
+                node.mark_success()
+                return response
+            if last_attempt:
+                return response
+
+    async def check_health(self):
+        async def check(node: OllamaNode):
+            try:
+                response = await node.client.get("/api/tags", timeout=HEALTH_TIMEOUT_SECONDS)
+                response.raise_for_status()
+                node.models = {_model_key(m["name"]) for m in response.json().get("models", [])}
+                node.mark_success()
+            except Exception as e:
+                if node.available:
+                    logger.warning(f"Health check failed for {node.url}: {e}")
+                node.mark_failure(eject=True)
+
+        await asyncio.gather(*(check(node) for node in self.nodes))
+
+    async def run_health_checks(self, interval: float):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(interval)
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        return [
+            {
+                "url": node.url,
+                "available": node.available,
+                "outstanding": node.outstanding,
+                "requests": node.requests,
+                "errors": node.errors,
+                "models": sorted(node.models) if node.models is not None else None,
+            }
+            for node in self.nodes
+        ]
+
+
+def _collect_nodes():
+    samples: List[Sample] = [({"queue": f"ollama:{node.url}"}, node.outstanding) for node in ollama_pool.nodes]
+    yield "kb_in_flight", "gauge", "Requests being processed", samples
+
+
+ollama_pool = OllamaPool([u.strip() for u in settings.OLLAMA_NODES.split(",") if u.strip()] or [str(settings.OLLAMA_HOST)])
+register_collector(_collect_nodes)
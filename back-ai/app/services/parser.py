@@ -6,9 +6,13 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
 from langchain_core.documents import Document
 from typing import List
+import logging
 import os
 
 from app.schemas_ai import KnowledgeSourceCreateQA, KnowledgeSourceCreateArticle
+from app.services.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
 
 # Настройка сплиттера
 text_splitter = RecursiveCharacterTextSplitter(
@@ -23,7 +27,8 @@ def _load_and_split(loader_class, file_path, source_name):
     """Вспомогательная функция для загрузки и сплиттинга."""
     try:
         loader = loader_class(file_path)
-        docs = loader.load()
+        with observe_stage("parse"):
+            docs = loader.load()
 
         for doc in docs:
             doc.metadata["source_name"] = source_name
@@ -32,9 +37,10 @@ def _load_and_split(loader_class, file_path, source_name):
             if 'source' in doc.metadata:
                 del doc.metadata['source']
 
-        return text_splitter.split_documents(docs)
+        with observe_stage("split"):
+            return text_splitter.split_documents(docs)
     except Exception as e:
-        print(f"Error parsing {file_path}: {e}")
+        logger.error(f"Error parsing {file_path}: {e}")
         return [Document(
             page_content=f"Ошибка при парсинге файла {source_name}",
             metadata={"source_name": source_name, "error": str(e)}
@@ -42,23 +48,23 @@ def _load_and_split(loader_class, file_path, source_name):
 
 
 def parse_pdf(file_path: str, filename: str) -> List[Document]:
-    print(f"[Parser] Parsing PDF: {filename}")
+    logger.debug("Parsing PDF: %s", filename)
     return _load_and_split(PyPDFLoader, file_path, filename)
 
 
 def parse_docx(file_path: str, filename: str) -> List[Document]:
-    print(f"[Parser] Parsing DOCX: {filename}")
+    logger.debug("Parsing DOCX: %s", filename)
     return _load_and_split(Docx2txtLoader, file_path, filename)
 
 
 def parse_txt(file_path: str, filename: str) -> List[Document]:
-    print(f"[Parser] Parsing TXT: {filename}")
+    logger.debug("Parsing TXT: %s", filename)
     return _load_and_split(TextLoader, file_path, filename)
 
 
 def chunk_qna(qa_in: KnowledgeSourceCreateQA, source_name: str) -> List[Document]:
     """Создает один 'документ' (чанк) для Q&A."""
-    print(f"[Parser] Chunking Q&A: {source_name}")
+    logger.debug("Chunking Q&A: %s", source_name)
     content = f"Вопрос: {qa_in.question}\nОтвет: {qa_in.answer}"
     doc = Document(
         page_content=content,
@@ -67,11 +73,23 @@ def chunk_qna(qa_in: KnowledgeSourceCreateQA, source_name: str) -> List[Document
     return [doc]
 
 
+def qna_question_doc(qa_in: KnowledgeSourceCreateQA, source_name: str) -> Document:
+    """
+    Дополнительная запись Q&A для быстрого ответа: эмбеддинг строится только по вопросу,
+    а готовый ответ лежит в метаданных (RAGService.qna_fast_path).
+    """
+    return Document(
+        page_content=f"Вопрос: {qa_in.question}\nОтвет: {qa_in.answer}",
+        metadata={"source_name": source_name, "source_type": "QNA", "qna_part": "question", "answer": qa_in.answer}
+    )
+
+
 def chunk_article(article_in: KnowledgeSourceCreateArticle) -> List[Document]:
     """Сплиттит статью на чанки."""
-    print(f"[Parser] Chunking Article: {article_in.title}")
+    logger.debug("Chunking Article: %s", article_in.title)
     doc = Document(
         page_content=article_in.content,
         metadata={"source_name": article_in.title, "source_type": "ARTICLE"}
     )
-    return text_splitter.split_documents([doc])
\ No newline at end of file
+    with observe_stage("split"):
+        return text_splitter.split_documents([doc])
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Сборка промптов для Ollama с постоянным префиксом.
+
+llama.cpp переиспользует KV-кэш для совпадающего начала промпта, поэтому порядок частей важен:
+    1. неизменная часть - персона / инструкция генератора (одна на процесс);
+    2. инструкции трека (стабильны для workspace);
+    3. история диалога (растет в конце, предыдущие ходы не меняются);
+    4. найденный контекст и вопрос - меняются каждый запрос, всегда последними.
+Любой переменный фрагмент выше по тексту делает кэш бесполезным для всего, что идет после него.
+"""
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.services.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+QUIZ_INSTRUCTIONS = """You are a quiz generator.
+Task: Create 3 multiple-choice questions based on the text at the end of this message.
+Output format: A raw JSON list of objects. NO introduction, NO markdown formatting, just the JSON array.
+
+[JSON Schema]
+[
+    {
+        "question_text": "Question?",
+        "options": [
+            {"text": "Option 1", "is_correct": false},
+            {"text": "Option 2", "is_correct": true}
+        ]
+    }
+]
+"""
+
+FAQ_INSTRUCTIONS = """Ты готовишь базу часто задаваемых вопросов для новых сотрудников компании.
+По тексту документа в конце сообщения предложи вопросы, которые новичок вероятнее всего задаст,
+и ответы на них. Отвечай ТОЛЬКО фактами из текста, на русском языке, 1-3 предложения на ответ.
+Формат вывода: JSON-массив объектов {"question": "...", "answer": "..."} без пояснений и markdown.
+"""
+
+SUMMARY_INSTRUCTIONS = """Ты составляешь сводки внутренних документов компании для новых сотрудников.
+Перескажи текст в конце сообщения: о чем он, ключевые правила, сроки, ответственные.
+Только факты из текста, на русском языке, без вступлений.
+"""
+
+
+def rag_prefix(persona: str, instructions: Optional[str] = None) -> str:
+    """Кэшируемый префикс: персона, затем инструкции трека."""
+    if instructions:
+        return f"{persona}\n[Инструкции трека]\n{instructions.strip()}\n"
+    return persona
+
+
+def history_block(summary: str, turns: List[Tuple[str, str]]) -> str:
+    parts = []
+    if summary:
+        parts.append(f"[Краткое содержание диалога]\n{summary}\n")
+    for question, answer in turns:
+        parts.append(f"[Вопрос]\n{question}\n\n[Ответ]\n{answer}\n")
+    return "\n".join(parts)
+
+
+def turn_block(context: str, question: str) -> str:
+    """Переменная часть запроса - всегда в конце промпта."""
+    return f"[Контекст]\n{context}\n\n[Вопрос]\n{question}\n\n[Ответ]\n"
+
+
+def rag_prompt(persona: str, instructions: Optional[str], summary: str, turns: List[Tuple[str, str]],
+               context: str, question: str) -> str:
+    return "\n".join(p for p in (
+        rag_prefix(persona, instructions),
+        history_block(summary, turns),
+        turn_block(context, question)
+    ) if p)
+
+
+def quiz_prompt(text_content: str) -> str:
+    return f"{QUIZ_INSTRUCTIONS}\n[Text]\n{text_content}\n"
+
+
+def faq_prompt(text_content: str, pairs: int) -> str:
+    # Число пар - после постоянной инструкции, чтобы не ломать ее кэш
+    return f"{FAQ_INSTRUCTIONS}\nКоличество пар: {pairs}\n\n[Документ]\n{text_content}\n"
+
+
+def summary_prompt(text_content: str, scope: str, max_sentences: int) -> str:
+    return f"{SUMMARY_INSTRUCTIONS}\nОбъем: до {max_sentences} предложений.\n\n[{scope}]\n{text_content}\n"
+
+
+class PromptCacheStats:
+    """
+    Доля токенов промпта, взятых из кэша. Ollama сообщает только prompt_eval_count
+    (реально вычисленные токены), а весь промпт восстанавливаем из context: len(context) - eval_count.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, kind: str, response: dict) -> Optional[float]:
+        context = response.get("context")
+        evaluated = response.get("prompt_eval_count")
+        if not context or evaluated is None:
+            return None
+        prompt_tokens = max(len(context) - response.get("eval_count", 0), evaluated)
+        cached = prompt_tokens - evaluated
+        with self._lock:
+            totals = self._totals.setdefault(kind, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0})
+            totals["requests"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["cached_tokens"] += cached
+        ratio = cached / prompt_tokens if prompt_tokens else 0.0
+        logger.debug("%s: %s/%s prompt tokens cached (%.0f%%)", kind, cached, prompt_tokens, ratio * 100)
+        return ratio
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                kind: {**totals, "cached_ratio": totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0}
+                for kind, totals in self._totals.items()
+            }
+
+
+prompt_cache_stats = PromptCacheStats()
+
+
+def _collect_prompt_cache():
+    snapshot = prompt_cache_stats.snapshot()
+    yield "kb_prompt_cache_hit_ratio", "gauge", "Share of prompt tokens served from the Ollama cache", [
+        ({"kind": kind}, totals["cached_ratio"]) for kind, totals in snapshot.items()
+    ]
+    yield "kb_prompt_tokens_cached_total", "counter", "Prompt tokens served from the Ollama cache", [
+        ({"kind": kind}, totals["cached_tokens"]) for kind, totals in snapshot.items()
+    ]
+
+
+register_collector(_collect_prompt_cache)
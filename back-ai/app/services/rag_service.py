@@ -1,102 +1,578 @@
-import httpx
-import chromadb
-from chromadb.config import Settings
+import asyncio
+import hashlib
+import logging
+import time
+import numpy as np
 from app.core.config import settings
+from app.services import prompts
+from app.services.llm_priority import llm_activity
+from app.services.embeddings import configured_model_id, provider_for_model
+from app.services.embedding_migration import MODEL_KEY, AliasedVectorStore, EmbeddingRegistry, index_writes
+from app.services.breadth import LEVEL_CHUNK, LEVEL_DOCUMENT, LEVEL_SECTION, question_level
+from app.services.mmr import mmr_select
+from app.services.ollama_pool import ollama_pool
+from app.services.model_router import (
+    ROUTE_MAIN, ROUTE_QNA, ROUTE_TEMPLATE, choose_route, route_model, router_stats, smalltalk_reply
+)
+from app.services.emotion import DEFAULT_EMOTION, classify_emotion
+from app.services.prompts import prompt_cache_stats
+from app.services.metrics import observe_stage
+from app.services.session_memory import SessionMemory, SessionState, is_follow_up
+from app.services.snapshot import Snapshot, read_all
+from app.services.vector_store import create_vector_store
+
+logger = logging.getLogger(__name__)
+
+# Префиксы флагов принадлежности чанка в раскладке "organization".
+# Chroma не умеет списки в метаданных, поэтому принадлежность хранится как {"track_<id>": True}
+MEMBERSHIP_PREFIXES = ("track_", "stage_", "task_")
+# Хэш содержимого источника в метаданных чанков: повторная индексация без изменений только добавляет принадлежность
+CONTENT_HASH_KEY = "content_hash"
+MIGRATION_PAGE_SIZE = 500
+# Сколько сводок брать в промпт для каждого уровня
+SUMMARY_RESULTS = {LEVEL_DOCUMENT: 1, LEVEL_SECTION: 2}
+
+session_memory = SessionMemory(settings.SESSION_MAX_SESSIONS)
+
+
+def membership_key(kind: str, entity_id) -> str:
+    """kind: track / stage / task"""
+    return f"{kind}_{entity_id}"
+
+
+def content_hash(chunks: list[str], embed_texts: list[str] | None = None) -> str:
+    digest = hashlib.sha256()
+    for text in chunks + (embed_texts or []):
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def is_ingested(meta: dict) -> bool:
+    """Запись, созданная индексацией источника (не сводка и не FAQ)."""
+    return not meta.get("level") and meta.get("source_type") != "FAQ"
+
+
+def is_raw_chunk(meta: dict) -> bool:
+    """Исходный чанк источника - не сводка, не FAQ и не дополнительная запись вопроса Q&A."""
+    return not meta.get("level") and not meta.get("qna_part") and meta.get("source_type") != "FAQ"
 
-# Важно: название модели должно совпадать с тем, что загружено в Ollama.
-# В логах видно "nomic-embed-text-v1.5", поэтому меняем дефолтное значение
-EMBEDDING_MODEL_NAME = "nomic-embed-text" 
 
 class RAGService:
     def __init__(self):
-        self.chroma_client = chromadb.HttpClient(
-            host=settings.CHROMA_HOST,
-            port=settings.CHROMA_PORT,
-            settings=Settings(anonymized_telemetry=False)
-        )
-        self.ollama_base_url = settings.OLLAMA_BASE_URL
-
-    async def _get_ollama_embeddings(self, texts: list[str], model: str) -> list[list[float]]:
-        """Получает эмбеддинги от Ollama."""
-        url = f"{self.ollama_base_url}/api/embeddings"
-        embeddings = []
-        
-        async with httpx.AsyncClient() as client:
-            for text in texts:
-                try:
-                    # Некоторые версии Ollama требуют "model" и "prompt"
-                    response = await client.post(url, json={
-                        "model": model,
-                        "prompt": text
-                    }, timeout=60.0)
-                    response.raise_for_status()
-                    embeddings.append(response.json()["embedding"])
-                except httpx.HTTPStatusError as e:
-                    # Если модель не найдена (404), попробуем fallback или выбросим ошибку
-                    print(f"Error requesting embedding for model {model}: {e}")
-                    raise e
-                except Exception as e:
-                    print(f"Connection error to Ollama: {e}")
-                    raise e
-                    
-        return embeddings
-
-    async def process_and_embed_chunks(self, workspace_id: str, source_id: str, chunks: list[str], metadata_list: list[dict]):
-        """Создает коллекцию (если нет) и добавляет чанки."""
-        collection_name = f"workspace_{workspace_id}"
-        
-        # Получаем или создаем коллекцию
-        collection = self.chroma_client.get_or_create_collection(name=collection_name)
-
-        # Генерируем эмбеддинги
-        try:
-            embeddings = await self._get_ollama_embeddings(chunks, EMBEDDING_MODEL_NAME)
-        except Exception:
-             # Fallback: Если базовая модель не найдена, пробуем v1.5 явно, если она в Ollama под таким тегом
-             embeddings = await self._get_ollama_embeddings(chunks, "nomic-embed-text-v1.5")
-
-        ids = [f"{source_id}_{i}" for i in range(len(chunks))]
-        
-        # Добавляем source_id в метаданные
-        for meta in metadata_list:
-            meta["source_id"] = str(source_id)
-
-        collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=chunks,
-            metadatas=metadata_list
-        )
-        print(f"Successfully added {len(chunks)} chunks to collection {collection_name}")
+        self.registry = EmbeddingRegistry(settings.EMBEDDING_REGISTRY_PATH, configured_model_id())
+        self.store = AliasedVectorStore(create_vector_store(), self.registry)
+        # Запросы эмбеддятся моделью, которой построен индекс; модель из настроек - цель миграции
+        self.embedder = provider_for_model(self.registry.active_model)
+        if self.registry.active_model != configured_model_id():
+            logger.warning(f"Index is built with {self.registry.active_model}, configured {configured_model_id()}: "
+                           f"queries use the index model until POST /embeddings/migrate completes")
+        self.layout = settings.VECTOR_LAYOUT
 
-    async def query_knowledge_base(self, workspace_id: str, query_text: str, n_results: int = 5):
-        """Поиск по базе знаний."""
-        collection_name = f"workspace_{workspace_id}"
-        try:
-            collection = self.chroma_client.get_collection(name=collection_name)
-        except Exception:
+    def collection_name(self, workspace_id, organization_id=None) -> str:
+        """Имя коллекции с учетом раскладки хранилища."""
+        if self.layout == "organization":
+            return f"org_{organization_id or 'default'}"
+        return f"workspace_{workspace_id}"
+
+    def _membership_filter(self, workspace_id) -> dict | None:
+        if self.layout == "organization":
+            return {membership_key("track", workspace_id): True}
+        return None
+
+    def _scoped_filter(self, workspace_id, where: dict | None = None, source_ids: list | None = None) -> dict | None:
+        """Условие where в пределах трека; source_ids - только эти источники (файлы этапа/задачи)."""
+        conditions = [c for c in (self._membership_filter(workspace_id), where) if c]
+        if source_ids:
+            conditions.append({"source_id": {"$in": [str(s) for s in source_ids]}})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    async def process_and_embed_chunks(self, workspace_id: str, source_id: str, chunks: list[str], metadata_list: list[dict], organization_id=None,
+                                       embed_texts: list[str] | None = None):
+        """Создает коллекцию (если нет) и добавляет чанки. embed_texts - тексты для эмбеддинга, если отличаются от чанков."""
+        async with index_writes.writing():
+            collection_name = self.collection_name(workspace_id, organization_id)
+
+            digest = content_hash(chunks, embed_texts)
+            memberships = {}
+            if self.layout == "organization":
+                existing = self.store.get(collection_name, where={"source_id": str(source_id)})
+                indexed = [(i, m) for i, m in zip(existing["ids"], existing["metadatas"]) if is_ingested(m)]
+                flag = {membership_key("track", workspace_id): True}
+                if indexed and all(m.get(CONTENT_HASH_KEY) == digest for _, m in indexed):
+                    # Источник уже проиндексирован (например, для другого трека) - только добавляем принадлежность
+                    self.store.update_metadatas(collection_name, existing["ids"], [{**m, **flag} for m in existing["metadatas"]])
+                    logger.info(f"Source {source_id} already indexed in {collection_name}, linked to track {workspace_id}")
+                    return
+                if indexed:
+                    # Содержимое изменилось: старые чанки заменяются, принадлежность к трекам/этапам/задачам сохраняется
+                    memberships = {
+                        k: True for _, m in indexed for k, v in m.items() if k.startswith(MEMBERSHIP_PREFIXES) and v
+                    }
+                    self.store.delete_ids(collection_name, [i for i, _ in indexed])
+                    logger.info(f"Source {source_id} changed, re-indexing {len(indexed)} chunks in {collection_name}")
+
+            # Генерируем эмбеддинги
+            embeddings = await self.embed_texts(embed_texts or chunks)
+
+            ids = [f"{source_id}_{i}" for i in range(len(chunks))]
+
+            # Добавляем source_id в метаданные
+            for meta in metadata_list:
+                meta["source_id"] = str(source_id)
+                meta[CONTENT_HASH_KEY] = digest
+                if self.layout == "organization":
+                    meta.update(memberships)
+                    meta[membership_key("track", workspace_id)] = True
+
+            self.store.upsert(
+                collection_name,
+                ids=ids,
+                embeddings=embeddings,
+                documents=chunks,
+                metadatas=metadata_list
+            )
+            logger.info(f"Added {len(chunks)} chunks to collection {collection_name}")
+
+    async def set_source_membership(self, organization_id, source_id, track_ids: list, stage_ids: list, task_ids: list,
+                                    previous_track_ids: list | None = None) -> tuple[int, list]:
+        """
+        Приводит базы знаний источника к списку track_ids (треки или id организации для общего документа).
+        "organization": перезаписывает флаги принадлежности чанков; "workspace": копирует чанки (без
+        эмбеддинга) в базы новых треков и удаляет из баз previous_track_ids, которых больше нет.
+        Возвращает (число чанков источника, треки без чанков - их нужно проиндексировать заново).
+        """
+        if self.layout != "organization":
+            return await self._sync_workspace_copies(source_id, track_ids, previous_track_ids or [])
+        collection_name = self.collection_name(None, organization_id)
+        existing = self.store.get(collection_name, where={"source_id": str(source_id)})
+        if not existing["ids"]:
+            return 0, list(track_ids)
+
+        wanted = {membership_key("track", i) for i in track_ids}
+        wanted |= {membership_key("stage", i) for i in stage_ids}
+        wanted |= {membership_key("task", i) for i in task_ids}
+
+        metadatas = []
+        for meta in existing["metadatas"]:
+            # Старые флаги гасим в False (удаление ключей в update не гарантировано)
+            updated = {k: (False if k.startswith(MEMBERSHIP_PREFIXES) else v) for k, v in meta.items()}
+            updated.update({k: True for k in wanted})
+            metadatas.append(updated)
+
+        self.store.update_metadatas(collection_name, existing["ids"], metadatas)
+        return len(existing["ids"]), []
+
+    async def _sync_workspace_copies(self, source_id, track_ids: list, previous_track_ids: list) -> tuple[int, list]:
+        where = {"source_id": str(source_id)}
+        wanted = list(dict.fromkeys(str(t) for t in track_ids))
+        stale = [str(t) for t in previous_track_ids if str(t) not in wanted]
+        async with index_writes.writing():
+            # Чанки с векторами берем из любой базы, где источник уже есть
+            present, copy = set(), None
+            for workspace_id in wanted + stale:
+                name = self.collection_name(workspace_id)
+                if not self.store.has_collection(name):
+                    continue
+                page = self.store.get(name, where=where, include_embeddings=copy is None)
+                if page["ids"]:
+                    if workspace_id in wanted:
+                        present.add(workspace_id)
+                    if copy is None:
+                        copy = page
+
+            missing = []
+            for workspace_id in wanted:
+                if workspace_id in present:
+                    continue
+                name = self.collection_name(workspace_id)
+                # Векторы другой модели (коллекция еще не перестроена) копировать нельзя
+                if copy is None or any(m.get(MODEL_KEY) != self.registry.model_of(name) for m in copy["metadatas"]):
+                    missing.append(workspace_id)
+                    continue
+                self.store.upsert(name, ids=copy["ids"], embeddings=copy["embeddings"],
+                                  documents=copy["documents"], metadatas=copy["metadatas"])
+            for workspace_id in stale:
+                name = self.collection_name(workspace_id)
+                if self.store.has_collection(name):
+                    self.store.delete(name, where=where)
+        chunks = len(copy["ids"]) if copy else 0
+        if missing:
+            logger.info(f"Source {source_id} has no chunks to copy into {missing}, re-indexing required")
+        return chunks, missing
+
+    async def delete_embeddings(self, collection_name: str, source_id):
+        """Удаляет все чанки источника из коллекции."""
+        self.store.delete(collection_name, where={"source_id": str(source_id)})
+
+    async def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        embedder = self.embedder
+        with observe_stage("embed", embedder.model_id):
+            return await embedder.embed(texts)
+
+    async def _embed_query(self, text: str) -> list[float]:
+        return (await self.embed_texts([text]))[0]
+
+    async def query_knowledge_base(self, workspace_id: str, query_text: str, n_results: int = 5, organization_id=None,
+                                   query_embedding: list[float] | None = None, level: str = LEVEL_CHUNK,
+                                   source_ids: list | None = None):
+        """
+        Поиск по базе знаний. level - уровень иерархии (app.services.breadth): для "document"/"section"
+        ищем среди сводок (app.services.summaries), а если подходящих нет - по исходным чанкам.
+        source_ids - искать только среди этих источников (файлы текущего этапа или задачи).
+        """
+        collection_name = self.collection_name(workspace_id, organization_id)
+        if not self.store.has_collection(collection_name):
             return [] # Коллекции нет
 
         # Эмбеддинг запроса
-        try:
-            query_embedding = (await self._get_ollama_embeddings([query_text], EMBEDDING_MODEL_NAME))[0]
-        except Exception:
-            query_embedding = (await self._get_ollama_embeddings([query_text], "nomic-embed-text-v1.5"))[0]
+        if query_embedding is None:
+            query_embedding = await self._embed_query(query_text)
 
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
+        if level in SUMMARY_RESULTS:
+            summaries = await asyncio.to_thread(
+                self.store.query,
+                collection_name,
+                query_embedding,
+                n_results=SUMMARY_RESULTS[level],
+                where=self._scoped_filter(workspace_id, {"level": level}, source_ids)
+            )
+            summaries = [h for h in summaries if h["score"] >= settings.SUMMARY_MIN_SCORE]
+            if summaries:
+                return [{"text_chunk": h["document"], "metadata": h["metadata"], "score": h["score"]} for h in summaries]
+
+        # С MMR берем расширенный пул кандидатов вместе с векторами и выбираем из него разнообразные чанки
+        use_mmr = settings.MMR_LAMBDA < 1.0
+        pool = max(settings.MMR_POOL_SIZE, n_results) if use_mmr else n_results
+        hits = await asyncio.to_thread(
+            self.store.query,
+            collection_name,
+            query_embedding,
+            n_results=pool * 2, # запас на дубли, сводки и непроверенные FAQ
+            where=self._scoped_filter(workspace_id, source_ids=source_ids),
+            include_embeddings=use_mmr
         )
 
+        # У Q&A две записи с одинаковым текстом (общая и по вопросу) - оставляем одну.
+        # Синтезированные FAQ до проверки HR в ответы не попадают (app.services.faq_synthesis)
+        candidates, seen = [], set()
+        for hit in hits:
+            meta = hit["metadata"]
+            if hit["document"] in seen or meta.get("faq_status") == "pending" or meta.get("level"):
+                continue
+            seen.add(hit["document"])
+            candidates.append(hit)
+            if len(candidates) == pool:
+                break
+
+        if use_mmr and len(candidates) > n_results:
+            order, _ = mmr_select(
+                np.asarray(query_embedding, dtype=np.float32),
+                np.stack([np.asarray(c["embedding"], dtype=np.float32) for c in candidates]),
+                n_results,
+                settings.MMR_LAMBDA
+            )
+            candidates = [candidates[i] for i in order]
+
         # Форматируем ответ
-        formatted_results = []
-        if results["documents"]:
-            for i, doc in enumerate(results["documents"][0]):
-                formatted_results.append({
-                    "text_chunk": doc,
-                    "metadata": results["metadatas"][0][i]
-                })
-        
-        return formatted_results
-
-rag_service = RAGService()
\ No newline at end of file
+        return [
+            {"text_chunk": hit["document"], "metadata": hit["metadata"], "score": hit["score"]}
+            for hit in candidates[:n_results]
+        ]
+
+    def search_scopes(self, workspace_id, extra_workspaces: list | None = None) -> list[str]:
+        """Трек сотрудника, дополнительные базы знаний из запроса и SHARED_WORKSPACE_IDS - без повторов."""
+        shared = [w.strip() for w in settings.SHARED_WORKSPACE_IDS.split(",") if w.strip()]
+        return list(dict.fromkeys(str(w) for w in [workspace_id, *(extra_workspaces or []), *shared]))
+
+    async def search_workspaces(self, workspace_ids: list, query_text: str, n_results: int = 5, organization_id=None,
+                                query_embedding: list[float] | None = None, level: str = LEVEL_CHUNK,
+                                source_ids: list | None = None):
+        """
+        Параллельный поиск по нескольким базам знаний с общим top-k. Оценки - косинусная близость,
+        которую хранилище приводит к одной шкале для всех коллекций, поэтому результаты сливаются по ней напрямую.
+        База, не ответившая за FANOUT_TIMEOUT_SECONDS (или упавшая), пропускается.
+        """
+        if len(workspace_ids) == 1:
+            return await self.query_knowledge_base(
+                str(workspace_ids[0]), query_text, n_results, organization_id,
+                query_embedding=query_embedding, level=level, source_ids=source_ids
+            )
+        if query_embedding is None:
+            query_embedding = await self._embed_query(query_text)
+
+        results = await asyncio.gather(*(
+            asyncio.wait_for(
+                self.query_knowledge_base(
+                    str(w), query_text, n_results, organization_id,
+                    query_embedding=query_embedding, level=level, source_ids=source_ids
+                ),
+                settings.FANOUT_TIMEOUT_SECONDS
+            )
+            for w in workspace_ids
+        ), return_exceptions=True)
+
+        merged = []
+        for workspace_id, result in zip(workspace_ids, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Fan-out: workspace {workspace_id} skipped: {type(result).__name__} {result}")
+                continue
+            merged.extend(result)
+        merged.sort(key=lambda r: r["score"], reverse=True)
+
+        # Один источник может входить в несколько баз (раскладка "organization") - оставляем лучший экземпляр
+        unique, seen = [], set()
+        for item in merged:
+            if item["text_chunk"] not in seen:
+                seen.add(item["text_chunk"])
+                unique.append(item)
+        return unique[:n_results]
+
+    async def qna_fast_path(self, workspace_id, query_embedding: list[float], organization_id=None,
+                            source_ids: list | None = None) -> dict | None:
+        """
+        Ближайший Q&A-вопрос трека, если он совпадает с запросом выше QNA_FAST_PATH_THRESHOLD.
+        Возвращает найденную запись (ответ - metadata["answer"]) или None.
+        """
+        collection_name = self.collection_name(workspace_id, organization_id)
+        if settings.QNA_FAST_PATH_THRESHOLD <= 0 or not self.store.has_collection(collection_name):
+            return None
+        where = self._scoped_filter(workspace_id, {"qna_part": "question"}, source_ids)
+        hits = self.store.query(collection_name, query_embedding, n_results=1, where=where)
+        if hits and hits[0]["score"] >= settings.QNA_FAST_PATH_THRESHOLD and hits[0]["metadata"].get("answer"):
+            return hits[0]
+        return None
+
+    async def _compact_history(self, state: SessionState, affinity: str):
+        """Сворачивает старые ходы в пересказ, оставляя SESSION_MAX_TURNS последних."""
+        overflow = len(state.turns) - settings.SESSION_MAX_TURNS
+        if overflow <= 0:
+            return
+        dropped, state.turns = state.turns[:overflow], state.turns[overflow:]
+        dialog = "\n".join(f"Сотрудник: {q}\nОтвет: {a}" for q, a in dropped)
+        prompt = (
+            "Кратко (до 5 предложений) перескажи диалог, сохранив факты, о которых спрашивал сотрудник.\n\n"
+            f"{state.summary}\n{dialog}\n\nПересказ:"
+        )
+        try:
+            response = await ollama_pool.post("/api/generate", json={
+                "model": settings.LLM_MODEL_NAME,
+                "prompt": prompt,
+                "stream": False,
+                "keep_alive": settings.LLM_KEEP_ALIVE,
+                "options": {"num_predict": 200}
+            }, affinity=affinity, timeout=settings.LLM_CHAT_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            state.summary = response.json().get("response", "").strip()
+        except Exception as e:
+            logger.warning(f"Session summary failed, keeping raw tail: {e}")
+            state.summary = f"{state.summary}\n{dialog}"[-2000:]
+
+    async def answer_query(self, workspace_id, question: str, session_id, organization_id=None, history: list | None = None,
+                           instructions: str | None = None, extra_workspaces: list | None = None, source_ids: list | None = None):
+        """
+        RAG: поиск контекста и генерация ответа с учетом диалога. Возвращает (ответ, источники, эмоция).
+        history - последние ходы из БД back, используются только для восстановления холодной сессии.
+        instructions - постоянные инструкции трека, входят в кэшируемый префикс промпта.
+        extra_workspaces - другие базы знаний для поиска вместе с треком (общие документы организации и т.п.).
+        source_ids - файлы текущего этапа/задачи: поиск только по ним (во всех базах поиска).
+        """
+        started = time.perf_counter()
+        state = session_memory.get(session_id, history)
+
+        # Приветствие/благодарность - готовая фраза без поиска и LLM
+        reply = smalltalk_reply(question) if settings.ROUTER_SMALLTALK_TEMPLATES else None
+        if reply:
+            async with state.lock:
+                state.record_direct(question, reply)
+            router_stats.record(ROUTE_TEMPLATE, time.perf_counter() - started)
+            return reply, [], self._emotion(reply)
+
+        async with state.lock, llm_activity.interactive():
+            question_embedding = await self._embed_query(question)
+
+            # Вопрос почти дословно совпадает с курируемым Q&A - отвечаем им без генерации
+            hit = await self.qna_fast_path(workspace_id, question_embedding, organization_id=organization_id, source_ids=source_ids)
+            if hit:
+                answer = settings.QNA_ANSWER_TEMPLATE.format(answer=hit["metadata"]["answer"])
+                state.record_direct(question, answer)
+                source = {"name": hit["metadata"].get("source_name", "Q&A"), "page": None, "text_chunk": hit["document"]}
+                router_stats.record(ROUTE_QNA, time.perf_counter() - started)
+                return answer, [source], self._emotion(answer)
+
+            # Обзорным вопросам хватает одной сводки вместо нескольких сырых чанков
+            level = question_level(question) if settings.SUMMARY_RETRIEVAL else LEVEL_CHUNK
+            # Файлы этапа/задачи могут лежать и в базе организации - фильтр source_ids действует во всех базах поиска
+            scopes = self.search_scopes(workspace_id, extra_workspaces)
+            # Уточняющий вопрос ("а сколько это стоит?") ищем вместе с предыдущим; самостоятельный - как есть,
+            # уже посчитанным эмбеддингом: несвязанный прошлый вопрос только сбивает поиск
+            if state.turns and is_follow_up(question, settings.SESSION_FOLLOW_UP_MAX_WORDS):
+                results = await self.search_workspaces(
+                    scopes, f"{state.turns[-1][0]}\n{question}", n_results=settings.RETRIEVAL_K,
+                    organization_id=organization_id, level=level, source_ids=source_ids
+                )
+            else:
+                results = await self.search_workspaces(
+                    scopes, question, n_results=settings.RETRIEVAL_K,
+                    organization_id=organization_id, query_embedding=question_embedding, level=level, source_ids=source_ids
+                )
+            context = "\n\n".join(r["text_chunk"] for r in results)
+            turn = prompts.turn_block(context, question)
+            route = choose_route(question, level, results)
+            model = route_model(route)
+
+            # context - токены конкретной модели: при смене маршрута диалог пересобирается
+            if state.context and (len(state.context) > settings.SESSION_MAX_CONTEXT_TOKENS or state.model != model):
+                state.reset_context()
+            if state.context:
+                # Префикс уже в context - отправляем только новый ход
+                payload = {"prompt": turn, "context": state.context}
+            else:
+                await self._compact_history(state, str(session_id))
+                payload = {"prompt": prompts.rag_prompt(
+                    settings.PERSONA_PROMPT, instructions, state.summary, state.turns, context, question
+                )}
+
+            # Сессия закреплена за узлом пула: там в KV-кэше уже лежит ее префикс
+            response = await ollama_pool.post("/api/generate", json={
+                "model": model,
+                "stream": False,
+                "keep_alive": settings.LLM_KEEP_ALIVE,
+                **payload
+            }, affinity=str(session_id), timeout=settings.LLM_CHAT_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            data = response.json()
+            prompt_cache_stats.record("rag" if route == ROUTE_MAIN else f"rag_{route}", data)
+            answer = data.get("response", "").strip()
+
+            state.record(question, answer, data.get("context"), model)
+        elapsed = time.perf_counter() - started
+        router_stats.record(route, elapsed)
+        logger.debug("Routed to %s (%s) in %.2fs", route, model, elapsed)
+
+        sources = [
+            {
+                "name": r["metadata"].get("source_name", "Документ"),
+                "page": r["metadata"].get("page"),
+                "text_chunk": r["text_chunk"]
+            }
+            for r in results
+        ]
+        return answer, sources, self._emotion(answer)
+
+    def _emotion(self, answer: str) -> str:
+        return classify_emotion(answer) if settings.EMOTION_CLASSIFIER == "lexicon" else DEFAULT_EMOTION
+
+    def evict_idle_sessions(self, max_idle_seconds: float) -> int:
+        return session_memory.evict_idle(max_idle_seconds)
+
+    async def migrate_to_organization_layout(self, workspace_organizations: dict, delete_old: bool = False) -> dict:
+        """
+        Переносит коллекции workspace_{id} в коллекции org_{id} без повторного эмбеддинга.
+        Чанки одного источника из разных треков сливаются в один с объединенными флагами.
+        """
+        await index_writes.wait_writable()
+        migrated_collections, migrated_chunks, skipped = 0, 0, []
+        mapping = {str(k): str(v) for k, v in workspace_organizations.items()}
+
+        for name in self.store.list_collections():
+            if not name.startswith("workspace_"):
+                continue
+            workspace_id = name[len("workspace_"):]
+            organization_id = mapping.get(workspace_id)
+            if organization_id is None:
+                skipped.append(name)
+                continue
+
+            target_name = f"org_{organization_id}"
+            flag = membership_key("track", workspace_id)
+
+            offset = 0
+            while True:
+                page = self.store.get(name, include_embeddings=True, limit=MIGRATION_PAGE_SIZE, offset=offset)
+                if not page["ids"]:
+                    break
+                current = self.store.get(target_name, ids=page["ids"])
+                current_meta = dict(zip(current["ids"], current["metadatas"]))
+                metadatas = [
+                    {**current_meta.get(chunk_id, {}), **(meta or {}), flag: True}
+                    for chunk_id, meta in zip(page["ids"], page["metadatas"])
+                ]
+                self.store.upsert(
+                    target_name,
+                    ids=page["ids"],
+                    embeddings=page["embeddings"],
+                    documents=page["documents"],
+                    metadatas=metadatas
+                )
+                migrated_chunks += len(page["ids"])
+                offset += len(page["ids"])
+
+            migrated_collections += 1
+            if delete_old:
+                self.store.delete_collection(name)
+            logger.info(f"Migrated {name} -> {target_name}")
+
+        return {"migrated_collections": migrated_collections, "migrated_chunks": migrated_chunks, "skipped": skipped}
+
+    async def export_workspace(self, workspace_id, path: str, organization_id=None):
+        """Пишет снимок векторов трека в файл (app.services.snapshot)."""
+        collection_name = self.collection_name(workspace_id, organization_id)
+        self.store.export_snapshot(collection_name, path, where=self._membership_filter(workspace_id))
+
+    async def import_workspace(self, workspace_id, path: str, organization_id=None) -> int:
+        """Загружает снимок в базу знаний трека без повторного эмбеддинга. Возвращает число чанков."""
+        await index_writes.wait_writable()
+        collection_name = self.collection_name(workspace_id, organization_id)
+        # Векторы другой модели в коллекции испортят поиск - такой снимок сначала нужно переэмбеддить
+        models = {meta.get(MODEL_KEY) for meta in Snapshot(path).metadatas} - {None}
+        if models - {self.store.registry.model_of(collection_name)}:
+            raise ValueError(f"embedded with {', '.join(sorted(models))}, collection uses {self.store.registry.model_of(collection_name)}")
+        if self.layout != "organization":
+            self.store.import_snapshot(collection_name, path)
+            return len(self.store.get(collection_name)["ids"])
+
+        # Снимок мог прийти из другой организации - принадлежность переписываем на целевой трек
+        data = read_all(path)
+        if not data["ids"]:
+            return 0
+        flag = membership_key("track", workspace_id)
+        metadatas = [
+            {**{k: v for k, v in meta.items() if not k.startswith(MEMBERSHIP_PREFIXES)}, flag: True}
+            for meta in data["metadatas"]
+        ]
+        self.store.upsert(collection_name, data["ids"], data["embeddings"], data["documents"], metadatas)
+        return len(data["ids"])
+
+    async def clone_workspace(self, source_workspace_id, target_workspace_id, organization_id=None) -> int:
+        """Копирует базу знаний трека в новый трек. Возвращает число скопированных чанков."""
+        await index_writes.wait_writable()
+        if self.layout != "organization":
+            source = self.collection_name(source_workspace_id)
+            if not self.store.has_collection(source):
+                return 0
+            self.store.copy_collection(source, self.collection_name(target_workspace_id))
+            return len(self.store.get(self.collection_name(target_workspace_id))["ids"])
+
+        # В общей коллекции копировать нечего - достаточно флага нового трека
+        collection_name = self.collection_name(None, organization_id)
+        existing = self.store.get(collection_name, where=self._membership_filter(source_workspace_id))
+        if not existing["ids"]:
+            return 0
+        flag = {membership_key("track", target_workspace_id): True}
+        self.store.update_metadatas(collection_name, existing["ids"], [flag] * len(existing["ids"]))
+        return len(existing["ids"])
+
+    def evict_idle(self, max_idle_seconds: float) -> list:
+        """Выгружает из памяти давно не использованные коллекции (только для in-process хранилища)."""
+        evict = getattr(self.store, "evict_idle", None)
+        return evict(max_idle_seconds) if evict else []
+
+    def flush_vectors(self) -> list:
+        """Сохраняет на диск отложенные записи коллекций (только для in-process хранилища)."""
+        flush = getattr(self.store, "flush", None)
+        return flush() if flush else []
+
+rag_service = RAGService()
@@ -0,0 +1,91 @@
+"""
+Память диалога по session_id.
+
+Ollama /api/generate возвращает "context" - токены всего диалога после ответа. Передавая их
+в следующий запрос, мы отправляем только новый ход: префикс (персона + прошлые ходы) повторно
+не токенизируется, а при совпадении с KV-кэшем загруженной модели и не пересчитывается.
+Когда context вырастает до SESSION_MAX_CONTEXT_TOKENS, диалог пересобирается из краткого
+пересказа и последних ходов. Состояние - кэш: после выгрузки/перезапуска сессия
+восстанавливается из истории, которую присылает back (ChatMessage).
+"""
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Уточняющий вопрос ссылается на предыдущий: местоимение/указание или начинается с союза ("а если ...?")
+_FOLLOW_UP_PATTERNS = re.compile(
+    r"^(а|и|но|ну|тогда)\b|\b(это\w*|эт(от|а|и|у|ой|им|их|ом)|он|она|оно|они|его|ее|их|ему|ей|им|ним|нему|нее|"
+    r"них|там|туда|оттуда|тот|та|те|тем|той|тех|тоже|подробнее)\b"
+)
+_WORD = re.compile(r"\w+")
+
+
+def is_follow_up(question: str, max_words: int = 2) -> bool:
+    """Вопрос не самостоятельный: очень короткий (не больше max_words слов) или ссылается на предыдущий."""
+    text = question.lower().replace("ё", "е")
+    return len(_WORD.findall(text)) <= max_words or bool(_FOLLOW_UP_PATTERNS.search(text))
+
+
+@dataclass
+class SessionState:
+    context: Optional[List[int]] = None # токены Ollama после последнего ответа
+    model: Optional[str] = None # модель, которой принадлежат токены context
+    turns: List[Tuple[str, str]] = field(default_factory=list) # последние (вопрос, ответ)
+    summary: str = "" # пересказ ходов, вытесненных из turns
+    last_access: float = field(default_factory=time.monotonic)
+    # Ходы одной сессии выполняются последовательно: context должен соответствовать истории
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def record(self, question: str, answer: str, context: Optional[List[int]], model: Optional[str] = None):
+        self.turns.append((question, answer))
+        self.context = context
+        self.model = model
+        self.last_access = time.monotonic()
+
+    def record_direct(self, question: str, answer: str):
+        """Ход без обращения к LLM: в context его нет, но при пересборке диалога он попадет в историю."""
+        self.turns.append((question, answer))
+        self.last_access = time.monotonic()
+
+    def reset_context(self):
+        self.context = None
+
+
+class SessionMemory:
+    """LRU-словарь сессий с выгрузкой простаивающих."""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id, history: Optional[List[Dict[str, str]]] = None) -> SessionState:
+        key = str(session_id)
+        state = self._sessions.get(key)
+        if state is None:
+            state = SessionState(turns=[(h["question"], h["answer"]) for h in history or []])
+            self._sessions[key] = state
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key)
+        state.last_access = time.monotonic()
+        return state
+
+    def drop(self, session_id) -> bool:
+        return self._sessions.pop(str(session_id), None) is not None
+
+    def evict_idle(self, max_idle_seconds: float) -> int:
+        now = time.monotonic()
+        idle = [
+            key for key, state in self._sessions.items()
+            if now - state.last_access > max_idle_seconds and not state.lock.locked()
+        ]
+        for key in idle:
+            del self._sessions[key]
+        return len(idle)
@@ -0,0 +1,163 @@
+"""
+Снимок коллекции векторов в одном файле (*.kbsnap), пригодный для mmap только на чтение.
+
+Формат:
+    MAGIC (8 байт) | длина заголовка (uint64 LE) | заголовок JSON | выравнивание до 64 | секции
+
+Заголовок: {"version", "count", "dim", "quantization", "sections": {name: {"offset", "dtype", "shape"}}},
+offset - от начала области секций. Секции выровнены по 64 байта:
+    vectors (float32, n x d), [codes, scales] - квантованные векторы,
+    id_offsets / ids, doc_offsets / documents, meta_offsets / metadatas -
+    таблицы смещений (uint64, n + 1) и склеенные UTF-8 строки (метаданные - JSON на строку).
+"""
+import collections.abc
+import json
+import os
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+MAGIC = b"KBSNAP01"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".kbsnap"
+_ALIGN = 64
+
+
+def _align(value: int) -> int:
+    return (value + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _pack_strings(values: Sequence[str]):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(e) for e in encoded], dtype=np.uint64)
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def write_snapshot(path: str, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[dict],
+                   vectors: np.ndarray, codes: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None,
+                   quantization: str = "none"):
+    """Атомарно пишет снимок (через временный файл)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    arrays: Dict[str, np.ndarray] = {"vectors": vectors}
+    if codes is not None:
+        arrays["codes"] = np.ascontiguousarray(codes)
+    if scales is not None:
+        arrays["scales"] = np.ascontiguousarray(scales, dtype=np.float32)
+    arrays["id_offsets"], arrays["ids"] = _pack_strings(ids)
+    arrays["doc_offsets"], arrays["documents"] = _pack_strings(documents)
+    arrays["meta_offsets"], arrays["metadatas"] = _pack_strings(
+        [json.dumps(m or {}, ensure_ascii=False) for m in metadatas]
+    )
+
+    sections, offset = {}, 0
+    for name, array in arrays.items():
+        sections[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps({
+        "version": SNAPSHOT_VERSION,
+        "count": len(ids),
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "quantization": quantization,
+        "sections": sections,
+    }).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + sections[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+class _BlobList(collections.abc.Sequence):
+    """Ленивый список строк поверх таблицы смещений (декодирует элемент при обращении)."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray, decode: Callable[[str], object] = None):
+        self._offsets = offsets
+        self._blob = blob
+        self._decode = decode
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        value = bytes(self._blob[start:end]).decode("utf-8")
+        return self._decode(value) if self._decode else value
+
+
+class Snapshot:
+    """Открытый только на чтение снимок; массивы - представления mmap без копирования."""
+
+    def __init__(self, path: str):
+        self.path = path
+        raw = np.memmap(path, mode="r", dtype=np.uint8)
+        if bytes(raw[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path}: not a workspace snapshot")
+        header_len = int.from_bytes(bytes(raw[len(MAGIC):len(MAGIC) + 8]), "little")
+        header = json.loads(bytes(raw[len(MAGIC) + 8:len(MAGIC) + 8 + header_len]).decode("utf-8"))
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{path}: unsupported snapshot version {header.get('version')}")
+
+        data_start = _align(len(MAGIC) + 8 + header_len)
+        self.count: int = header["count"]
+        self.dim: int = header["dim"]
+        self.quantization: str = header.get("quantization", "none")
+        self._sections: Dict[str, np.ndarray] = {}
+        for name, spec in header["sections"].items():
+            dtype = np.dtype(spec["dtype"])
+            size = int(np.prod(spec["shape"])) * dtype.itemsize
+            start = data_start + spec["offset"]
+            self._sections[name] = raw[start:start + size].view(dtype).reshape(spec["shape"])
+
+    def section(self, name: str) -> Optional[np.ndarray]:
+        return self._sections.get(name)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._sections["vectors"]
+
+    @property
+    def ids(self) -> _BlobList:
+        return _BlobList(self._sections["id_offsets"], self._sections["ids"])
+
+    @property
+    def documents(self) -> _BlobList:
+        return _BlobList(self._sections["doc_offsets"], self._sections["documents"])
+
+    @property
+    def metadatas(self) -> _BlobList:
+        return _BlobList(self._sections["meta_offsets"], self._sections["metadatas"], json.loads)
+
+
+def read_all(path: str) -> Dict[str, list]:
+    """Читает снимок целиком (для импорта в другие бэкенды)."""
+    snapshot = Snapshot(path)
+    return {
+        "ids": list(snapshot.ids),
+        "documents": list(snapshot.documents),
+        "metadatas": list(snapshot.metadatas),
+        "embeddings": np.asarray(snapshot.vectors, dtype=np.float32),
+    }
+
+
+def snapshot_from_page(path: str, page: Dict[str, List]):
+    """Пишет снимок из результата VectorStore.get(..., include_embeddings=True)."""
+    vectors = np.asarray(page["embeddings"], dtype=np.float32)
+    if vectors.ndim != 2:
+        vectors = vectors.reshape(0, 0)
+    write_snapshot(path, page["ids"], page["documents"], page["metadatas"], vectors)
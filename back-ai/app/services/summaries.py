@@ -0,0 +1,101 @@
+"""
+Иерархические сводки источника: сводка каждого раздела (подряд идущие чанки до SUMMARY_SECTION_CHARS)
+и сводка документа целиком (по сводкам разделов). Строятся один раз фоновой задачей
+и индексируются рядом с исходными чанками с тегом level = "section" | "document";
+RAGService.query_knowledge_base выбирает уровень по ширине вопроса (app.services.breadth).
+"""
+import logging
+import re
+from typing import List
+
+from app.core.config import settings
+from app.services import prompts
+from app.services.breadth import LEVEL_DOCUMENT, LEVEL_SECTION
+from app.services.generator import generator_service
+from app.services.ollama_pool import ollama_pool
+from app.services.llm_priority import background_queue, wait_for_background_slot
+from app.services.embedding_migration import index_writes
+from app.services.rag_service import rag_service, is_raw_chunk, MEMBERSHIP_PREFIXES
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SOURCE_TYPE = "SUMMARY"
+SECTION_SENTENCES = 5
+DOCUMENT_SENTENCES = 8
+
+
+def _chunk_order(chunk_id: str) -> int:
+    """Чанки источника имеют id "{source_id}_{i}" - восстанавливаем порядок текста."""
+    match = re.search(r"_(\d+)$", chunk_id)
+    return int(match.group(1)) if match else 0
+
+
+class SummaryBuilder:
+    def enqueue(self, workspace_id, source_id, organization_id=None) -> bool:
+        async def job():
+            created = await self.build(workspace_id, source_id, organization_id)
+            logger.info(f"Source {source_id}: {created} summaries indexed")
+        return background_queue.enqueue(f"summary:{source_id}", job)
+
+    async def _summarize(self, text: str, scope: str, max_sentences: int) -> str:
+        await wait_for_background_slot()
+        async with generator_service.llm_semaphore:
+            response = await ollama_pool.post("/api/generate", json={
+                "model": settings.LLM_MODEL_NAME,
+                "prompt": prompts.summary_prompt(text, scope, max_sentences),
+                "stream": False,
+                "keep_alive": settings.LLM_KEEP_ALIVE,
+                "options": {"temperature": 0.1, "num_predict": 400}
+            }, affinity="summary", timeout=settings.LLM_GENERATION_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.json().get("response", "").strip()
+
+    async def build(self, workspace_id, source_id, organization_id=None) -> int:
+        """Пересоздает сводки источника. Возвращает число проиндексированных сводок."""
+        store = rag_service.store
+        collection_name = rag_service.collection_name(workspace_id, organization_id)
+        page = store.get(collection_name, where={"source_id": str(source_id)})
+        chunks = sorted(
+            (item for item in zip(page["ids"], page["documents"], page["metadatas"]) if is_raw_chunk(item[2])),
+            key=lambda item: _chunk_order(item[0])
+        )
+        if not chunks:
+            return 0
+
+        # Разделы - подряд идущие чанки (соседние чанки перекрываются, поэтому границы не критичны)
+        sections: List[str] = []
+        current = ""
+        for _, doc, _ in chunks:
+            if current and len(current) + len(doc) > settings.SUMMARY_SECTION_CHARS:
+                sections.append(current)
+                current = ""
+            current = f"{current}\n{doc}" if current else doc
+        sections.append(current)
+
+        section_summaries = [await self._summarize(text, "Раздел документа", SECTION_SENTENCES) for text in sections]
+        section_summaries = [s for s in section_summaries if s]
+        if not section_summaries:
+            return 0
+        if len(section_summaries) == 1:
+            document_summary = section_summaries[0]
+        else:
+            document_summary = await self._summarize("\n\n".join(section_summaries), "Сводки разделов документа", DOCUMENT_SENTENCES)
+
+        first_meta = chunks[0][2]
+        source_name = first_meta.get("source_name", "Документ")
+        shared = {k: v for k, v in first_meta.items() if k.startswith(MEMBERSHIP_PREFIXES)}
+        shared.update({"source_id": str(source_id), "source_name": source_name, "source_type": SUMMARY_SOURCE_TYPE})
+
+        texts = [f"{source_name}. {document_summary}"] + [f"{source_name}. {s}" for s in section_summaries]
+        ids = [f"{source_id}_sum_doc"] + [f"{source_id}_sum_{i}" for i in range(len(section_summaries))]
+        metadatas = [{**shared, "level": LEVEL_DOCUMENT}] + [
+            {**shared, "level": LEVEL_SECTION, "section": i} for i in range(len(section_summaries))
+        ]
+        async with index_writes.writing():
+            embeddings = await rag_service.embed_texts(texts)
+            store.delete(collection_name, where={"$and": [{"source_id": str(source_id)}, {"source_type": SUMMARY_SOURCE_TYPE}]})
+            store.upsert(collection_name, ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+        return len(ids)
+
+
+summary_builder = SummaryBuilder()
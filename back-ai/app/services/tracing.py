@@ -0,0 +1,251 @@
+"""
+Распределенная трассировка запросов back -> back-ai -> Ollama / векторное хранилище.
+
+Контекст приходит в заголовке W3C traceparent ("00-<trace_id>-<span_id>-01"): back открывает
+корневой span запроса и передает заголовок в вызовах AIClient, back-ai продолжает ту же трассу.
+Span-ы пишутся вокруг этапов pipeline (metrics.observe_stage: parse, embed, upsert, retrieve,
+generate) и каждой попытки HTTP-запроса к узлу Ollama.
+
+Сэмплер медленных трасс: span-ы копятся в памяти, пока не завершится локальный корень (входящий
+запрос или фоновая задача), и сохраняются, только если корень шел дольше TRACE_SLOW_THRESHOLD_MS
+(или завершился ошибкой, TRACE_KEEP_ERRORS). Каждый сервис решает за свою часть трассы: медленный
+ответ back-ai делает медленным и запрос back, поэтому обе части попадают в экспорт.
+
+Экспорт в фоновом потоке (TRACE_EXPORTER): "file" - JSON Lines в TRACE_FILE_PATH,
+"otlp" - OTLP/HTTP JSON на TRACE_OTLP_ENDPOINT (OpenTelemetry Collector, Jaeger, Tempo).
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "back-ai"
+MAX_SPANS_PER_TRACE = 2000
+EXPORT_QUEUE_SIZE = 1000 # трасс в очереди экспорта; сверх - отбрасываются
+EXPORT_BATCH_TRACES = 50 # трасс в одной записи / одном запросе к коллектору
+OTLP_TIMEOUT_SECONDS = 5.0
+OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "attributes",
+                 "start_ns", "end_ns", "error", "_root", "_spans")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], root: Optional["Span"], attributes: dict):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self._root = root or self
+        self._spans: List["Span"] = [] # у локального корня - завершенные span-ы трассы
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def rename(self, name: str):
+        self.name = name
+
+    def set_error(self, message: str):
+        self.error = message
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "service": SERVICE_NAME,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value):
+        pass
+
+    def rename(self, name: str):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+
+_NOOP = _NoopSpan()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> dict:
+    result = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": OTLP_KINDS.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        result["parentSpanId"] = span.parent_id
+    return result
+
+
+class SpanExporter:
+    """Пишет сохраненные трассы в файл или коллектор из отдельного потока - запрос не ждет экспорта."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self.kept = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.export_errors = 0
+
+    def submit(self, spans: List[Span]):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(spans)
+            self.kept += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = list(self._queue.get())
+            for _ in range(EXPORT_BATCH_TRACES - 1):
+                try:
+                    batch.extend(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._export(batch)
+            except Exception as e:
+                self.export_errors += 1
+                logger.warning(f"Export of {len(batch)} spans failed: {e}")
+
+    def _export(self, spans: List[Span]):
+        if settings.TRACE_EXPORTER == "otlp":
+            if self._client is None:
+                self._client = httpx.Client(timeout=OTLP_TIMEOUT_SECONDS)
+            payload = {"resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "knowledgebot"}, "spans": [_otlp_span(s) for s in spans]}],
+            }]}
+            self._client.post(settings.TRACE_OTLP_ENDPOINT, json=payload).raise_for_status()
+            return
+        directory = os.path.dirname(settings.TRACE_FILE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(settings.TRACE_FILE_PATH, "a", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "kept": self.kept,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "export_errors": self.export_errors,
+        }
+
+
+exporter = SpanExporter()
+
+
+def _finish_root(root: Span):
+    slow = root.duration_ms >= settings.TRACE_SLOW_THRESHOLD_MS
+    if slow or (root.error and settings.TRACE_KEEP_ERRORS):
+        exporter.submit(root._spans + [root])
+    else:
+        exporter.sampled_out += 1
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", traceparent: Optional[str] = None, new_trace: bool = False, **attributes):
+    """
+    Span вокруг блока кода; вложенные span-ы (в том числе в asyncio.to_thread) становятся дочерними.
+    Без текущего span (или с new_trace) открывается локальный корень - продолжение traceparent или новая трасса.
+    """
+    if not settings.TRACE_ENABLED:
+        yield _NOOP
+        return
+    parent = None if new_trace else _current_span.get()
+    if parent is not None:
+        current = Span(name, kind, parent.trace_id, parent.span_id, parent._root, attributes)
+    else:
+        match = _TRACEPARENT.match(traceparent.strip().lower()) if traceparent else None
+        trace_id, parent_id = (match.group(1), match.group(2)) if match else (secrets.token_hex(16), None)
+        current = Span(name, kind, trace_id, parent_id, None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        root = current._root
+        if root is current:
+            _finish_root(current)
+        elif len(root._spans) < MAX_SPANS_PER_TRACE:
+            root._spans.append(current)
+
+
+def current_traceparent() -> Optional[str]:
+    current = _current_span.get()
+    return current.traceparent if current is not None else None
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
@@ -0,0 +1,744 @@
+"""
+Абстракция векторного хранилища для RAGService.
+
+Бэкенды:
+  - ChromaVectorStore - Chroma по HTTP (как раньше);
+  - NumpyVectorStore  - in-process точный поиск по float32-матрицам (по одной на коллекцию)
+                        с фильтрами по метаданным; хранение - mmap-снимки *.kbsnap, записи
+                        сбрасываются на диск пачками (flush); опционально float16/int8-квантование
+                        с пересчетом top-кандидатов в float32.
+
+Фильтры (where) - подмножество синтаксиса Chroma: {"key": value}, {"key": {"$eq"|"$ne"|"$in"|"$nin": ...}},
+{"$and": [...]}, {"$or": [...]}.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.snapshot import SNAPSHOT_SUFFIX, Snapshot, read_all, snapshot_from_page, write_snapshot
+
+
+class VectorStore(ABC):
+    """Минимальный интерфейс, который нужен RAGService."""
+
+    @abstractmethod
+    def list_collections(self) -> List[str]: ...
+
+    @abstractmethod
+    def has_collection(self, name: str) -> bool: ...
+
+    @abstractmethod
+    def delete_collection(self, name: str): ...
+
+    @abstractmethod
+    def upsert(self, name: str, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[dict]): ...
+
+    @abstractmethod
+    def get(self, name: str, ids: Optional[List[str]] = None, where: Optional[dict] = None,
+            include_embeddings: bool = False, limit: Optional[int] = None, offset: int = 0) -> Dict[str, list]:
+        """Возвращает {"ids", "documents", "metadatas"[, "embeddings"]}; пустые списки, если коллекции нет."""
+
+    @abstractmethod
+    def update_metadatas(self, name: str, ids: List[str], metadatas: List[dict]): ...
+
+    @abstractmethod
+    def delete(self, name: str, where: dict): ...
+
+    @abstractmethod
+    def delete_ids(self, name: str, ids: List[str]): ...
+
+    @abstractmethod
+    def query(self, name: str, embedding: List[float], n_results: int, where: Optional[dict] = None,
+              include_embeddings: bool = False) -> List[dict]:
+        """
+        Возвращает [{"id", "document", "metadata", "score"[, "embedding"]}],
+        score - косинусная близость, по убыванию.
+        """
+
+    # Снимки (app.services.snapshot). Общая реализация через get/upsert, бэкенды могут ускорить.
+
+    def export_snapshot(self, name: str, path: str, where: Optional[dict] = None):
+        snapshot_from_page(path, self.get(name, where=where, include_embeddings=True))
+
+    def import_snapshot(self, name: str, path: str):
+        data = read_all(path)
+        if data["ids"]:
+            self.upsert(name, data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+
+    def copy_collection(self, source: str, target: str):
+        page = self.get(source, include_embeddings=True)
+        if page["ids"]:
+            self.upsert(target, page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+
+
+def _empty_result(include_embeddings: bool) -> Dict[str, list]:
+    result = {"ids": [], "documents": [], "metadatas": []}
+    if include_embeddings:
+        result["embeddings"] = []
+    return result
+
+
+# --- Chroma ---
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self):
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+
+        self.client = chromadb.HttpClient(
+            host=settings.CHROMA_HOST,
+            port=settings.CHROMA_PORT,
+            settings=ChromaSettings(anonymized_telemetry=False)
+        )
+
+    def _collection(self, name: str, create: bool = False):
+        if create:
+            # Новые коллекции создаем с косинусной метрикой
+            return self.client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+        try:
+            return self.client.get_collection(name=name)
+        except Exception:
+            return None
+
+    def list_collections(self) -> List[str]:
+        return [c.name if hasattr(c, "name") else str(c) for c in self.client.list_collections()]
+
+    def has_collection(self, name: str) -> bool:
+        return self._collection(name) is not None
+
+    def delete_collection(self, name: str):
+        self.client.delete_collection(name=name)
+
+    def upsert(self, name, ids, embeddings, documents, metadatas):
+        # Нормируем: тогда и в старых l2-коллекциях расстояние однозначно переводится в косинус
+        self._collection(name, create=True).upsert(
+            ids=ids, embeddings=normalize_rows(embeddings).tolist(), documents=documents, metadatas=metadatas
+        )
+
+    def get(self, name, ids=None, where=None, include_embeddings=False, limit=None, offset=0):
+        collection = self._collection(name)
+        if collection is None:
+            return _empty_result(include_embeddings)
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        page = collection.get(ids=ids, where=where, include=include, limit=limit, offset=offset or None)
+        result = {"ids": page["ids"], "documents": page["documents"], "metadatas": page["metadatas"]}
+        if include_embeddings:
+            result["embeddings"] = page["embeddings"]
+        return result
+
+    def update_metadatas(self, name, ids, metadatas):
+        collection = self._collection(name)
+        if collection is not None and ids:
+            collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, name, where):
+        collection = self._collection(name)
+        if collection is not None:
+            collection.delete(where=where)
+
+    def delete_ids(self, name, ids):
+        collection = self._collection(name)
+        if collection is not None and ids:
+            collection.delete(ids=ids)
+
+    def query(self, name, embedding, n_results, where=None, include_embeddings=False):
+        collection = self._collection(name)
+        if collection is None:
+            return []
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        # В старых l2-коллекциях лежат ненормированные эмбеддинги: косинус считаем по самим векторам
+        with_embeddings = include_embeddings or space != "cosine"
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if with_embeddings else [])
+        results = collection.query(query_embeddings=[embedding], n_results=n_results, where=where, include=include)
+        query = normalize_rows([embedding])[0]
+        hits = []
+        for i, doc in enumerate(results["documents"][0] if results["documents"] else []):
+            if space == "cosine":
+                score = 1.0 - results["distances"][0][i]
+            else:
+                score = float(normalize_rows([results["embeddings"][0][i]])[0] @ query)
+            hit = {
+                "id": results["ids"][0][i],
+                "document": doc,
+                "metadata": results["metadatas"][0][i],
+                "score": score
+            }
+            if include_embeddings:
+                hit["embedding"] = list(results["embeddings"][0][i])
+            hits.append(hit)
+        if space != "cosine":
+            # Порядок по l2 для ненормированных векторов не совпадает с порядком по косинусу
+            hits.sort(key=lambda h: h["score"], reverse=True)
+        return hits
+
+
+# --- NumPy (in-process) ---
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Построчная нормировка (косинус = скалярное произведение)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _match(meta: dict, where: dict) -> bool:
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_match(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(_match(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = meta.get(key)
+            for op, operand in cond.items():
+                if op == "$eq" and value != operand: return False
+                if op == "$ne" and value == operand: return False
+                if op == "$in" and value not in operand: return False
+                if op == "$nin" and value in operand: return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+_SCORE_BLOCK_ROWS = 1024 # Блок для деквантования при поиске (помещается в кэш, без копии всей матрицы)
+_MIN_CAPACITY = 256 # Начальная емкость записываемых буферов коллекции (дальше - удвоение)
+
+
+def quantize(vectors: np.ndarray, mode: str):
+    """
+    Скалярное квантование нормированных векторов.
+    float16: (codes, None); int8: (codes, scales), v ~= codes * scale, scale = max|v| / 127 на вектор.
+    """
+    if mode == "float16":
+        return vectors.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return None, None
+
+
+def quantized_scores(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+    """
+    Приближенные косинусные оценки по квантованной матрице (поблочно).
+    Медленнее float32-поиска: BLAS умеет только float32, поэтому каждый блок сначала деквантуется.
+    По benchmarks.quantization int8 примерно в 2-3 раза медленнее, float16 (преобразование половинной
+    точности в NumPy скалярное) - на порядок. Квантование экономит память, а не время.
+    """
+    scores = np.empty(codes.shape[0], dtype=np.float32)
+    buffer = np.empty((min(_SCORE_BLOCK_ROWS, codes.shape[0]), codes.shape[1]), dtype=np.float32)
+    for start in range(0, codes.shape[0], _SCORE_BLOCK_ROWS):
+        block = codes[start:start + _SCORE_BLOCK_ROWS]
+        out = buffer[:block.shape[0]]
+        np.copyto(out, block, casting="unsafe")
+        scores[start:start + block.shape[0]] = out @ query
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def _grown(array: Optional[np.ndarray], size: int, capacity: int, dim: Optional[int], dtype) -> np.ndarray:
+    """Новый буфер на capacity строк с первыми size строками array."""
+    grown = np.empty((capacity,) if dim is None else (capacity, dim), dtype=dtype)
+    if size:
+        grown[:size] = array[:size]
+    return grown
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class _NumpyCollection:
+    """
+    Строки нормированы. Коллекция хранится снимком (*.kbsnap) и после загрузки/сохранения
+    читает full (float32), ids, documents и metadatas прямо из mmap без копирования.
+    С квантованием в памяти живут только codes/scales, а full читается лишь для пересчета top-кандидатов.
+    Запись переводит векторы в буферы с запасом емкости (удвоение) и дописывает/перезаписывает
+    только затронутые строки - до следующего сохранения снимка.
+    """
+
+    def __init__(self, quantization: str = "none", rescore_factor: int = 4):
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.full = np.empty((0, 0), dtype=np.float32)
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        # Записываемые буферы (full/codes/scales - их представления); None - векторы на mmap снимка
+        self._buffer: Optional[np.ndarray] = None
+        self._codes_buffer: Optional[np.ndarray] = None
+        self._scales_buffer: Optional[np.ndarray] = None
+        self.ids: Sequence[str] = []
+        self.documents: Sequence[str] = []
+        self.metadatas: Sequence[dict] = []
+        self._row_of: Optional[Dict[str, int]] = {}
+        self._mask_cache: Dict[str, np.ndarray] = {}
+        # Состояние в NumpyVectorStore: блокировка записи, время первой несохраненной записи, выгружена ли
+        self.lock = threading.RLock()
+        self.dirty_since: Optional[float] = None
+        self.evicted = False
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot, quantization: str, rescore_factor: int) -> "_NumpyCollection":
+        collection = cls(quantization, rescore_factor)
+        collection._attach(snapshot)
+        return collection
+
+    def _attach(self, snapshot: Snapshot):
+        self.full = snapshot.vectors
+        self._buffer = self._codes_buffer = self._scales_buffer = None
+        self.ids, self.documents, self.metadatas = snapshot.ids, snapshot.documents, snapshot.metadatas
+        self._row_of = None
+        if self.quantization == "none":
+            self.codes = self.scales = None
+        elif snapshot.quantization == self.quantization and snapshot.section("codes") is not None:
+            # Квантованные векторы - горячая структура, держим их в памяти
+            self.codes = np.array(snapshot.section("codes"))
+            scales = snapshot.section("scales")
+            self.scales = np.array(scales) if scales is not None else None
+        else:
+            self.codes, self.scales = quantize(np.asarray(self.full), self.quantization)
+        self._invalidate()
+
+    def _materialize(self):
+        """Перед изменением переводим ленивые списки снимка в обычные."""
+        if not isinstance(self.ids, list):
+            self.ids, self.documents, self.metadatas = list(self.ids), list(self.documents), list(self.metadatas)
+
+    @property
+    def row_of(self) -> Dict[str, int]:
+        if self._row_of is None:
+            self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        return self._row_of
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.full
+
+    def memory_bytes(self) -> int:
+        """
+        Память процесса под векторы. full не учитывается, только если он на mmap снимка и включено
+        квантование: тогда поиск читает из него лишь строки кандидатов для пересчета. До сохранения
+        снимка (отложенные записи) full живет в буфере в памяти и учитывается целиком.
+        """
+        total = 0
+        if self.codes is None or not isinstance(self.full, np.memmap):
+            total += self._buffer.nbytes if self._buffer is not None else self.full.nbytes
+        if self.codes is not None:
+            total += self._codes_buffer.nbytes if self._codes_buffer is not None else self.codes.nbytes
+        if self.scales is not None:
+            total += self._scales_buffer.nbytes if self._scales_buffer is not None else self.scales.nbytes
+        return total
+
+    def _invalidate(self):
+        self._mask_cache.clear()
+
+    def _reserve(self, size: int, needed: int, dim: int):
+        """
+        Буферы минимум на needed строк (первые size строк сохраняются). mmap снимка открыт только
+        на чтение, поэтому первая запись после загрузки копирует матрицу, а следующие - только дописывают.
+        """
+        if self._buffer is not None and self._buffer.shape[0] >= needed:
+            return
+        capacity = max(needed, 2 * size, _MIN_CAPACITY)
+        self._buffer = _grown(self.full, size, capacity, dim, np.float32)
+        if self.quantization != "none":
+            self._codes_buffer = _grown(self.codes, size, capacity, dim, np.int8 if self.quantization == "int8" else np.float16)
+        if self.quantization == "int8":
+            self._scales_buffer = _grown(self.scales, size, capacity, None, np.float32)
+
+    def _set_size(self, size: int):
+        self.full = self._buffer[:size]
+        self.codes = self._codes_buffer[:size] if self._codes_buffer is not None else None
+        self.scales = self._scales_buffer[:size] if self._scales_buffer is not None else None
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        vectors = normalize_rows(embeddings)
+        if self.size and vectors.shape[1] != self.full.shape[1]:
+            raise ValueError(f"Embedding dimension mismatch: {vectors.shape[1]} != {self.full.shape[1]}")
+        self._materialize()
+        row_of = self.row_of
+        size = self.size
+
+        rows = np.empty(len(ids), dtype=np.int64)
+        for i, chunk_id in enumerate(ids):
+            row = row_of.get(chunk_id)
+            if row is None:
+                row = row_of[chunk_id] = len(self.ids)
+                self.ids.append(chunk_id)
+                self.documents.append(documents[i])
+                self.metadatas.append(dict(metadatas[i] or {}))
+            else:
+                self.documents[row] = documents[i]
+                self.metadatas[row] = dict(metadatas[i] or {})
+            rows[i] = row
+
+        self._reserve(size, len(self.ids), vectors.shape[1])
+        self._buffer[rows] = vectors
+        # Квантование построчное - пересчитываем только записанные строки
+        codes, scales = quantize(vectors, self.quantization)
+        if codes is not None:
+            self._codes_buffer[rows] = codes
+        if scales is not None:
+            self._scales_buffer[rows] = scales
+        self._set_size(len(self.ids))
+        self._invalidate()
+
+    def update_metadatas(self, ids, metadatas):
+        self._materialize()
+        for chunk_id, meta in zip(ids, metadatas):
+            row = self.row_of.get(chunk_id)
+            if row is not None:
+                # Как в Chroma: переданные ключи дополняют существующие
+                self.metadatas[row] = {**self.metadatas[row], **meta}
+        self._invalidate()
+
+    def mask(self, where: Optional[dict]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True, default=str)
+        cached = self._mask_cache.get(key)
+        if cached is None:
+            cached = np.fromiter((_match(m, where) for m in self.metadatas), dtype=bool, count=self.size)
+            self._mask_cache[key] = cached
+        return cached
+
+    def rows(self, ids: Optional[List[str]], where: Optional[dict]) -> np.ndarray:
+        if ids is not None:
+            rows = np.array([self.row_of[i] for i in ids if i in self.row_of], dtype=np.int64)
+        else:
+            rows = np.arange(self.size, dtype=np.int64)
+        mask = self.mask(where)
+        return rows[mask[rows]] if mask is not None else rows
+
+    def keep(self, keep: np.ndarray):
+        """Оставляет только строки keep (bool-маска), с уплотнением матрицы."""
+        idx = np.flatnonzero(keep)
+        self.full = np.ascontiguousarray(self.full[idx], dtype=np.float32)
+        if self.codes is not None:
+            self.codes = np.ascontiguousarray(self.codes[idx])
+        if self.scales is not None:
+            self.scales = np.ascontiguousarray(self.scales[idx])
+        self._buffer = self._codes_buffer = self._scales_buffer = None
+        self.ids = [self.ids[i] for i in idx]
+        self.documents = [self.documents[i] for i in idx]
+        self.metadatas = [self.metadatas[i] for i in idx]
+        self._row_of = None
+        self._invalidate()
+
+    def view(self, where: Optional[dict]) -> "_SearchView":
+        """Состояние коллекции для поиска без блокировки (берется под блокировкой коллекции)."""
+        return _SearchView(self, self.mask(where))
+
+    def search(self, query: np.ndarray, n_results: int, where: Optional[dict]):
+        return self.view(where).search(query, n_results)
+
+    def save(self, path: str):
+        write_snapshot(path, self.ids, self.documents, self.metadatas, self.full,
+                       codes=self.codes, scales=self.scales, quantization=self.quantization)
+        self._attach(Snapshot(path))
+
+
+class _SearchView:
+    """
+    Векторы, строки и маска коллекции на момент взятия. Запись дописывает строки за пределами size
+    или заменяет массивы/списки новыми, поэтому поиск по view идет без блокировки коллекции;
+    строка, перезаписанная во время поиска, может попасть в него в старом или новом виде.
+    """
+
+    def __init__(self, collection: _NumpyCollection, mask: Optional[np.ndarray]):
+        self.size = collection.size
+        self.full, self.codes, self.scales = collection.full, collection.codes, collection.scales
+        self.ids, self.documents, self.metadatas = collection.ids, collection.documents, collection.metadatas
+        self.rescore_factor = collection.rescore_factor
+        self.mask = mask
+
+    def search(self, query: np.ndarray, n_results: int):
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if not self.size:
+            return empty
+        if self.codes is None:
+            scores = self.full @ query
+        else:
+            scores = quantized_scores(self.codes, self.scales, query)
+
+        mask = self.mask
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(self.size)
+        if mask is not None:
+            scores = scores[candidates]
+        k = min(n_results, scores.shape[0])
+        if k <= 0:
+            return empty
+
+        if self.codes is None:
+            top = _top_k(scores, k)
+            return candidates[top], scores[top]
+
+        # Пересчет расширенного списка кандидатов в полной точности: из mmap читаются только их строки
+        pool = _top_k(scores, min(k * self.rescore_factor, scores.shape[0]))
+        pool_rows = candidates[pool]
+        order = np.argsort(pool_rows) # последовательное чтение из mmap
+        exact = np.asarray(self.full[pool_rows[order]], dtype=np.float32) @ query
+        top = _top_k(exact, k)
+        return pool_rows[order][top], exact[top]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process точный top-k (косинус) без HTTP. Каждая коллекция - снимок <path>/<name>.kbsnap,
+    который открывается через mmap при первом обращении (миллисекунды, без эмбеддинга).
+    Давно не использовавшиеся коллекции выгружаются из памяти (evict_idle) с сохранением на диск.
+    quantization: "none" | "float16" | "int8" - формат векторов, по которым идет поиск.
+    flush_seconds: записи копятся в памяти и пишутся в снимок не чаще раза в N секунд
+    (и при flush/выгрузке/экспорте); 0 - снимок перезаписывается после каждой записи.
+
+    Блокировки: общая (_lock) - только словарь коллекций, у каждой коллекции своя. Поиск держит
+    блокировку коллекции лишь на время взятия _SearchView, поэтому запросы к разным коллекциям
+    (и долгий поиск, брошенный по таймауту) не ждут друг друга. Порядок: коллекция -> общая.
+    """
+
+    def __init__(self, path: str, quantization: str = "none", rescore_factor: int = 4, flush_seconds: float = 0):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {quantization}")
+        self.path = path
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.flush_seconds = flush_seconds
+        self._collections: Dict[str, _NumpyCollection] = {}
+        self._last_access: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}{SNAPSHOT_SUFFIX}")
+
+    def _load(self, name: str) -> Optional[_NumpyCollection]:
+        self._last_access[name] = time.monotonic()
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        if not os.path.exists(self._file(name)):
+            return None
+        collection = _NumpyCollection.from_snapshot(Snapshot(self._file(name)), self.quantization, self.rescore_factor)
+        self._collections[name] = collection
+        return collection
+
+    @contextmanager
+    def _locked(self, name: str, create: bool = False) -> Iterator[Optional[_NumpyCollection]]:
+        """Коллекция под ее блокировкой; выгруженная, пока мы ждали блокировку, открывается заново."""
+        while True:
+            with self._lock:
+                collection = self._load(name)
+                if collection is None and create:
+                    collection = self._collections[name] = _NumpyCollection(self.quantization, self.rescore_factor)
+            if collection is None:
+                yield None
+                return
+            with collection.lock:
+                if not collection.evicted:
+                    yield collection
+                    return
+
+    def _save(self, name: str, collection: _NumpyCollection):
+        collection.save(self._file(name))
+        collection.dirty_since = None
+
+    def _written(self, name: str, collection: _NumpyCollection):
+        """Снимок перезаписывается целиком, поэтому частые записи (ингест пачками) сохраняются одним разом."""
+        if collection.dirty_since is None:
+            collection.dirty_since = time.monotonic()
+        if time.monotonic() - collection.dirty_since >= self.flush_seconds:
+            self._save(name, collection)
+
+    def flush(self) -> List[str]:
+        """Сохраняет на диск коллекции с несохраненными записями."""
+        with self._lock:
+            loaded = list(self._collections.items())
+        flushed = []
+        for name, collection in loaded:
+            with collection.lock:
+                if not collection.evicted and collection.dirty_since is not None:
+                    self._save(name, collection)
+                    flushed.append(name)
+        return flushed
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(c.memory_bytes() for c in self._collections.values())
+
+    def loaded_collections(self) -> List[str]:
+        with self._lock:
+            return sorted(self._collections)
+
+    def _unload(self, name: str, collection: _NumpyCollection):
+        """Под блокировкой коллекции: объект больше не выдается, следующее обращение откроет снимок."""
+        collection.evicted = True
+        with self._lock:
+            if self._collections.get(name) is collection:
+                del self._collections[name]
+            self._last_access.pop(name, None)
+
+    def evict(self, name: str) -> bool:
+        """Выгружает коллекцию из памяти, предварительно сохранив несохраненные записи."""
+        with self._lock:
+            collection = self._collections.get(name)
+        if collection is None:
+            return False
+        with collection.lock:
+            if collection.evicted:
+                return False
+            if collection.dirty_since is not None:
+                self._save(name, collection)
+            self._unload(name, collection)
+        return True
+
+    def evict_idle(self, max_idle_seconds: float) -> List[str]:
+        with self._lock:
+            now = time.monotonic()
+            idle = [n for n in self._collections if now - self._last_access.get(n, 0) > max_idle_seconds]
+        return [name for name in idle if self.evict(name)]
+
+    def list_collections(self) -> List[str]:
+        with self._lock:
+            on_disk = {f[:-len(SNAPSHOT_SUFFIX)] for f in os.listdir(self.path) if f.endswith(SNAPSHOT_SUFFIX)}
+            return sorted(on_disk | set(self._collections))
+
+    def has_collection(self, name: str) -> bool:
+        with self._lock:
+            return name in self._collections or os.path.exists(self._file(name))
+
+    def delete_collection(self, name: str):
+        with self._locked(name) as collection:
+            if collection is not None:
+                self._unload(name, collection)
+            with self._lock:
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+
+    def upsert(self, name, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        with self._locked(name, create=True) as collection:
+            collection.upsert(ids, embeddings, documents, metadatas)
+            self._written(name, collection)
+
+    def get(self, name, ids=None, where=None, include_embeddings=False, limit=None, offset=0):
+        with self._locked(name) as collection:
+            if collection is None:
+                return _empty_result(include_embeddings)
+            rows = collection.rows(ids, where)
+            rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+            result = {
+                "ids": [collection.ids[r] for r in rows],
+                "documents": [collection.documents[r] for r in rows],
+                "metadatas": [dict(collection.metadatas[r]) for r in rows],
+            }
+            if include_embeddings:
+                result["embeddings"] = np.asarray(collection.full[rows]).tolist()
+            return result
+
+    def update_metadatas(self, name, ids, metadatas):
+        with self._locked(name) as collection:
+            if collection is None or not ids:
+                return
+            collection.update_metadatas(ids, metadatas)
+            self._written(name, collection)
+
+    def delete(self, name, where):
+        with self._locked(name) as collection:
+            if collection is None:
+                return
+            matched = collection.mask(where)
+            if matched is None or not matched.any():
+                return
+            collection.keep(~matched)
+            self._written(name, collection)
+
+    def delete_ids(self, name, ids):
+        with self._locked(name) as collection:
+            if collection is None or not ids:
+                return
+            matched = np.zeros(collection.size, dtype=bool)
+            matched[collection.rows(ids, None)] = True
+            if not matched.any():
+                return
+            collection.keep(~matched)
+            self._written(name, collection)
+
+    def query(self, name, embedding, n_results, where=None, include_embeddings=False):
+        with self._locked(name) as collection:
+            if collection is None:
+                return []
+            view = collection.view(where)
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        rows, scores = view.search(query, n_results)
+        hits = [
+            {
+                "id": view.ids[r],
+                "document": view.documents[r],
+                "metadata": dict(view.metadatas[r]),
+                "score": float(s)
+            }
+            for r, s in zip(rows, scores)
+        ]
+        if include_embeddings and hits:
+            for hit, vector in zip(hits, np.asarray(view.full[rows], dtype=np.float32)):
+                hit["embedding"] = vector
+        return hits
+
+    # Снимки: собственный формат хранения, поэтому экспорт/импорт/копия - это копирование файла
+
+    def export_snapshot(self, name, path, where=None):
+        if where is None:
+            with self._locked(name) as collection:
+                if collection is not None and collection.dirty_since is not None:
+                    self._save(name, collection)
+                if os.path.exists(self._file(name)):
+                    shutil.copyfile(self._file(name), path)
+                    return
+        super().export_snapshot(name, path, where)
+
+    def import_snapshot(self, name, path):
+        with self._lock:
+            if not self.has_collection(name):
+                Snapshot(path) # проверка формата до подмены
+                shutil.copyfile(path, self._file(name))
+                return
+        super().import_snapshot(name, path)
+
+    def copy_collection(self, source, target):
+        with self._locked(source) as collection:
+            if collection is not None and collection.dirty_since is not None:
+                self._save(source, collection)
+            with self._lock:
+                if not self.has_collection(target) and os.path.exists(self._file(source)):
+                    shutil.copyfile(self._file(source), self._file(target))
+                    return
+        super().copy_collection(source, target)
+
+
+def create_vector_store() -> VectorStore:
+    if settings.VECTOR_STORE_BACKEND == "numpy":
+        return NumpyVectorStore(
+            settings.VECTOR_STORE_PATH,
+            quantization=settings.VECTOR_QUANTIZATION,
+            rescore_factor=settings.VECTOR_RESCORE_FACTOR,
+            flush_seconds=settings.VECTOR_FLUSH_SECONDS
+        )
+    return ChromaVectorStore()
@@ -0,0 +1,59 @@
+"""
+Проверка классификатора эмоций аватара на размеченном корпусе русских ответов.
+
+Запуск из каталога back-ai:
+    python -m benchmarks.emotion                                   # data/emotion_corpus_ru.jsonl
+    python -m benchmarks.emotion --corpus my_answers.jsonl -v      # свой корпус, с ошибками
+
+Формат корпуса: JSON на строку {"text": ..., "label": neutral|happy|thinking}.
+Выход с кодом 1, если точность ниже --min-accuracy.
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+from app.services.emotion import EMOTION_LABELS, EMOTION_LABELS_VERSION, classify_emotion
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "emotion_corpus_ru.jsonl")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--min-accuracy", type=float, default=0.9)
+    parser.add_argument("--repeat", type=int, default=200, help="Повторов для замера времени")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    confusion = Counter()
+    for sample in samples:
+        predicted = classify_emotion(sample["text"])
+        confusion[(sample["label"], predicted)] += 1
+        if args.verbose and predicted != sample["label"]:
+            print(f"  {sample['label']:>8} -> {predicted:<8} {sample['text']}")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for sample in samples:
+            classify_emotion(sample["text"])
+    per_call_us = (time.perf_counter() - start) / (args.repeat * len(samples)) * 1e6
+
+    correct = sum(n for (expected, predicted), n in confusion.items() if expected == predicted)
+    accuracy = correct / len(samples)
+    print(f"labels {EMOTION_LABELS_VERSION}: {', '.join(EMOTION_LABELS)}; samples: {len(samples)}")
+    print(f"{'expected':<10}" + "".join(f"{label:>10}" for label in EMOTION_LABELS))
+    for expected in EMOTION_LABELS:
+        print(f"{expected:<10}" + "".join(f"{confusion[(expected, p)]:>10}" for p in EMOTION_LABELS))
+    print(f"accuracy: {accuracy:.3f}, {per_call_us:.1f} us/answer")
+
+    if accuracy < args.min_accuracy:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
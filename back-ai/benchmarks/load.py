@@ -0,0 +1,359 @@
+"""
+Нагрузочный тест back и back-ai на заглушках: чат, индексация и генерация тестов.
+
+Запуск из каталога back-ai:
+    # Весь стенд локально: заглушка Ollama, back-ai с numpy-хранилищем и back на Postgres из DATABASE_URL
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.load --spawn
+    python -m benchmarks.load --spawn --scenarios chat --concurrency 32 --requests 500 --tokens-per-second 20
+    # Уже запущенные сервисы и данные из back/benchmarks/seed.py
+    python -m benchmarks.load --back-url http://localhost:8000 --ai-url http://localhost:8001 --seed-file seed.json
+
+Сценарии (замкнутая нагрузка: --concurrency виртуальных пользователей, --requests запросов на сценарий):
+    chat   - POST back /workspaces/{track}/query от сотрудников из seed: БД, AIClient, поиск, генерация;
+    ingest - POST back-ai /process-article новых статей: разбиение, эмбеддинги, запись в хранилище;
+    quiz   - POST back /quizzes/generate по статьям из seed от HR: генерация JSON, разбор, запись теста.
+Перед chat и quiz статьи из seed индексируются в back-ai (не замеряется).
+
+Отчет: пропускная способность (успешных запросов в секунду), p50/p95/p99/max задержки, ошибки по кодам.
+Результат сохраняется в --results-dir (JSON с параметрами стенда и коммитом); --compare <файл>
+сравнивает с прошлым прогоном и завершает работу с кодом 1, если p95 вырос или пропускная
+способность упала больше чем на --max-regression.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from benchmarks.ollama_pool import unused_port
+
+BACK_AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACK_DIR = os.path.join(os.path.dirname(BACK_AI_DIR), "back")
+SCENARIOS = ("chat", "ingest", "quiz")
+READY_TIMEOUT_SECONDS = 60
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по рангу (values отсортированы)."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def summarize(latencies: List[float], errors: Counter, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + sum(errors.values()),
+        "ok": len(latencies),
+        "errors": dict(errors),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        },
+    }
+
+
+async def run_scenario(send: Callable[[int], Awaitable[httpx.Response]], requests: int, concurrency: int) -> dict:
+    indices = iter(range(requests))
+    latencies: List[float] = []
+    errors: Counter = Counter()
+
+    async def user():
+        for i in indices:
+            started = time.perf_counter()
+            try:
+                response = await send(i)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if status in (200, 201, 202):
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors[str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+class Scenarios:
+    def __init__(self, back: httpx.AsyncClient, ai: httpx.AsyncClient, seed: dict, args):
+        self.back, self.ai, self.seed, self.args = back, ai, seed, args
+        self.rng = random.Random(args.seed)
+        # Сессия чата принадлежит пользователю - у каждого сотрудника своя
+        self.sessions = [str(uuid.uuid4()) for _ in seed["employee_tokens"]]
+        self.ingest_workspace = str(uuid.uuid4())
+
+    def _article(self, workspace_id: str, source_id: str, source: dict) -> dict:
+        return {
+            "workspace_id": workspace_id,
+            "source_id": source_id,
+            "organization_id": self.seed["organization_id"],
+            "article_in": {"title": source["title"], "content": source["content"]},
+        }
+
+    async def index_seed(self):
+        """Индексирует статьи seed в коллекцию трека, как это делает back при добавлении источника."""
+        for source in self.seed["sources"]:
+            response = await self.ai.post(
+                f"{settings.API_V1_STR}/process-article", json=self._article(self.seed["track_id"], source["id"], source)
+            )
+            response.raise_for_status()
+            response = await self.ai.post(f"{settings.API_V1_STR}/source-membership", json={
+                "organization_id": self.seed["organization_id"],
+                "source_id": source["id"],
+                "track_ids": [self.seed["track_id"]],
+                "stage_ids": [],
+                "task_ids": [],
+            })
+            response.raise_for_status()
+
+    def chat(self, i: int) -> Awaitable[httpx.Response]:
+        user = i % len(self.seed["employee_tokens"])
+        return self.back.post(
+            f"{self.args.back_prefix}/workspaces/{self.seed['track_id']}/query",
+            json={"question": self.rng.choice(self.seed["questions"]), "session_id": self.sessions[user]},
+            headers={"Authorization": f"Bearer {self.seed['employee_tokens'][user]}"},
+        )
+
+    def ingest(self, i: int) -> Awaitable[httpx.Response]:
+        source = self.seed["sources"][i % len(self.seed["sources"])]
+        return self.ai.post(
+            f"{settings.API_V1_STR}/process-article", json=self._article(self.ingest_workspace, str(uuid.uuid4()), source)
+        )
+
+    def quiz(self, i: int) -> Awaitable[httpx.Response]:
+        source = self.seed["sources"][i % len(self.seed["sources"])]
+        return self.back.post(
+            f"{self.args.back_prefix}/quizzes/generate",
+            json={"source_id": source["id"], "title": "Нагрузочный тест"},
+            headers={"Authorization": f"Bearer {self.seed['hr_token']}"},
+        )
+
+
+class Stack:
+    """Заглушка Ollama, back-ai и back в подпроцессах на свободных портах; данные - через benchmarks.seed в back."""
+
+    def __init__(self, args):
+        self.args = args
+        self.work_dir = args.work_dir or tempfile.mkdtemp(prefix="kb-load-")
+        self.processes: List[subprocess.Popen] = []
+        self.back_url = self.ai_url = ""
+        self.seed_file = os.path.join(self.work_dir, "seed.json")
+
+    def _spawn(self, command: List[str], cwd: str, env: Dict[str, str], name: str) -> subprocess.Popen:
+        log = open(os.path.join(self.work_dir, f"{name}.log"), "w")
+        process = subprocess.Popen(command, cwd=cwd, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+        return process
+
+    async def _wait_ready(self, url: str, process: subprocess.Popen, name: str):
+        deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+        async with httpx.AsyncClient(base_url=url, timeout=2) as client:
+            while time.monotonic() < deadline:
+                if process.poll() is not None:
+                    raise SystemExit(f"{name} exited with code {process.returncode}, see {self.work_dir}/{name}.log")
+                try:
+                    if (await client.get("/")).status_code < 500:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.5)
+        raise SystemExit(f"{name} is not ready after {READY_TIMEOUT_SECONDS}s, see {self.work_dir}/{name}.log")
+
+    async def start(self):
+        args = self.args
+        if not os.environ.get("DATABASE_URL"):
+            raise SystemExit("--spawn needs DATABASE_URL of a disposable Postgres database for back")
+        models = [settings.LLM_MODEL_NAME, settings.EMBEDDING_MODEL_NAME]
+        if settings.LLM_SMALL_MODEL_NAME:
+            models.append(settings.LLM_SMALL_MODEL_NAME)
+        ollama_port, ai_port, back_port = unused_port(), unused_port(), unused_port()
+        stub = self._spawn([
+            sys.executable, "-m", "benchmarks.ollama_stub", "--port", str(ollama_port), "--models", ",".join(models),
+            "--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second),
+            "--response-tokens", str(args.response_tokens), "--parallel", str(args.parallel),
+            "--embed-latency", str(args.embed_latency),
+        ], BACK_AI_DIR, {}, "ollama_stub")
+
+        ollama_url = f"http://127.0.0.1:{ollama_port}"
+        common = {"LOG_LEVEL": "WARNING", "TRACE_EXPORTER": "file"}
+        ai = self._spawn([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(ai_port)],
+                         BACK_AI_DIR, {
+                             **common,
+                             "OLLAMA_HOST": ollama_url,
+                             "OLLAMA_NODES": "",
+                             "VECTOR_STORE_BACKEND": "numpy",
+                             "VECTOR_STORE_PATH": os.path.join(self.work_dir, "vectors"),
+                             "EMBEDDING_PROVIDER": "ollama",
+                             "EMBEDDING_REGISTRY_PATH": os.path.join(self.work_dir, "embedding_registry.json"),
+                             "TRACE_FILE_PATH": os.path.join(self.work_dir, "traces", "back-ai.jsonl"),
+                         }, "back-ai")
+        self.ai_url = f"http://127.0.0.1:{ai_port}"
+        back_env = {
+            **common,
+            "AI_SERVICE_URL": self.ai_url,
+            "RATE_LIMIT_ENABLED": "false", # замеряем сервисы, а не лимиты
+            "UPLOAD_DIR": os.path.join(self.work_dir, "uploads"),
+            "TRACE_FILE_PATH": os.path.join(self.work_dir, "traces", "back.jsonl"),
+        }
+        back = self._spawn([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(back_port)],
+                           BACK_DIR, back_env, "back")
+        self.back_url = f"http://127.0.0.1:{back_port}"
+
+        await self._wait_ready(ollama_url, stub, "ollama_stub")
+        await self._wait_ready(self.ai_url, ai, "back-ai")
+        await self._wait_ready(self.back_url, back, "back")
+        subprocess.run([
+            sys.executable, "-m", "benchmarks.seed", "--out", self.seed_file, "--employees", str(args.employees),
+            "--articles", str(args.articles), "--seed", str(args.seed),
+        ], cwd=BACK_DIR, env={**os.environ, **back_env}, check=True)
+        print(f"stack: ollama stub {ollama_url}, back-ai {self.ai_url}, back {self.back_url}; logs in {self.work_dir}")
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if not self.args.work_dir and not self.args.keep:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACK_AI_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: Dict[str, dict]):
+    print(f"{'scenario':<8} {'requests':>8} {'ok':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  errors")
+    for name, r in results.items():
+        lat = r["latency_ms"]
+        errors = ", ".join(f"{k}: {v}" for k, v in r["errors"].items()) or "-"
+        print(f"{name:<8} {r['requests']:>8} {r['ok']:>6} {r['throughput_rps']:>8.2f} {lat['p50']:>9.1f} "
+              f"{lat['p95']:>9.1f} {lat['p99']:>9.1f} {lat['max']:>9.1f}  {errors}")
+
+
+def compare(results: Dict[str, dict], baseline_path: str, max_regression: float) -> bool:
+    """Печатает изменения относительно прошлого прогона; False - есть регрессия."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["scenarios"]
+    ok = True
+    print(f"\ncompared with {baseline_path} (allowed regression {max_regression:.0%}):")
+    for name, r in results.items():
+        if name not in baseline:
+            continue
+        old_p95, new_p95 = baseline[name]["latency_ms"]["p95"], r["latency_ms"]["p95"]
+        old_rps, new_rps = baseline[name]["throughput_rps"], r["throughput_rps"]
+        p95_change = new_p95 / old_p95 - 1 if old_p95 else 0.0
+        rps_change = new_rps / old_rps - 1 if old_rps else 0.0
+        regressed = p95_change > max_regression or rps_change < -max_regression
+        ok = ok and not regressed
+        print(f"  {name:<8} p95 {old_p95:.1f} -> {new_p95:.1f} ms ({p95_change:+.1%}), "
+              f"req/s {old_rps:.2f} -> {new_rps:.2f} ({rps_change:+.1%}){'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+async def main_async(args) -> int:
+    stack = Stack(args) if args.spawn else None
+    try:
+        if stack:
+            await stack.start()
+            args.back_url, args.ai_url, args.seed_file = stack.back_url, stack.ai_url, stack.seed_file
+        if not args.seed_file:
+            raise SystemExit("--seed-file is required without --spawn (see back/benchmarks/seed.py)")
+        with open(args.seed_file, encoding="utf-8") as f:
+            seed = json.load(f)
+
+        limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.back_url, timeout=args.timeout, limits=limits) as back, \
+                httpx.AsyncClient(base_url=args.ai_url, timeout=args.timeout, limits=limits) as ai:
+            scenarios = Scenarios(back, ai, seed, args)
+            names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+            if not args.skip_index and {"chat", "quiz"} & set(names):
+                await scenarios.index_seed()
+            print(f"requests: {args.requests}, concurrency: {args.concurrency}, stub: latency {args.latency}s, "
+                  f"{args.tokens_per_second or 'instant'} tok/s x {args.response_tokens} tokens, parallel {args.parallel}")
+            results = {}
+            for name in names:
+                if name not in SCENARIOS:
+                    raise SystemExit(f"Unknown scenario {name}, expected one of {', '.join(SCENARIOS)}")
+                results[name] = await run_scenario(getattr(scenarios, name), args.requests, args.concurrency)
+    finally:
+        if stack:
+            stack.stop()
+
+    print_results(results)
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"load-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.json")
+    params = {k: v for k, v in vars(args).items() if k not in ("compare", "results_dir", "seed_file", "work_dir", "keep")}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "params": params,
+            "scenarios": results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"results saved to {path}")
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    # Готовый стенд
+    parser.add_argument("--back-url", default="http://localhost:8000")
+    parser.add_argument("--back-prefix", default="/api/v1")
+    parser.add_argument("--ai-url", default="http://localhost:8001")
+    parser.add_argument("--seed-file")
+    parser.add_argument("--skip-index", action="store_true", help="Статьи seed уже проиндексированы в back-ai")
+    # Локальный стенд (--spawn)
+    parser.add_argument("--spawn", action="store_true")
+    parser.add_argument("--work-dir", help="Каталог хранилища, логов и трасс стенда (по умолчанию временный)")
+    parser.add_argument("--keep", action="store_true", help="Не удалять временный каталог стенда")
+    parser.add_argument("--employees", type=int, default=20)
+    parser.add_argument("--articles", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.2, help="Заглушка: обработка промпта, с")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--parallel", type=int, default=4, help="Заглушка: одновременных генераций")
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    # Результаты
+    parser.add_argument("--results-dir", default=os.path.join(BACK_AI_DIR, "benchmarks", "results"))
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
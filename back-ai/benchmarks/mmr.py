@@ -0,0 +1,99 @@
+"""
+Бенчмарк MMR-переранжирования против текущего top-k: избыточность выдачи и цена по времени.
+
+Запуск из каталога back-ai:
+    python -m benchmarks.mmr --synthetic 300 --dim 768                 # 300 фрагментов по --copies почти-дублей
+    python -m benchmarks.mmr --collection org_<id>                     # коллекция из VECTOR_STORE_BACKEND
+
+Синтетика повторяет перекрытие чанков: фрагменты сгруппированы по темам (документам), и каждый
+фрагмент представлен несколькими почти совпадающими векторами.
+Метрики по выдаче из k чанков:
+    redundancy - средняя попарная косинусная близость выбранных (меньше - разнообразнее);
+    distinct   - число разных фрагментов (для коллекции - разных источников);
+    relevance  - средняя близость к запросу.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.mmr import mmr_select
+from app.services.vector_store import create_vector_store, _top_k
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def load_vectors(args, rng):
+    """Возвращает (векторы, метка фрагмента/источника для каждого вектора)."""
+    if args.synthetic:
+        topics = normalize(rng.normal(size=(max(args.synthetic // args.per_topic, 1), args.dim)))
+        topic_of = np.arange(args.synthetic) % len(topics)
+        passages = normalize(topics[topic_of] + rng.normal(scale=1.0 / np.sqrt(args.dim), size=(args.synthetic, args.dim)))
+        labels = np.repeat(np.arange(args.synthetic), args.copies)
+        noise = rng.normal(scale=args.copy_noise / np.sqrt(args.dim), size=(len(labels), args.dim))
+        return normalize(passages[labels] + noise).astype(np.float32), labels
+    page = create_vector_store().get(args.collection, include_embeddings=True)
+    if not page["ids"]:
+        raise SystemExit(f"Collection {args.collection} is empty or missing")
+    sources = [meta.get("source_id", "") for meta in page["metadatas"]]
+    _, labels = np.unique(sources, return_inverse=True)
+    return normalize(np.asarray(page["embeddings"], dtype=np.float32)), labels
+
+
+def redundancy(vectors: np.ndarray) -> float:
+    if len(vectors) < 2:
+        return 0.0
+    similarity = vectors @ vectors.T
+    return float(similarity[np.triu_indices(len(vectors), 1)].mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection")
+    parser.add_argument("--synthetic", type=int, default=0, help="Сгенерировать N фрагментов")
+    parser.add_argument("--per-topic", type=int, default=10, help="Фрагментов на тему")
+    parser.add_argument("--copies", type=int, default=4, help="Почти-дублей на фрагмент (перекрытие чанков)")
+    parser.add_argument("--copy-noise", type=float, default=0.3)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=1.0, help="Шум запроса относительно нормы вектора")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--pool", type=int, default=20)
+    parser.add_argument("--lambdas", default="0.5,0.6,0.7")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if not args.collection and not args.synthetic:
+        parser.error("--collection or --synthetic is required")
+
+    rng = np.random.default_rng(args.seed)
+    vectors, labels = load_vectors(args, rng)
+    n, dim = vectors.shape
+    k, pool = min(args.k, n), min(args.pool, n)
+
+    # Запрос - зашумленный случайный чанк: рядом с ним его копии и другие фрагменты той же темы
+    queries = vectors[rng.integers(0, n, size=args.queries)]
+    queries = normalize(queries + rng.normal(scale=args.noise / np.sqrt(dim), size=queries.shape)).astype(np.float32)
+    candidates = [_top_k(vectors @ q, pool) for q in queries]
+
+    print(f"vectors: {n} x {dim}, queries: {args.queries}, k={k}, pool={pool}")
+    print(f"{'method':<12} {'redundancy':>10} {'distinct':>9} {'relevance':>10} {'ms/query':>9}")
+
+    def report(name, pick):
+        stats = []
+        start = time.perf_counter()
+        chosen = [pick(q, rows) for q, rows in zip(queries, candidates)]
+        elapsed = (time.perf_counter() - start) / len(queries)
+        for q, rows in zip(queries, chosen):
+            stats.append((redundancy(vectors[rows]), len(set(labels[rows].tolist())), float((vectors[rows] @ q).mean())))
+        mean = np.mean(stats, axis=0)
+        print(f"{name:<12} {mean[0]:>10.4f} {mean[1]:>9.2f} {mean[2]:>10.4f} {elapsed * 1e3:>9.3f}")
+
+    report("top-k", lambda q, rows: rows[:k])
+    for lambda_ in (float(x) for x in args.lambdas.split(",")):
+        report(f"mmr {lambda_:g}", lambda q, rows: rows[mmr_select(q, vectors[rows], k, lambda_)[0]])
+
+
+if __name__ == "__main__":
+    main()
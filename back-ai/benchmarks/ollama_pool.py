@@ -0,0 +1,103 @@
+"""
+Бенчмарк пула узлов Ollama на заглушках (benchmarks.ollama_stub): пропускная способность от числа узлов,
+распределение запросов, попадание сессий на "свой" узел и переживание упавших узлов.
+
+Запуск из каталога back-ai:
+    python -m benchmarks.ollama_pool --nodes 4 --requests 200 --concurrency 32 --latency 0.2
+    python -m benchmarks.ollama_pool --nodes 3 --down 1        # плюс узел, который не отвечает
+
+Каждая заглушка выполняет один запрос за раз (--parallel), поэтому при линейном масштабировании
+req/s растет пропорционально числу узлов.
+"""
+import argparse
+import asyncio
+import random
+import socket
+import time
+from collections import Counter, defaultdict
+
+from app.core.config import settings
+from app.services.ollama_pool import OllamaPool
+from benchmarks.ollama_stub import DEFAULT_MODELS, StubOllama
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(nodes: int, args) -> dict:
+    stubs = [StubOllama(DEFAULT_MODELS.split(","), args.latency, args.parallel) for _ in range(nodes)]
+    servers = [await stub.start() for stub in stubs]
+    urls = [f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}" for server in servers]
+    urls += [f"http://127.0.0.1:{unused_port()}" for _ in range(args.down)]
+    pool = OllamaPool(urls)
+    await pool.check_health()
+
+    rng = random.Random(args.seed)
+    sessions = [f"session-{rng.randrange(args.sessions)}" if args.sessions else None for _ in range(args.requests)]
+    placements = defaultdict(Counter)
+    failed = 0
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def one(session):
+        nonlocal failed
+        async with limit:
+            node = pool.pick(settings.LLM_MODEL_NAME, session)
+            try:
+                response = await pool.post("/api/generate", {"model": settings.LLM_MODEL_NAME, "prompt": "вопрос"}, affinity=session)
+                response.raise_for_status()
+            except Exception:
+                failed += 1
+            if session:
+                placements[session][node.url] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(s) for s in sessions))
+    elapsed = time.perf_counter() - start
+
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+    for node in pool.nodes:
+        await node.client.aclose()
+
+    # Доля запросов сессии, ушедших на ее самый частый узел
+    affinity = (sum(max(c.values()) for c in placements.values()) / sum(sum(c.values()) for c in placements.values())
+                if placements else None)
+    return {
+        "rps": args.requests / elapsed,
+        "per_node": [stub.requests - 1 for stub in stubs], # минус проверка здоровья
+        "affinity": affinity,
+        "failed": failed,
+    }
+
+
+async def main_async(args):
+    print(f"requests: {args.requests}, concurrency: {args.concurrency}, latency: {args.latency}s, "
+          f"parallel per node: {args.parallel}, sessions: {args.sessions or '-'}, down nodes: {args.down}")
+    print(f"{'nodes':>5} {'req/s':>8} {'speedup':>8} {'affinity':>9} {'failed':>7}  per node")
+    base = None
+    for nodes in range(1, args.nodes + 1):
+        result = await run(nodes, args)
+        base = base or result["rps"]
+        affinity = f"{result['affinity']:.2f}" if result["affinity"] is not None else "-"
+        print(f"{nodes:>5} {result['rps']:>8.1f} {result['rps'] / base:>7.2f}x {affinity:>9} {result['failed']:>7}  {result['per_node']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--parallel", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=50, help="Число сессий с affinity (0 - без affinity)")
+    parser.add_argument("--down", type=int, default=0, help="Сколько недоступных узлов добавить в пул")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
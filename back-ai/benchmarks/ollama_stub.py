@@ -0,0 +1,191 @@
+"""
+Заглушка Ollama для проверки пула узлов и нагрузочных тестов без моделей: /api/tags, /api/generate, /api/embeddings.
+
+Запуск из каталога back-ai:
+    python -m benchmarks.ollama_stub --port 11501 --latency 0.5 --parallel 1
+    python -m benchmarks.ollama_stub --latency 0.3 --tokens-per-second 20 --response-tokens 60
+
+Генерация: --latency секунд на обработку промпта, затем --response-tokens токенов со скоростью
+--tokens-per-second (0 - мгновенно). Одновременно выполняется не более --parallel запросов (как
+OLLAMA_NUM_PARALLEL на CPU-узле), остальные ждут в очереди узла. Ответ содержит счетчики и длительности
+как у Ollama (prompt_eval_count, eval_count, eval_duration...), stream=true (по умолчанию, как в Ollama)
+отдается NDJSON-чанками по токену; format="json" возвращает валидный JSON с вопросами теста.
+Только стандартная библиотека: минимальный HTTP/1.1 с keep-alive, которого хватает httpx.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import struct
+import time
+from datetime import datetime, timezone
+
+DEFAULT_MODELS = "llama3:8b-instruct,nomic-embed-text:latest"
+ANSWER_WORDS = ("Согласно", "регламенту", "компании,", "сотрудник", "обращается", "к", "наставнику", "и", "оформляет",
+                "заявку", "в", "отделе", "кадров.")
+QUIZ_RESPONSE = {"questions": [
+    {
+        "question_text": f"Вопрос заглушки {i + 1}?",
+        "options": [{"text": f"Вариант {j + 1}", "is_correct": j == 0} for j in range(4)],
+    }
+    for i in range(3)
+]}
+
+
+class StubOllama:
+    def __init__(self, models, latency: float = 0.5, parallel: int = 1, dim: int = 768,
+                 tokens_per_second: float = 0.0, response_tokens: int = 3, embed_latency: float = 0.0):
+        self.models = [m if ":" in m else f"{m}:latest" for m in models]
+        self.latency = latency
+        self.dim = dim
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = max(1, response_tokens)
+        self.embed_latency = embed_latency
+        self.slots = asyncio.Semaphore(parallel)
+        self.requests = 0
+
+    def _has_model(self, name: str) -> bool:
+        return (name if ":" in name else f"{name}:latest") in self.models
+
+    def _pieces(self, body: dict):
+        """Текст ответа, разбитый на response_tokens "токенов"."""
+        n = self.response_tokens
+        if body.get("format") == "json":
+            text = json.dumps(QUIZ_RESPONSE, ensure_ascii=False)
+            step = -(-len(text) // n)
+            return [text[i:i + step] for i in range(0, len(text), step)]
+        return [("" if i == 0 else " ") + ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(n)]
+
+    def _chunk(self, body: dict, **fields) -> dict:
+        return {"model": body["model"], "created_at": datetime.now(timezone.utc).isoformat(), **fields}
+
+    def _stats(self, body: dict, started: float, eval_count: int, eval_seconds: float) -> dict:
+        prompt_tokens = len(body.get("prompt", "").split())
+        return {
+            "done": True,
+            "done_reason": "stop",
+            "context": list(body.get("context") or []) + list(range(prompt_tokens + eval_count)),
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.latency * 1e9),
+            "eval_count": eval_count,
+            "eval_duration": int(eval_seconds * 1e9),
+        }
+
+    async def _generate(self, body: dict):
+        if not self._has_model(body.get("model", "")):
+            return 404, {"error": f"model '{body.get('model')}' not found"}
+        if body.get("stream", True):
+            return 200, self._stream(body)
+        started = time.perf_counter()
+        pieces = self._pieces(body)
+        async with self.slots:
+            await asyncio.sleep(self.latency)
+            eval_started = time.perf_counter()
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(len(pieces) / self.tokens_per_second)
+            eval_seconds = time.perf_counter() - eval_started
+        return 200, self._chunk(body, response="".join(pieces), **self._stats(body, started, len(pieces), eval_seconds))
+
+    async def _stream(self, body: dict):
+        started = time.perf_counter()
+        pieces = self._pieces(body)
+        async with self.slots:
+            await asyncio.sleep(self.latency)
+            eval_started = time.perf_counter()
+            for piece in pieces:
+                if self.tokens_per_second > 0:
+                    await asyncio.sleep(1 / self.tokens_per_second)
+                yield self._chunk(body, response=piece, done=False)
+            eval_seconds = time.perf_counter() - eval_started
+        yield self._chunk(body, response="", **self._stats(body, started, len(pieces), eval_seconds))
+
+    async def _embeddings(self, body: dict):
+        if not self._has_model(body.get("model", "")):
+            return 404, {"error": f"model '{body.get('model')}' not found"}
+        if self.embed_latency:
+            await asyncio.sleep(self.embed_latency)
+        # Детерминированный "эмбеддинг" из хэша текста
+        seed = hashlib.sha256(body.get("prompt", "").encode()).digest()
+        raw = hashlib.shake_256(seed).digest(4 * self.dim)
+        vector = [v / 2**31 for v in struct.unpack(f"<{self.dim}i", raw)]
+        return 200, {"embedding": vector}
+
+    async def _route(self, method: str, path: str, body: dict):
+        self.requests += 1
+        if method == "GET" and path == "/api/tags":
+            return 200, {"models": [{"name": m} for m in self.models]}
+        if method == "POST" and path == "/api/generate":
+            return await self._generate(body)
+        if method == "POST" and path == "/api/embeddings":
+            return await self._embeddings(body)
+        return 404, {"error": "not found"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                raw = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self._route(method, path, json.loads(raw) if raw else {})
+                if isinstance(payload, dict):
+                    data = json.dumps(payload, ensure_ascii=False).encode()
+                    writer.write(
+                        f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                        f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                    )
+                else:
+                    # Стриминг: NDJSON-строки в chunked-кодировке, по мере генерации
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n")
+                    try:
+                        async for chunk in payload:
+                            data = json.dumps(chunk, ensure_ascii=False).encode() + b"\n"
+                            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                            await writer.drain()
+                    finally:
+                        await payload.aclose() # клиент отключился - освобождаем слот узла сразу
+                    writer.write(b"0\r\n\r\n")
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def serve(args):
+    stub = StubOllama(args.models.split(","), args.latency, args.parallel, args.dim,
+                      args.tokens_per_second, args.response_tokens, args.embed_latency)
+    server = await stub.start(args.host, args.port)
+    print(f"Ollama stub on http://{args.host}:{server.sockets[0].getsockname()[1]} (models: {', '.join(stub.models)})")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11501)
+    parser.add_argument("--models", default=DEFAULT_MODELS)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--parallel", type=int, default=1)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Скорость генерации (0 - мгновенно)")
+    parser.add_argument("--response-tokens", type=int, default=3, help="Токенов в ответе")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Секунд на один /api/embeddings")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Бенчмарк квантования векторного индекса: потеря recall@k, память и скорость поиска.
+
+Запуск из каталога back-ai:
+    python -m benchmarks.quantization --collection org_<id>             # коллекция из VECTOR_STORE_BACKEND
+    python -m benchmarks.quantization --synthetic 20000 --dim 768      # без данных
+
+Запросы - случайные чанки коллекции с небольшим шумом; эталон - точный float32 top-k.
+Коллекция каждого режима сохраняется во временный снимок и открывается через mmap, как в сервисе:
+"RAM MB" - векторы в памяти процесса, "mmap MB" - float32-матрица снимка, из которой при квантовании
+читаются только строки кандидатов для пересчета. "slowdown" - время поиска относительно float32:
+квантование экономит память ценой скорости (деквантование в NumPy не ускоряется BLAS).
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.snapshot import Snapshot
+from app.services.vector_store import (
+    QUANTIZATION_MODES, _NumpyCollection, create_vector_store, quantized_scores, _top_k
+)
+
+
+def load_vectors(args) -> np.ndarray:
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        return rng.normal(size=(args.synthetic, args.dim)).astype(np.float32)
+    page = create_vector_store().get(args.collection, include_embeddings=True)
+    if not page["ids"]:
+        raise SystemExit(f"Collection {args.collection} is empty or missing")
+    return np.asarray(page["embeddings"], dtype=np.float32)
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    return len(set(found.tolist()) & set(expected.tolist())) / len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection")
+    parser.add_argument("--synthetic", type=int, default=0, help="Сгенерировать N случайных векторов")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.3, help="Шум запроса относительно нормы вектора")
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if not args.collection and not args.synthetic:
+        parser.error("--collection or --synthetic is required")
+
+    vectors = load_vectors(args)
+    n, dim = vectors.shape
+    rng = np.random.default_rng(args.seed)
+    k = min(args.k, n)
+
+    base = vectors[rng.integers(0, n, size=args.queries)]
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+    queries = base + rng.normal(scale=args.noise / np.sqrt(dim), size=base.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print(f"vectors: {n} x {dim}, queries: {args.queries}, k={k}, rescore factor={args.rescore_factor}")
+    print(f"{'mode':<8} {'RAM MB':>8} {'mmap MB':>8} {'saved':>6} {'recall@k':>9} {'+rescore':>9} "
+          f"{'ms/query':>9} {'slowdown':>9}")
+
+    reference = full_bytes = full_elapsed = None
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in QUANTIZATION_MODES:
+            collection = _NumpyCollection(mode, args.rescore_factor)
+            collection.upsert([str(i) for i in range(n)], vectors, [""] * n, [{}] * n)
+            path = os.path.join(directory, f"{mode}.kbsnap")
+            collection.save(path)
+            if reference is None:
+                reference = [_top_k(np.asarray(collection.full) @ q, k) for q in queries]
+
+            raw_recall, rescored_recall = [], []
+            start = time.perf_counter()
+            for q, expected in zip(queries, reference):
+                rows, _ = collection.search(q, k, None)
+                rescored_recall.append(recall(rows, expected))
+            elapsed = (time.perf_counter() - start) / len(queries)
+
+            for q, expected in zip(queries, reference):
+                if collection.codes is None:
+                    raw_recall.append(1.0)
+                else:
+                    raw_recall.append(recall(_top_k(quantized_scores(collection.codes, collection.scales, q), k), expected))
+
+            memory = collection.memory_bytes()
+            mapped = Snapshot(path).vectors.nbytes if collection.codes is not None else 0
+            if full_bytes is None:
+                full_bytes, full_elapsed = memory, elapsed
+            print(f"{mode:<8} {memory / 2**20:>8.2f} {mapped / 2**20:>8.2f} {full_bytes / memory:>5.1f}x "
+                  f"{np.mean(raw_recall):>9.4f} {np.mean(rescored_recall):>9.4f} {elapsed * 1e3:>9.3f} "
+                  f"{elapsed / full_elapsed:>8.1f}x")
+            del collection
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+import tempfile
+
+# Настройки читаются при импорте app.core.config, а rag_service создается при импорте модуля:
+# тесты работают на NumPy-хранилище во временном каталоге и детерминированных hash-эмбеддингах
+_tmp = tempfile.mkdtemp(prefix="back-ai-tests-")
+os.environ.setdefault("OLLAMA_HOST", "http://localhost:11434")
+os.environ.setdefault("VECTOR_STORE_BACKEND", "numpy")
+os.environ.setdefault("VECTOR_STORE_PATH", os.path.join(_tmp, "vector_store"))
+os.environ.setdefault("EMBEDDING_REGISTRY_PATH", os.path.join(_tmp, "vector_store", "embedding_registry.json"))
+os.environ.setdefault("EMBEDDING_PROVIDER", "hash")
+os.environ.setdefault("TRACE_FILE_PATH", os.path.join(_tmp, "traces.jsonl"))
+
+import pytest
+
+from app.core.config import settings
+
+
+@pytest.fixture
+def make_rag(tmp_path, monkeypatch):
+    """Фабрика RAGService с отдельным хранилищем в tmp_path и заданной раскладкой."""
+    from app.services.rag_service import RAGService
+
+    def make(layout: str = "workspace"):
+        monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path / layout))
+        monkeypatch.setattr(settings, "EMBEDDING_REGISTRY_PATH", str(tmp_path / layout / "embedding_registry.json"))
+        monkeypatch.setattr(settings, "VECTOR_LAYOUT", layout)
+        return RAGService()
+
+    return make
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.admission import AdmissionGate
+
+
+def test_rejects_when_queue_is_full():
+    gate = AdmissionGate("test", max_in_flight=1, max_queue=1, max_wait_seconds=3600)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with gate.admit():
+                await release.wait()
+
+        first = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert (gate.in_flight, gate.waiting) == (1, 1)
+
+        with pytest.raises(HTTPException) as rejected:
+            async with gate.admit():
+                pass
+        release.set()
+        await asyncio.gather(first, second)
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+    assert (gate.admitted, gate.rejected) == (2, 1)
+    assert (gate.in_flight, gate.waiting) == (0, 0)
+
+
+def test_rejects_when_estimated_wait_is_too_long():
+    gate = AdmissionGate("test", max_in_flight=1, max_queue=10, max_wait_seconds=5)
+    gate.avg_service_seconds = 10
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with gate.admit():
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert gate.estimated_wait() == pytest.approx(10)
+        with pytest.raises(HTTPException) as rejected:
+            async with gate.admit():
+                pass
+        release.set()
+        await running
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.headers["Retry-After"] == "10"
+
+
+def test_admits_up_to_max_in_flight_without_waiting():
+    gate = AdmissionGate("test", max_in_flight=3, max_queue=3, max_wait_seconds=0)
+
+    async def scenario():
+        async def run():
+            async with gate.admit():
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(run() for _ in range(3)))
+
+    asyncio.run(scenario())
+    assert (gate.admitted, gate.rejected) == (3, 0)
+    assert gate.avg_service_seconds < 10
@@ -0,0 +1,32 @@
+import json
+import os
+
+import pytest
+
+from app.services.emotion import DEFAULT_EMOTION, EMOTION_LABELS, classify_emotion
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "data", "emotion_corpus_ru.jsonl")
+
+
+@pytest.mark.parametrize("text, label", [
+    ("Рад помочь, коллега! Добро пожаловать в команду.", "happy"),
+    ("Поздравляю, вы успешно прошли тест!", "happy"),
+    ("К сожалению, в моих документах нет информации по этому вопросу.", "thinking"),
+    ("Возможно, это зависит от вашего подразделения, уточните у наставника.", "thinking"),
+    ("Пропуск оформляется в бюро пропусков на первом этаже.", "neutral"),
+    # "рад" внутри другого слова - не радость
+    ("Дозиметр измеряет уровень радиации в помещении.", "neutral"),
+    ("Парадный вход закрыт, используйте служебный.", "neutral"),
+    ("", DEFAULT_EMOTION),
+])
+def test_classify_emotion(text, label):
+    assert classify_emotion(text) == label
+
+
+def test_corpus_accuracy():
+    with open(CORPUS, encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    assert {s["label"] for s in samples} <= set(EMOTION_LABELS)
+
+    correct = sum(classify_emotion(s["text"]) == s["label"] for s in samples)
+    assert correct / len(samples) >= 0.9
@@ -0,0 +1,63 @@
+import asyncio
+from uuid import uuid4
+
+from app.core.config import settings
+
+
+def _ingest(rag, workspace_id, texts, organization_id=None):
+    return rag.process_and_embed_chunks(str(workspace_id), uuid4(), list(texts), [{} for _ in texts], organization_id=organization_id)
+
+
+def test_results_are_merged_by_score_across_workspaces(make_rag, monkeypatch):
+    monkeypatch.setattr(settings, "MMR_LAMBDA", 1.0)
+    rag = make_rag("workspace")
+    track_id, organization_id = uuid4(), uuid4()
+
+    async def scenario():
+        await _ingest(rag, track_id, ["Пропуск выдают в первый день."])
+        await _ingest(rag, organization_id, ["Отпуск оформляется заявлением.", "Столовая работает с 12 до 15."])
+        embedding = await rag._embed_query("Отпуск оформляется заявлением.")
+        return await rag.search_workspaces([track_id, organization_id], "", n_results=3, query_embedding=embedding)
+
+    hits = asyncio.run(scenario())
+    assert hits[0]["text_chunk"] == "Отпуск оформляется заявлением."
+    assert len(hits) == 3
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+
+
+def test_same_chunk_from_several_tracks_is_returned_once(make_rag):
+    rag = make_rag("organization")
+    organization_id, first_track, second_track, source_id = uuid4(), uuid4(), uuid4(), uuid4()
+    text = "Инструктаж по охране труда проходят в первую неделю."
+
+    async def scenario():
+        await rag.process_and_embed_chunks(str(first_track), source_id, [text], [{}], organization_id=organization_id)
+        # Тот же источник в другом треке - только флаг принадлежности, без повторного чанка
+        await rag.process_and_embed_chunks(str(second_track), source_id, [text], [{}], organization_id=organization_id)
+        return await rag.search_workspaces([first_track, second_track], text, organization_id=organization_id)
+
+    hits = asyncio.run(scenario())
+    assert [h["text_chunk"] for h in hits] == [text]
+
+
+def test_failed_or_slow_workspace_is_skipped(make_rag, monkeypatch):
+    monkeypatch.setattr(settings, "FANOUT_TIMEOUT_SECONDS", 0.05)
+    rag = make_rag("workspace")
+    track_id, slow_id, broken_id = uuid4(), uuid4(), uuid4()
+    search = rag.query_knowledge_base
+
+    async def query_knowledge_base(workspace_id, *args, **kwargs):
+        if workspace_id == str(slow_id):
+            await asyncio.sleep(1)
+        if workspace_id == str(broken_id):
+            raise RuntimeError("collection is broken")
+        return await search(workspace_id, *args, **kwargs)
+
+    monkeypatch.setattr(rag, "query_knowledge_base", query_knowledge_base)
+
+    async def scenario():
+        await _ingest(rag, track_id, ["Пропуск выдают в первый день."])
+        return await rag.search_workspaces([track_id, slow_id, broken_id], "Пропуск выдают в первый день.")
+
+    hits = asyncio.run(scenario())
+    assert [h["text_chunk"] for h in hits] == ["Пропуск выдают в первый день."]
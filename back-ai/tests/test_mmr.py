@@ -0,0 +1,38 @@
+import numpy as np
+
+from app.services.mmr import mmr_select
+
+
+def _unit(*rows):
+    vectors = np.asarray(rows, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_lambda_one_is_plain_top_k():
+    query = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    candidates = _unit([0.2, 1, 0], [1, 0.1, 0], [1, 0.5, 0], [0, 0, 1])
+
+    order, relevance = mmr_select(query, candidates, 3, 1.0)
+    assert order == [1, 2, 0]
+    assert list(relevance) == sorted(relevance, reverse=True)
+
+
+def test_near_duplicates_are_skipped():
+    query = np.array([1.0, 1.0], dtype=np.float32)
+    # Два почти одинаковых чанка (перекрытие) и один чуть менее близкий, но о другом
+    candidates = _unit([1, 0.3], [1, 0.28], [0.25, 1])
+
+    assert mmr_select(query, candidates, 2, 1.0)[0] == [0, 1]
+    order, _ = mmr_select(query, candidates, 2, 0.5)
+    assert order == [0, 2]
+
+
+def test_k_larger_than_pool_and_empty_pool():
+    query = np.array([1.0, 0.0], dtype=np.float32)
+
+    order, relevance = mmr_select(query, _unit([1, 0], [0, 1]), 5, 0.5)
+    assert sorted(order) == [0, 1]
+    assert len(relevance) == 2
+
+    order, relevance = mmr_select(query, np.empty((0, 2), dtype=np.float32), 3, 0.5)
+    assert order == [] and relevance.size == 0
@@ -0,0 +1,140 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+ORG_DOC = "Отпуск оформляется заявлением в HR-портале за две недели."
+TRACK_DOC = "Доступ к репозиторию выдает тимлид после первого дня."
+
+
+async def _search_as_track_user(rag, track_id, organization_id):
+    # Так back ищет для сотрудника трека: трек + база знаний организации (organization_scope)
+    scopes = rag.search_scopes(track_id, [organization_id])
+    return await rag.search_workspaces(scopes, ORG_DOC, n_results=5, organization_id=organization_id)
+
+
+@pytest.mark.parametrize("layout", ["workspace", "organization"])
+def test_organization_document_is_found_by_track_user(make_rag, layout):
+    rag = make_rag(layout)
+    organization_id, track_id = uuid4(), uuid4()
+    org_source, track_source = uuid4(), uuid4()
+
+    async def scenario():
+        # Общий документ организации индексируется с workspace_id = id организации
+        await rag.process_and_embed_chunks(str(organization_id), org_source, [ORG_DOC], [{}], organization_id=organization_id)
+        await rag.process_and_embed_chunks(str(track_id), track_source, [TRACK_DOC], [{}], organization_id=organization_id)
+        return await _search_as_track_user(rag, track_id, organization_id)
+
+    hits = asyncio.run(scenario())
+    assert hits[0]["text_chunk"] == ORG_DOC
+    assert hits[0]["metadata"]["source_id"] == str(org_source)
+
+
+def test_organization_document_is_not_shared_across_organizations(make_rag):
+    rag = make_rag("organization")
+    organization_id, other_organization_id = uuid4(), uuid4()
+
+    async def scenario():
+        await rag.process_and_embed_chunks(str(organization_id), uuid4(), [ORG_DOC], [{}], organization_id=organization_id)
+        return await _search_as_track_user(rag, uuid4(), other_organization_id)
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_membership_sync_moves_document_from_organization_to_track(make_rag):
+    rag = make_rag("organization")
+    organization_id, track_id, source_id = uuid4(), uuid4(), uuid4()
+
+    async def scenario():
+        await rag.process_and_embed_chunks(str(organization_id), source_id, [ORG_DOC], [{}], organization_id=organization_id)
+        # Файл привязали к треку: back передает новую принадлежность (vector_sync.sync_source_membership)
+        await rag.set_source_membership(organization_id, source_id, [track_id], [], [])
+        in_track = await rag.query_knowledge_base(str(track_id), ORG_DOC, organization_id=organization_id)
+        in_organization = await rag.query_knowledge_base(str(organization_id), ORG_DOC, organization_id=organization_id)
+        return in_track, in_organization
+
+    in_track, in_organization = asyncio.run(scenario())
+    assert [h["text_chunk"] for h in in_track] == [ORG_DOC]
+    assert in_organization == []
+
+
+def _workspace_sources(rag, workspace_id):
+    name = rag.collection_name(workspace_id)
+    if not rag.store.has_collection(name):
+        return set()
+    return {m["source_id"] for m in rag.store.get(name)["metadatas"]}
+
+
+def test_attach_and_detach_move_chunks_between_workspaces(make_rag, monkeypatch):
+    rag = make_rag("workspace")
+    organization_id, track_id, source_id = uuid4(), uuid4(), uuid4()
+    embedded = []
+    embed_texts = rag.embed_texts
+
+    async def count_embeddings(texts):
+        embedded.extend(texts)
+        return await embed_texts(texts)
+
+    monkeypatch.setattr(rag, "embed_texts", count_embeddings)
+
+    async def scenario():
+        await rag.process_and_embed_chunks(str(organization_id), source_id, [ORG_DOC], [{}], organization_id=organization_id)
+        # Файл привязали к треку: чанки копируются в базу трека и убираются из базы организации
+        embedded.clear()
+        chunks, missing = await rag.set_source_membership(organization_id, source_id, [track_id], [], [], [organization_id])
+        assert (chunks, missing) == (1, [])
+        # Чанки копируются вместе с векторами, без повторного эмбеддинга
+        assert embedded == []
+        assert _workspace_sources(rag, track_id) == {str(source_id)}
+        assert _workspace_sources(rag, organization_id) == set()
+        assert (await _search_as_track_user(rag, track_id, organization_id))[0]["text_chunk"] == ORG_DOC
+
+        # Отвязали - документ снова общий
+        await rag.set_source_membership(organization_id, source_id, [organization_id], [], [], [track_id])
+        assert _workspace_sources(rag, track_id) == set()
+        assert _workspace_sources(rag, organization_id) == {str(source_id)}
+
+    asyncio.run(scenario())
+
+
+def test_membership_reports_workspaces_without_chunks(make_rag):
+    rag = make_rag("workspace")
+    organization_id, track_id, source_id = uuid4(), uuid4(), uuid4()
+
+    result = asyncio.run(rag.set_source_membership(organization_id, source_id, [track_id], [], [], [organization_id]))
+    assert result == (0, [str(track_id)])
+
+
+class _AnsweringPool:
+    async def post(self, *args, **kwargs):
+        return _Response()
+
+
+class _Response:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"response": "Ответ", "context": [1, 2]}
+
+
+@pytest.mark.parametrize("layout", ["workspace", "organization"])
+def test_scoped_query_finds_stage_files_in_organization_base(make_rag, monkeypatch, layout):
+    import app.services.rag_service as rag_module
+
+    rag = make_rag(layout)
+    monkeypatch.setattr(rag_module, "ollama_pool", _AnsweringPool())
+    organization_id, track_id = uuid4(), uuid4()
+    stage_source, other_source = uuid4(), uuid4()
+
+    async def scenario():
+        # Файл этапа - общий документ организации, в базе трека его нет
+        await rag.process_and_embed_chunks(str(organization_id), stage_source, [ORG_DOC], [{}], organization_id=organization_id)
+        await rag.process_and_embed_chunks(str(track_id), other_source, [TRACK_DOC], [{}], organization_id=organization_id)
+        return await rag.answer_query(
+            track_id, "Как оформить отпуск?", uuid4(), organization_id=organization_id,
+            extra_workspaces=[organization_id], source_ids=[stage_source]
+        )
+
+    _, sources, _ = asyncio.run(scenario())
+    assert [s["text_chunk"] for s in sources] == [ORG_DOC]
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from app.services.vector_store import NumpyVectorStore
+
+
+def _vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_search_recall(tmp_path, quantization):
+    n, k = 3000, 10
+    vectors = _vectors(n, dim=64, seed=1)
+    queries = _vectors(30, dim=64, seed=2)
+    exact = NumpyVectorStore(str(tmp_path / "exact"))
+    quantized = NumpyVectorStore(str(tmp_path / quantization), quantization=quantization)
+    for store in (exact, quantized):
+        store.upsert("kb", ids=[str(i) for i in range(n)], embeddings=vectors.tolist(),
+                     documents=[""] * n, metadatas=[{} for _ in range(n)])
+
+    found = total = 0
+    for query in queries:
+        expected = {h["id"] for h in exact.query("kb", query.tolist(), n_results=k)}
+        hits = quantized.query("kb", query.tolist(), n_results=k)
+        found += len(expected & {h["id"] for h in hits})
+        total += k
+    # Top-кандидаты пересчитываются по полным векторам - результат почти совпадает с точным поиском
+    assert found / total >= 0.95
+
+
+def test_quantized_collection_uses_less_memory_after_reload(tmp_path):
+    vectors = _vectors(2000, dim=64)
+    NumpyVectorStore(str(tmp_path)).upsert(
+        "kb", ids=[str(i) for i in range(2000)], embeddings=vectors.tolist(),
+        documents=[""] * 2000, metadatas=[{} for _ in range(2000)]
+    )
+
+    full = NumpyVectorStore(str(tmp_path))
+    int8 = NumpyVectorStore(str(tmp_path), quantization="int8")
+    full.get("kb", limit=1)
+    int8.get("kb", limit=1)
+    assert int8.memory_bytes() < full.memory_bytes() / 2
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.session_memory import SessionMemory, SessionState, is_follow_up
+
+
+def test_sessions_are_bounded_lru():
+    memory = SessionMemory(max_sessions=2)
+    memory.get("a")
+    memory.get("b")
+    memory.get("a") # "a" - последняя использованная
+    memory.get("c")
+
+    assert len(memory) == 2
+    assert not memory.drop("b")
+    assert memory.drop("a") and memory.drop("c")
+
+
+def test_session_restored_from_history():
+    state = SessionMemory(10).get("s", history=[{"question": "q1", "answer": "a1"}, {"question": "q2", "answer": "a2"}])
+    assert state.turns == [("q1", "a1"), ("q2", "a2")]
+    assert state.context is None
+
+
+def test_evict_idle_keeps_active_sessions():
+    memory = SessionMemory(10)
+    memory.get("idle")
+    busy = memory.get("busy")
+
+    async def evict_while_busy():
+        async with busy.lock:
+            return memory.evict_idle(0)
+
+    assert asyncio.run(evict_while_busy()) == 1
+    assert len(memory) == 1
+    assert memory.drop("busy")
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("А сколько дней?", True),
+    ("Где это находится?", True),
+    ("Подробнее", True),
+    ("Как оформить отпуск в первый месяц работы?", False),
+    ("Что такое радиационный контроль на объекте?", False),
+])
+def test_is_follow_up(question, expected):
+    assert is_follow_up(question) is expected
+
+
+class _FailingPool:
+    async def post(self, *args, **kwargs):
+        raise ConnectionError("ollama is down")
+
+
+def test_compact_history_keeps_last_turns(make_rag, monkeypatch):
+    import app.services.rag_service as rag_module
+
+    rag = make_rag()
+    monkeypatch.setattr(rag_module, "ollama_pool", _FailingPool())
+    state = SessionState(turns=[(f"q{i}", f"a{i}") for i in range(settings.SESSION_MAX_TURNS + 3)])
+
+    asyncio.run(rag._compact_history(state, "session"))
+
+    assert state.turns == [(f"q{i}", f"a{i}") for i in range(3, settings.SESSION_MAX_TURNS + 3)]
+    # Без LLM вытесненные ходы остаются в пересказе дословно
+    assert "Сотрудник: q0" in state.summary and "Ответ: a2" in state.summary
+    assert "q3" not in state.summary
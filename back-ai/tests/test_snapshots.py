@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from app.services.vector_store import NumpyVectorStore
+
+
+def _vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _fill(store, name: str, n: int = 8, dim: int = 32):
+    vectors = _vectors(n, dim)
+    store.upsert(
+        name,
+        ids=[f"c{i}" for i in range(n)],
+        embeddings=vectors.tolist(),
+        documents=[f"doc {i}" for i in range(n)],
+        metadatas=[{"source_id": f"s{i % 3}", "n": i, "track_a": i % 2 == 0} for i in range(n)],
+    )
+    return vectors
+
+
+@pytest.mark.parametrize("quantization", ["none", "float16", "int8"])
+def test_snapshot_round_trip(tmp_path, quantization):
+    store = NumpyVectorStore(str(tmp_path), quantization=quantization)
+    vectors = _fill(store, "kb")
+    store.delete_ids("kb", ["c3"])
+    store.delete("kb", where={"source_id": "s1"})
+    store.update_metadatas("kb", ["c0"], [{"source_id": "s0", "n": 0, "track_a": False}])
+
+    reopened = NumpyVectorStore(str(tmp_path), quantization=quantization)
+    stored = reopened.get("kb", include_embeddings=True)
+    assert stored["ids"] == ["c0", "c2", "c5", "c6"]
+    assert stored["documents"] == ["doc 0", "doc 2", "doc 5", "doc 6"]
+    assert stored["metadatas"][0]["track_a"] is False
+    np.testing.assert_allclose(np.asarray(stored["embeddings"]), vectors[[0, 2, 5, 6]], atol=1e-6)
+    assert reopened.query("kb", vectors[6].tolist(), n_results=1)[0]["id"] == "c6"
+
+
+def test_export_import_and_copy(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "store"))
+    vectors = _fill(store, "kb")
+    path = str(tmp_path / "kb.kbsnap")
+    store.export_snapshot("kb", path)
+
+    store.import_snapshot("restored", path)
+    store.copy_collection("kb", "clone")
+    for name in ("restored", "clone"):
+        assert store.get(name)["ids"] == store.get("kb")["ids"]
+        assert store.query(name, vectors[3].tolist(), n_results=1)[0]["id"] == "c3"
+
+    # Экспорт по условию - только часть коллекции
+    store.export_snapshot("kb", path, where={"source_id": "s1"})
+    store.import_snapshot("part", path)
+    assert store.get("part")["ids"] == ["c1", "c4", "c7"]
+
+
+def test_idle_collections_are_evicted_and_reloaded(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    vectors = _fill(store, "kb")
+
+    assert store.evict_idle(0) == ["kb"]
+    assert store.loaded_collections() == []
+    assert store.query("kb", vectors[2].tolist(), n_results=1)[0]["id"] == "c2"
+    assert store.loaded_collections() == ["kb"]
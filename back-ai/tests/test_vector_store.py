@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from app.services.vector_store import NumpyVectorStore
+
+
+def _vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _fill(store, name: str, n: int = 8, dim: int = 32):
+    vectors = _vectors(n, dim)
+    store.upsert(
+        name,
+        ids=[f"c{i}" for i in range(n)],
+        embeddings=vectors.tolist(),
+        documents=[f"doc {i}" for i in range(n)],
+        metadatas=[{"source_id": f"s{i % 3}", "n": i, "track_a": i % 2 == 0} for i in range(n)],
+    )
+    return vectors
+
+
+@pytest.mark.parametrize("where, expected", [
+    ({"source_id": "s1"}, {"c1", "c4", "c7"}),
+    ({"source_id": {"$in": ["s0", "s2"]}}, {"c0", "c2", "c3", "c5", "c6"}),
+    ({"source_id": {"$nin": ["s0", "s2"]}}, {"c1", "c4", "c7"}),
+    ({"source_id": {"$ne": "s0"}}, {"c1", "c2", "c4", "c5", "c7"}),
+    ({"$and": [{"track_a": True}, {"source_id": "s0"}]}, {"c0", "c6"}),
+    ({"$or": [{"n": 1}, {"n": 2}]}, {"c1", "c2"}),
+])
+def test_get_and_query_apply_filters(tmp_path, where, expected):
+    store = NumpyVectorStore(str(tmp_path))
+    vectors = _fill(store, "kb")
+
+    assert set(store.get("kb", where=where)["ids"]) == expected
+    hits = store.query("kb", vectors[0].tolist(), n_results=8, where=where)
+    assert {h["id"] for h in hits} == expected
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+
+
+def test_query_returns_exact_match_first(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    vectors = _fill(store, "kb")
+
+    hits = store.query("kb", vectors[5].tolist(), n_results=3, include_embeddings=True)
+    assert hits[0]["id"] == "c5"
+    assert hits[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    np.testing.assert_allclose(hits[0]["embedding"], vectors[5], atol=1e-6)
+
+
+def test_upsert_replaces_existing_ids(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    vectors = _fill(store, "kb")
+    store.upsert("kb", ids=["c1"], embeddings=[vectors[2].tolist()], documents=["updated"], metadatas=[{"source_id": "s9"}])
+
+    stored = store.get("kb", ids=["c1"])
+    assert stored["documents"] == ["updated"]
+    assert len(store.get("kb")["ids"]) == 8
+    assert {h["id"] for h in store.query("kb", vectors[2].tolist(), n_results=2)} == {"c1", "c2"}
+
+
+def test_lazy_flush_persists_on_flush_and_evict(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), flush_seconds=3600)
+    _fill(store, "kb")
+    # Запись еще не сохранена в снимок
+    assert not NumpyVectorStore(str(tmp_path)).has_collection("kb")
+
+    assert store.flush() == ["kb"]
+    assert len(NumpyVectorStore(str(tmp_path)).get("kb")["ids"]) == 8
+
+    store.delete_ids("kb", ["c0"])
+    assert store.evict("kb")
+    assert len(NumpyVectorStore(str(tmp_path)).get("kb")["ids"]) == 7
+
+
+def test_delete_collection(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    _fill(store, "kb")
+    store.delete_collection("kb")
+
+    assert not store.has_collection("kb")
+    assert store.query("kb", _vectors(1)[0].tolist(), n_results=3) == []
@@ -7,6 +7,10 @@ from uuid import UUID
 from app.core.database import get_db_session
 from app.api.v1.dependencies import get_current_admin
 from app.core import security
+from app.services.ai_client import ai_client
+from app.services.vector_sync import track_source_ids, sync_source_membership
+from app.services.cancellation import cancellation_stats
+from app.services.rate_limit import rate_limit_stats
 from app import schemas, models
 
 router = APIRouter()
@@ -119,4 +123,37 @@ async def delete_user(
     # Удаляем (cascade delete сработает для связанных сущностей, если настроено в моделях)
     await db.delete(user)
     await db.commit()
-    return None
\ No newline at end of file
+    return None
+
+# --- ВЕКТОРНОЕ ХРАНИЛИЩЕ ---
+
+@router.post("/vector-layout/migrate")
+async def migrate_vector_layout(
+    delete_old: bool = False,
+    db: AsyncSession = Depends(get_db_session),
+    admin: models.User = Depends(get_current_admin)
+):
+    """
+    Переносит коллекции workspace_{track_id} в раскладку "organization" (одна коллекция на организацию)
+    и досылает принадлежность источников этапам и задачам. Повторный эмбеддинг не выполняется.
+    """
+    tracks = (await db.execute(select(models.OnboardingTrack))).scalars().all()
+    result = await ai_client.migrate_vector_layout({t.id: t.organization_id for t in tracks}, delete_old=delete_old)
+
+    source_ids = set()
+    for track in tracks:
+        source_ids |= await track_source_ids(db, track.id)
+    await sync_source_membership(db, source_ids)
+    return result
+
+
+@router.get("/ai/cancellations")
+async def ai_cancellations(admin: models.User = Depends(get_current_admin)):
+    """Сколько вызовов AI-сервиса отменено из-за отключения клиента, по операциям."""
+    return cancellation_stats.snapshot()
+
+
+@router.get("/ai/rate-limits")
+async def ai_rate_limits(admin: models.User = Depends(get_current_admin)):
+    """Пропущенные и отклоненные (429) запросы к RAG по типам лимитов - счетчики этого воркера."""
+    return rate_limit_stats.snapshot()
@@ -1,3 +1,4 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -10,6 +11,8 @@ from app.core.config import settings
 from app.api.v1.dependencies import get_current_user, get_current_admin 
 from app import schemas, models
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 def get_hardcoded_admin(email: str) -> Optional[dict]:
@@ -95,7 +98,7 @@ async def login_user(
             db_user = user_res.scalar_one_or_none()
 
             if not db_user:
-                print(f"Auto-creating Super Admin: {form_data.email}")
+                logger.info(f"Auto-creating Super Admin: {form_data.email}")
                 db_user = models.User(
                     full_name=hardcoded_admin.get("full_name", "Super Admin"),
                     email=form_data.email,
@@ -1,3 +1,4 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -8,6 +9,8 @@ from app.core.database import get_db_session
 from app.api.v1.dependencies import get_current_hr
 from app import schemas, models
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @router.post(
@@ -63,7 +66,8 @@ async def sync_connector(
         raise HTTPException(status_code=404, detail="Connector not found")
 
     # 2. Запустить фоновую задачу синхронизации (STUB)
-    print(f"TODO: Start background sync for connector {connector_id}")
+    # TODO: фоновая синхронизация коннектора пока не реализована
+    logger.info("Sync requested for connector %s", connector_id)
 
     return schemas.SyncResponse(
         status="SYNC_STARTED",
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Any
+from typing import List, Any, Optional, Tuple
 from uuid import UUID
 from pydantic import BaseModel
 
 from app.core.database import get_db_session
 from app.api.v1.dependencies import get_current_user
+from app.services.ai_client import ai_client
+from app.services.vector_sync import load_source, source_organization_id, source_scope_ids
 from app import models, schemas
 
 router = APIRouter()
@@ -16,6 +18,42 @@ class MentorAssignRequest(BaseModel):
     mentee_id: UUID
     mentor_id: UUID
 
+class FaqEntry(BaseModel):
+    id: str
+    source_id: UUID
+    source_name: Optional[str] = None
+    question: str
+    answer: str
+    status: str # pending / approved
+
+class FaqReviewItem(BaseModel):
+    id: str
+    action: str # approve / reject
+    question: Optional[str] = None
+    answer: Optional[str] = None
+
+class FaqReviewRequest(BaseModel):
+    source_id: UUID
+    items: List[FaqReviewItem]
+
+# --- Helpers ---
+
+def check_hr_permission(user: models.User):
+    if user.role not in [models.UserRoleEnum.HR, models.UserRoleEnum.ADMIN]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+async def get_faq_source(db: AsyncSession, source_id: UUID, user: models.User) -> Tuple[models.KnowledgeSource, UUID, UUID]:
+    """Источник FAQ организации пользователя, его база знаний (workspace в back-ai) и организация."""
+    source = await load_source(db, source_id)
+    organization_id = source_organization_id(source) if source else None
+    if not source or organization_id != user.organization_id:
+        raise HTTPException(status_code=404, detail="Source not found")
+    # Чанки есть в каждой базе знаний источника - берем одну и ту же при синтезе, просмотре и проверке
+    workspace_id = min(source_scope_ids(source), key=str, default=None)
+    if workspace_id is None:
+        raise HTTPException(status_code=400, detail="Source is not indexed for any track")
+    return source, workspace_id, organization_id
+
 # --- Endpoints ---
 
 @router.get("/employees", response_model=List[schemas.User])
@@ -58,4 +96,42 @@ async def assign_mentor(
     mentee.mentor_id = mentor.id
     await db.commit()
     
-    return {"status": "success", "detail": f"Mentor {mentor.full_name} assigned to {mentee.full_name}"}
\ No newline at end of file
+    return {"status": "success", "detail": f"Mentor {mentor.full_name} assigned to {mentee.full_name}"}
+
+# --- Синтезированные FAQ ---
+
+@router.post("/faq/{source_id}/synthesize", status_code=202)
+async def synthesize_faq(
+    source_id: UUID,
+    db: AsyncSession = Depends(get_db_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Запуск фонового синтеза FAQ по источнику (выполняется в непиковое время)."""
+    check_hr_permission(current_user)
+    source, workspace_id, organization_id = await get_faq_source(db, source_id, current_user)
+    return await ai_client.synthesize_faq(workspace_id, source.id, organization_id=organization_id)
+
+@router.get("/faq", response_model=List[FaqEntry])
+async def list_faq(
+    source_id: UUID,
+    status: Optional[str] = "pending",
+    db: AsyncSession = Depends(get_db_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Пары вопрос-ответ, предложенные LLM по источнику (по умолчанию - ожидающие проверки)."""
+    check_hr_permission(current_user)
+    source, workspace_id, organization_id = await get_faq_source(db, source_id, current_user)
+    return await ai_client.list_faq(workspace_id, source_id=source.id, status=status, organization_id=organization_id)
+
+@router.post("/faq/review")
+async def review_faq(
+    payload: FaqReviewRequest,
+    db: AsyncSession = Depends(get_db_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Одобрение (с правкой) или отклонение синтезированных пар."""
+    check_hr_permission(current_user)
+    _, workspace_id, organization_id = await get_faq_source(db, payload.source_id, current_user)
+    return await ai_client.review_faq(
+        workspace_id, [item.model_dump() for item in payload.items], organization_id=organization_id
+    )
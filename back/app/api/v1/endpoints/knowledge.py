@@ -14,7 +14,7 @@ from sqlalchemy import desc
 
 from app.core.database import get_db_session
 from app.api.v1.dependencies import get_current_user
-from app.services.ai_client import ai_client
+from app.services.vector_sync import schedule_index_source, delete_source_embeddings
 from app import models, schemas
 from app.core.config import settings
 
@@ -80,8 +80,8 @@ async def upload_file(
         await db.commit()
         await db.refresh(db_source)
         
-        # TODO: Запустить фоновую задачу для индексации в ChromaDB через ai_client
-        # asyncio.create_task(ai_client.process_file(db_source.id, ...))
+        # Новый файл еще не привязан к трекам - индексируем его в базу знаний организации
+        schedule_index_source(db_source.id)
         
         return db_source
 
@@ -122,6 +122,8 @@ async def delete_file(
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
 
+    await delete_source_embeddings(db, db_file.id)
+
     # Удаляем с диска
     if db_file.file_path and os.path.exists(db_file.file_path):
         try:
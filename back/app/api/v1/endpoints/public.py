@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Response # <- ИСПРАВЛЕНИЕ
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Response, Request # <- ИСПРАВЛЕНИЕ
 # from starlette.responses import JavaScriptResponse # <- УДАЛЕНО
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
@@ -7,6 +8,8 @@ from app.core.database import get_db_session
 from app.api.v1.endpoints.query import public_query  # Импортируем логику public_query
 from app import schemas
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -40,6 +43,7 @@ async def get_widget_js():
     tags=["5. RAG Query (Public Widget)"]
 )
 async def public_query_audio(
+        request: Request,
         file: UploadFile = File(...),
         workspace_id: UUID = Form(...),
         session_id: UUID = Form(...),
@@ -50,12 +54,12 @@ async def public_query_audio(
     """
 
     # 1. (STUB) Сохраняем аудиофайл
-    print(f"Received audio file {file.filename} for workspace {workspace_id}")
+    logger.info(f"Received audio file {file.filename} for workspace {workspace_id}")
 
     # 2. (STUB) Логика Speech-to-Text (e.g., Whisper.cpp на сервере)
     # (Имитируем распознавание)
     transcribed_question = "Сколько дней длится отпуск? (из аудио)"
-    print(f"STUB: Transcribed question: '{transcribed_question}'")
+    logger.debug("STUB: transcribed question: %s", transcribed_question)
 
     # 3. Создаем PublicQueryRequest
     query_in = schemas.PublicQueryRequest(
@@ -65,12 +69,14 @@ async def public_query_audio(
     )
 
     # 4. Вызываем ту же логику, что и в /public/query
-    query_response = await public_query(query_in=query_in, db=db)
+    query_response = await public_query(query_in=query_in, db=db, request=request)
 
     # 5. Возвращаем расширенный ответ
     return schemas.AudioQueryResponse(
         transcribed_question=transcribed_question,
         answer=query_response.answer,
         sources=query_response.sources,
-        ticket_id=query_response.ticket_id
+        ticket_id=query_response.ticket_id,
+        emotion=query_response.emotion,
+        retry_after=query_response.retry_after
     )
\ No newline at end of file
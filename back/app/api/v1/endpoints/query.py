@@ -1,17 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from uuid import UUID
 # --- ВАЖНО: Этот импорт необходим для работы Optional[UUID] ---
-from typing import Optional 
+from typing import Optional, List, Dict
 
 from app.core.database import get_db_session
 from app.api.v1.dependencies import get_current_user
-from app.services.ai_client import ai_client
+from app.services.ai_client import ai_client, AIServiceBusy
+from app.services.vector_sync import scope_source_ids
+from app.services.cancellation import CLIENT_CLOSED_REQUEST, cancel_on_disconnect
+from app.services.rate_limit import enforce_user_limit, enforce_public_limit
 from app import schemas, models
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Сколько последних ходов передавать в back-ai (нужны ему только после перезапуска/выгрузки сессии)
+HISTORY_TURNS = 6
+BUSY_ANSWER = "Сейчас очень много вопросов. Пожалуйста, повторите через {seconds} сек."
+
 async def get_or_create_session(db: AsyncSession, user_id: Optional[UUID], session_id: UUID) -> models.ChatSession:
     """Находит или создает сессию чата."""
     result = await db.execute(
@@ -28,6 +38,47 @@ async def get_or_create_session(db: AsyncSession, user_id: Optional[UUID], sessi
         await db.refresh(session)
     return session
 
+def track_instructions(track: Optional[models.OnboardingTrack]) -> Optional[str]:
+    """Постоянная для трека часть промпта (не меняется между вопросами - кэшируется в Ollama)."""
+    if not track:
+        return None
+    lines = [f"Сотрудник проходит трек адаптации «{track.name}»."]
+    if track.description:
+        lines.append(track.description)
+    return "\n".join(lines)
+
+def organization_scope(organization_id: Optional[UUID]) -> List[UUID]:
+    """
+    Общие документы организации (источники без привязки к трекам) индексируются в базу знаний
+    с id организации (см. services/vector_sync.py) - ищем по ней вместе с треком.
+    """
+    return [organization_id] if organization_id else []
+
+async def track_scope(db: AsyncSession, track_id: UUID, stage_id: Optional[UUID], task_id: Optional[UUID]) -> List[UUID]:
+    """Источники этапа/задачи трека для ограничения поиска (пустой список - весь трек)."""
+    if task_id:
+        task = await db.get(models.Task, task_id)
+        stage = await db.get(models.Stage, task.stage_id) if task else None
+        if not stage or stage.track_id != track_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found in this track")
+    elif stage_id:
+        stage = await db.get(models.Stage, stage_id)
+        if not stage or stage.track_id != track_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stage not found in this track")
+    else:
+        return []
+    return await scope_source_ids(db, stage_id=stage_id, task_id=task_id)
+
+async def recent_history(db: AsyncSession, session_id: UUID) -> List[Dict[str, str]]:
+    """Последние ходы сессии в хронологическом порядке."""
+    result = await db.execute(
+        select(models.ChatMessage)
+        .where(models.ChatMessage.session_id == session_id)
+        .order_by(models.ChatMessage.created_at.desc())
+        .limit(HISTORY_TURNS)
+    )
+    return [{"question": m.question, "answer": m.answer} for m in reversed(result.scalars().all())]
+
 @router.post(
     "/workspaces/{track_id}/query",
     response_model=schemas.QueryResponse,
@@ -36,19 +87,31 @@ async def get_or_create_session(db: AsyncSession, user_id: Optional[UUID], sessi
 async def query_track(
         track_id: UUID,
         query_in: schemas.QueryRequest,
+        request: Request,
         db: AsyncSession = Depends(get_db_session),
         current_user: models.User = Depends(get_current_user)
 ):
+    await enforce_user_limit(current_user)
+
     # 1. Сессия
     session = await get_or_create_session(db, current_user.id, query_in.session_id)
 
     # 2. RAG запрос (ищем в коллекции track_id)
+    track = await db.get(models.OnboardingTrack, track_id)
+    organization_id = track.organization_id if track else current_user.organization_id
+    source_ids = await track_scope(db, track_id, query_in.stage_id, query_in.task_id)
     try:
-        answer, sources = await ai_client.answer_query(
+        # Пользователь закрыл чат - отменяем и вызов back-ai, и генерацию за ним
+        answer, sources, emotion = await cancel_on_disconnect(request, ai_client.answer_query(
             workspace_id=track_id, # Используем track_id как имя коллекции
             question=query_in.question,
-            session_id=query_in.session_id
-        )
+            session_id=query_in.session_id,
+            organization_id=organization_id,
+            history=await recent_history(db, session.id),
+            instructions=track_instructions(track),
+            extra_workspace_ids=organization_scope(organization_id),
+            source_ids=source_ids
+        ), "query")
     except HTTPException as e:
         raise e
 
@@ -64,31 +127,58 @@ async def query_track(
 
     return schemas.QueryResponse(
         answer=answer,
-        sources=sources
+        sources=sources,
+        emotion=emotion
     )
 
 # --- Функция для публичного API (public.py) ---
 async def public_query(
     query_in: schemas.PublicQueryRequest,
-    db: AsyncSession
+    db: AsyncSession,
+    request: Optional[Request] = None
 ) -> schemas.QueryResponse:
     """
     Логика для публичного запроса (используется в endpoints/public.py).
+    request - для отмены вызова AI-сервиса, если клиент отключился, и лимита по адресу клиента.
     """
+    await enforce_public_limit(query_in.session_id, request)
+
     # 1. Сессия (без пользователя, user_id=None)
     session = await get_or_create_session(db, None, query_in.session_id)
 
     # 2. RAG запрос
+    track = await db.get(models.OnboardingTrack, query_in.workspace_id)
     try:
-        answer, sources = await ai_client.answer_query(
+        call = ai_client.answer_query(
             workspace_id=query_in.workspace_id,
             question=query_in.question,
-            session_id=query_in.session_id
+            session_id=query_in.session_id,
+            organization_id=track.organization_id if track else None,
+            history=await recent_history(db, session.id),
+            instructions=track_instructions(track),
+            extra_workspace_ids=organization_scope(track.organization_id if track else None)
         )
+        answer, sources, emotion = await (cancel_on_disconnect(request, call, "public_query") if request else call)
+    except AIServiceBusy as e:
+        # Перегрузка: вежливо просим повторить и не пишем ход в историю диалога
+        return schemas.QueryResponse(
+            answer=BUSY_ANSWER.format(seconds=e.retry_after),
+            sources=[],
+            emotion="thinking",
+            retry_after=e.retry_after
+        )
+    except HTTPException as e:
+        if e.status_code == CLIENT_CLOSED_REQUEST:
+            raise
+        logger.error(f"Public query error: {e}")
+        answer = "Извините, сервис временно недоступен."
+        sources = []
+        emotion = "neutral"
     except Exception as e:
-        print(f"Public Query Error: {e}")
+        logger.error(f"Public query error: {e}")
         answer = "Извините, сервис временно недоступен."
         sources = []
+        emotion = "neutral"
 
     # 3. Сохраняем сообщение
     db_message = models.ChatMessage(
@@ -103,5 +193,6 @@ async def public_query(
     return schemas.QueryResponse(
         answer=answer,
         sources=sources,
-        ticket_id=None
+        ticket_id=None,
+        emotion=emotion
     )
\ No newline at end of file
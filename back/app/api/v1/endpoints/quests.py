@@ -1,3 +1,4 @@
+import logging
 from typing import List
 from uuid import UUID
 from datetime import datetime
@@ -9,8 +10,12 @@ from sqlalchemy.orm import selectinload
 
 from app.core.database import get_db_session
 from app.api.v1.dependencies import get_current_user
+from app.services.ai_client import ai_client
+from app.services.vector_sync import track_source_ids, source_scopes, sync_source_membership
 from app import schemas, models
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # --- Helpers ---
@@ -18,6 +23,15 @@ def check_staff_permission(user: models.User):
     if user.role not in [models.UserRoleEnum.HR, models.UserRoleEnum.MENTOR, models.UserRoleEnum.ADMIN]:
         raise HTTPException(status_code=403, detail="Not authorized")
 
+def requested_file_ids(track_in: schemas.TrackCreate) -> set:
+    """Все файлы трека, его этапов и задач из запроса."""
+    file_ids = set(track_in.file_ids)
+    for stage_in in track_in.stages:
+        file_ids.update(stage_in.file_ids)
+        for task_in in stage_in.tasks:
+            file_ids.update(task_in.file_ids)
+    return file_ids
+
 # Helper for full track loading
 async def get_full_track(db: AsyncSession, track_id: UUID):
     query = (
@@ -63,6 +77,8 @@ async def create_track(
     user: models.User = Depends(get_current_user)
 ):
     check_staff_permission(user)
+    # Базы знаний файлов до привязки: раскладка "workspace" копирует чанки в базу нового трека
+    previous_scopes = await source_scopes(db, requested_file_ids(track_in))
 
     track_files = []
     if track_in.file_ids:
@@ -115,6 +131,7 @@ async def create_track(
             await db.flush()
 
     await db.commit()
+    await sync_source_membership(db, await track_source_ids(db, db_track.id), previous_scopes)
     return await get_full_track(db, db_track.id)
 
 @router.put("/tracks/{track_id}", response_model=schemas.TrackPublic)
@@ -133,6 +150,10 @@ async def update_track(
     if not db_track or db_track.organization_id != user.organization_id:
         raise HTTPException(status_code=404, detail="Track not found")
 
+    # Источники до изменений: у отвязанных тоже нужно снять принадлежность в векторном хранилище
+    old_source_ids = await track_source_ids(db, track_id)
+    previous_scopes = await source_scopes(db, old_source_ids | requested_file_ids(track_in))
+
     db_track.name = track_in.name
     db_track.description = track_in.description
     
@@ -188,6 +209,7 @@ async def update_track(
             await db.flush()
 
     await db.commit()
+    await sync_source_membership(db, old_source_ids | await track_source_ids(db, track_id), previous_scopes)
     return await get_full_track(db, track_id)
 
 @router.delete("/tracks/{track_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -200,10 +222,70 @@ async def delete_track(
     track = await db.get(models.OnboardingTrack, track_id)
     if not track or track.organization_id != user.organization_id:
         raise HTTPException(status_code=404, detail="Track not found")
+    previous_scopes = await source_scopes(db, await track_source_ids(db, track_id))
     await db.delete(track)
     await db.commit()
+    await sync_source_membership(db, previous_scopes, previous_scopes)
     return None
 
+@router.post("/tracks/{track_id}/clone", response_model=schemas.TrackPublic, status_code=status.HTTP_201_CREATED)
+async def clone_track(
+    track_id: UUID,
+    db: AsyncSession = Depends(get_db_session),
+    user: models.User = Depends(get_current_user)
+):
+    """Копия трека с этапами, задачами и файлами; база знаний копируется без повторного эмбеддинга."""
+    check_staff_permission(user)
+    source = await db.get(models.OnboardingTrack, track_id)
+    if not source or source.organization_id != user.organization_id:
+        raise HTTPException(status_code=404, detail="Track not found")
+    source = await get_full_track(db, track_id)
+    previous_scopes = await source_scopes(db, await track_source_ids(db, track_id))
+
+    db_track = models.OnboardingTrack(
+        name=f"{source.name} (копия)",
+        description=source.description,
+        organization_id=source.organization_id,
+        files=list(source.files)
+    )
+    db.add(db_track)
+    await db.flush()
+
+    for stage in source.stages:
+        db_stage = models.Stage(
+            track_id=db_track.id,
+            title=stage.title,
+            description=stage.description,
+            order=stage.order,
+            reward_xp=stage.reward_xp,
+            files=list(stage.files)
+        )
+        db.add(db_stage)
+        await db.flush()
+
+        for task in stage.tasks:
+            db.add(models.Task(
+                stage_id=db_stage.id,
+                title=task.title,
+                description=task.description,
+                type=task.type,
+                order=task.order,
+                reward_xp=task.reward_xp,
+                knowledge_source_id=task.knowledge_source_id,
+                quiz_id=task.quiz_id,
+                files=list(task.files)
+            ))
+        await db.flush()
+
+    await db.commit()
+    try:
+        await ai_client.clone_workspace(track_id, db_track.id, organization_id=db_track.organization_id)
+    except Exception as e:
+        logger.error(f"Failed to clone knowledge base of {track_id}: {e}")
+    # База знаний нового трека уже скопирована целиком - прежние базы источников не меняются
+    await sync_source_membership(db, await track_source_ids(db, db_track.id), previous_scopes)
+    return await get_full_track(db, db_track.id)
+
 @router.get("/my-track", response_model=schemas.TrackPublic)
 async def get_my_track(
     db: AsyncSession = Depends(get_db_session),
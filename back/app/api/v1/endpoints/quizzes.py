@@ -1,17 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from typing import List, Any
+from typing import List, Any, Optional
 from uuid import UUID
 import json
+import logging
 from datetime import datetime
 
 from app.core.database import get_db_session
 from app.api.v1.dependencies import get_current_user, get_current_hr
 from app.services.ai_client import ai_client
+from app.services import quiz_jobs
+from app.services.cancellation import cancel_on_disconnect
 from app import schemas, models
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @router.post("/", response_model=schemas.QuizPublic, status_code=status.HTTP_201_CREATED)
@@ -115,43 +120,72 @@ class GenerateQuizRequest(schemas.BaseModel):
 @router.post("/generate", response_model=schemas.QuizPublic)
 async def generate_quiz_from_source(
     req: GenerateQuizRequest,
+    request: Request,
     db: AsyncSession = Depends(get_db_session),
     hr_user: models.User = Depends(get_current_hr)
 ):
     source = await db.get(models.KnowledgeSource, req.source_id)
     if not source: raise HTTPException(404, "Source not found")
     
-    text_content = ""
-    if source.type == models.KnowledgeSourceTypeEnum.QNA:
-        text_content = f"Вопрос: {source.content['question']}\nОтвет: {source.content['answer']}"
-    elif source.type == models.KnowledgeSourceTypeEnum.ARTICLE:
-        text_content = source.content.get("content", "")
-    elif source.type == models.KnowledgeSourceTypeEnum.FILE:
-        raise HTTPException(400, "Generation from FILE not supported in MVP (use Articles)")
+    text_content, file_path = quiz_jobs.source_quiz_input(source)
+    if source.type == models.KnowledgeSourceTypeEnum.FILE and not file_path:
+        raise HTTPException(400, "File source has no stored file")
 
-    if len(text_content) < 50: raise HTTPException(400, "Source content too short")
+    if not file_path and len(text_content) < 50: raise HTTPException(400, "Source content too short")
 
     # --- ВЫЗОВ НОВОГО МЕТОДА V2 ---
-    # Также добавили отладочный принт
-    print(f"DEBUG: Calling ai_client.generate_quiz_v2 for source {req.source_id}")
-    ai_questions = await ai_client.generate_quiz_v2(text_content)
+    logger.debug("Calling ai_client.generate_quiz_v2 for source %s", req.source_id)
+    ai_questions = await cancel_on_disconnect(
+        request, ai_client.generate_quiz_v2(text_content, file_path=file_path, filename=source.name), "quiz"
+    )
     
     if not ai_questions: raise HTTPException(500, "AI failed to generate questions (empty result)")
 
-    db_quiz = models.Quiz(title=req.title, description=f"Сгенерировано по источнику {source.name}", pass_threshold=0.7)
-    db.add(db_quiz)
-    await db.flush()
-
-    for i, q_data in enumerate(ai_questions):
-        options_with_ids = []
-        for idx, opt in enumerate(q_data['options']):
-            options_with_ids.append({"id": idx + 1, "text": opt['text'], "is_correct": opt['is_correct']})
-        db_q = models.QuizQuestion(quiz_id=db_quiz.id, text=q_data['question_text'], order=i + 1, options=options_with_ids)
-        db.add(db_q)
+    db_quiz = await quiz_jobs.create_generated_quiz(db, req.title, source.name, ai_questions)
 
     await db.commit()
     await db.refresh(db_quiz)
     
     query = select(models.Quiz).where(models.Quiz.id == db_quiz.id).options(selectinload(models.Quiz.questions))
     result = await db.execute(query)
-    return result.scalar_one()
\ No newline at end of file
+    return result.scalar_one()
+
+# --- МАССОВАЯ ГЕНЕРАЦИЯ ПО ТРЕКУ ---
+
+@router.post("/generate-track/{track_id}", response_model=schemas.QuizJobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def generate_track_quizzes(
+    track_id: UUID,
+    req: Optional[schemas.TrackQuizGenerateRequest] = None,
+    db: AsyncSession = Depends(get_db_session),
+    hr_user: models.User = Depends(get_current_hr)
+):
+    """
+    Запускает фоновую генерацию тестов для QUIZ-задач трека по ARTICLE/FILE источникам
+    задачи, ее этапа или трека. Статус: GET /quizzes/jobs/{job_id}.
+    """
+    query = (
+        select(models.OnboardingTrack)
+        .where(models.OnboardingTrack.id == track_id)
+        .options(
+            selectinload(models.OnboardingTrack.files),
+            selectinload(models.OnboardingTrack.stages).options(
+                selectinload(models.Stage.files),
+                selectinload(models.Stage.tasks).selectinload(models.Task.files)
+            )
+        )
+    )
+    track = (await db.execute(query)).scalar_one_or_none()
+    if not track or track.organization_id != hr_user.organization_id:
+        raise HTTPException(404, "Track not found")
+
+    return await quiz_jobs.start_track_quiz_job(db, track, overwrite=bool(req and req.overwrite))
+
+@router.get("/jobs/{job_id}", response_model=schemas.QuizJobStatus)
+async def get_quiz_job(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_db_session),
+    hr_user: models.User = Depends(get_current_hr)
+):
+    job = await quiz_jobs.get_job(db, job_id, hr_user.organization_id)
+    if not job: raise HTTPException(404, "Job not found")
+    return job
@@ -27,6 +27,40 @@ class Settings(BaseSettings):
     # Настройки клиента AI-сервиса
     AI_SERVICE_URL: AnyHttpUrl
     API_V1_STR_AI: str
+    # Сколько источников трека одновременно отправляется на генерацию тестов
+    AI_QUIZ_CONCURRENCY: int = 2
+    # Дедлайны вызовов AI-сервиса по типам операций (вместо общих 300 секунд)
+    AI_DEFAULT_TIMEOUT_SECONDS: float = 30
+    AI_QUERY_TIMEOUT_SECONDS: float = 150 # ответ в чате: эмбеддинг + поиск + генерация
+    AI_GENERATION_TIMEOUT_SECONDS: float = 300 # генерация тестов, индексация файлов
+    # Повторы при отказе AI-сервиса по перегрузке (503 + Retry-After)
+    AI_BUSY_RETRIES: int = 2
+    AI_BUSY_MAX_DELAY_SECONDS: float = 10
+
+    # Логи (app.core.log): JSON в stdout через очередь; DEBUG пишется для доли запросов
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json" # "json" | "text"
+    LOG_DEBUG_SAMPLE_RATE: float = 0.05
+    LOG_QUEUE_SIZE: int = 10000 # записей; при переполнении новые отбрасываются
+
+    # Трассировка (app.services.tracing): сохраняются только трассы дольше порога (и с ошибкой)
+    TRACE_ENABLED: bool = True
+    TRACE_SLOW_THRESHOLD_MS: float = 2000
+    TRACE_KEEP_ERRORS: bool = True
+    TRACE_EXPORTER: str = "file" # "file" | "otlp"
+    TRACE_FILE_PATH: str = "/app/traces/back.jsonl"
+    TRACE_OTLP_ENDPOINT: str = "http://otel-collector:4318/v1/traces"
+    TRACE_DB_STATEMENT_CHARS: int = 300 # SQL в атрибуте span (без параметров)
+
+    # Лимиты запросов к RAG (token bucket, запросов в минуту)
+    RATE_LIMIT_ENABLED: bool = True
+    # По ролям пользователей; задается в .env как JSON строка
+    RATE_LIMIT_ROLES_JSON: str = '{"admin": 120, "hr": 60, "mentor": 60, "employee": 30, "unconfirmed": 10}'
+    RATE_LIMIT_PUBLIC_SESSION_PER_MINUTE: int = 10 # виджет: одна сессия чата
+    RATE_LIMIT_PUBLIC_IP_PER_MINUTE: int = 30 # виджет: все сессии с одного адреса
+    RATE_LIMIT_BURST_FRACTION: float = 0.5 # емкость ведра - доля минутного лимита
+    # Брать адрес клиента из X-Forwarded-For (только за своим reverse proxy, иначе заголовок подделывается)
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False
 
     # --- АДМИНИСТРАТОРЫ (HARDCODED) ---
     # Список словарей: [{"email": "...", "password": "...", "full_name": "..."}]
@@ -41,6 +75,14 @@ class Settings(BaseSettings):
         except json.JSONDecodeError:
             return []
 
+    @property
+    def RATE_LIMIT_ROLES(self) -> Dict[str, int]:
+        """Парсит JSON строку лимитов по ролям"""
+        try:
+            return json.loads(self.RATE_LIMIT_ROLES_JSON)
+        except json.JSONDecodeError:
+            return {}
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from app.core.config import settings
+from app.services.tracing import instrument_engine
 
 # Создаем асинхронный "движок" для SQLAlchemy
 # Он будет управлять подключениями к БД
@@ -9,6 +10,8 @@ engine = create_async_engine(
     pool_pre_ping=True, # Проверять подключение перед каждым запросом
     echo=False # Включите (True) для отладки SQL-запросов
 )
+# Span трассировки на каждый SQL-запрос (app.services.tracing)
+instrument_engine(engine)
 
 # Создаем "фабрику" асинхронных сессий
 # Каждая сессия - это отдельный разговор с БД
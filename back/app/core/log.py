@@ -0,0 +1,136 @@
+"""
+Структурированные логи: одна JSON-строка на запись, stdout пишется не из event loop.
+
+Записи кладутся в очередь (QueueHandler), в stdout их выводит отдельный поток (QueueListener);
+при переполнении очереди запись отбрасывается, а не блокирует запрос. К записи добавляются
+request_id (заголовок X-Request-ID или новый; AIClient передает его в back-ai) и trace_id
+(app.services.tracing); поля из extra={...} выводятся отдельными ключами.
+
+DEBUG-записи (сырые ответы LLM и другие объемные payload-ы) сэмплируются по запросам: пишется
+доля LOG_DEBUG_SAMPLE_RATE запросов, и для попавшего в выборку запроса - все его DEBUG-записи.
+"""
+import contextvars
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core.config import settings
+from app.services import tracing
+
+SERVICE_NAME = "back"
+REQUEST_ID_HEADER = "X-Request-ID"
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+_VALID_REQUEST_ID = re.compile(r"^[\w.-]{1,64}$")
+# Атрибуты LogRecord, которые не выводятся как пользовательские поля
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "trace_id"}
+_exception_formatter = logging.Formatter()
+
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+
+def request_id_from_header(value: Optional[str]) -> str:
+    """Id из заголовка, если он похож на id (заголовок приходит от клиента), иначе новый."""
+    if value and _VALID_REQUEST_ID.match(value):
+        return value
+    return uuid.uuid4().hex
+
+
+class ContextFilter(logging.Filter):
+    """Выполняется в потоке вызывающего кода: снимает контекст запроса и сэмплирует DEBUG."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        record.trace_id = tracing.current_trace_id()
+        if record.levelno <= logging.DEBUG and settings.LOG_DEBUG_SAMPLE_RATE < 1:
+            # Решение по хэшу request_id: запрос либо логируется подробно целиком, либо нет
+            key = record.request_id
+            point = zlib.crc32(key.encode()) / 2 ** 32 if key else random.random()
+            return point < settings.LOG_DEBUG_SAMPLE_RATE
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и traceback собираются сразу (аргументы могут измениться), JSON - в потоке записи
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": SERVICE_NAME,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "trace_id"):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listener: Optional[QueueListener] = None
+log_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def setup_logging():
+    """Переводит корневой логгер (и логгеры uvicorn) на очередь; вызывается до импорта сервисов."""
+    global _listener, log_handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    log_handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    log_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [log_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    # uvicorn настраивает свои логгеры до импорта приложения - направляем их в общую очередь
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers = []
+        logger.propagate = True
+
+    _listener = QueueListener(log_handler.queue, output)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Дописывает очередь в stdout (при остановке приложения)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,15 +1,24 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from alembic.config import Config
 from alembic import command
 import os
+import logging
 from contextlib import asynccontextmanager # <- ИСПРАВЛЕНИЕ
 import asyncio
 
-from app.api.v1.api import api_router
 from app.core.config import settings
+from app.core.log import REQUEST_ID_HEADER, request_id, request_id_from_header, setup_logging, shutdown_logging
+
+# Логи настраиваются до импорта остальных модулей: они пишут в лог уже при инициализации
+setup_logging()
+
+from app.api.v1.api import api_router
 from app.core.database import engine, Base  # Импортируем Base
+from app.services import tracing
+
+logger = logging.getLogger(__name__)
 
 
 # --- Alembic (Миграции) ---
@@ -22,25 +31,25 @@ def run_migrations():
     alembic_cfg_path = os.path.join(os.path.dirname(__file__), "..", "alembic.ini")
 
     if not os.path.exists(alembic_cfg_path):
-        print("alembic.ini not found, skipping migrations.")
+        logger.info("alembic.ini not found, skipping migrations.")
         # (STUB) Создаем таблицы напрямую для простоты
         # В реальном проекте у вас будет alembic.ini
-        print("Running SQLAlchemy create_all() as fallback...")
+        logger.info("Running SQLAlchemy create_all() as fallback...")
         
         # --- ИСПРАВЛЕНИЕ: Переносим логику в lifespan ---
         # Убираем старый asyncio.run() отсюда
         
-        print("Tables will be created by lifespan event.")
+        logger.info("Tables will be created by lifespan event.")
         return
 
-    print(f"Running Alembic migrations from {alembic_cfg_path}...")
+    logger.info(f"Running Alembic migrations from {alembic_cfg_path}...")
     alembic_cfg = Config(alembic_cfg_path)
     alembic_cfg.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
     try:
         command.upgrade(alembic_cfg, "head")
-        print("Migrations applied successfully.")
+        logger.info("Migrations applied successfully.")
     except Exception as e:
-        print(f"Failed to apply migrations: {e}")
+        logger.error(f"Failed to apply migrations: {e}")
 
 
 # Запускаем миграции при импорте (до старта FastAPI)
@@ -51,15 +60,15 @@ def run_migrations():
 
 async def init_db():
     """Создает таблицы в БД"""
-    print("Running SQLAlchemy create_all()...")
+    logger.info("Running SQLAlchemy create_all()...")
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    print("Database tables created/checked.")
+    logger.info("Database tables created/checked.")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Код для выполнения при старте
-    print("Application startup: Running init_db()...")
+    logger.info("Application startup: Running init_db()...")
     # Вызываем run_migrations() здесь, чтобы он решил, что делать
     run_migrations() 
     # init_db() будет вызван, только если alembic.ini не найден (через run_migrations)
@@ -68,7 +77,8 @@ async def lifespan(app: FastAPI):
         await init_db()
     yield
     # Код для выполнения при завершении
-    print("Application shutdown.")
+    logger.info("Application shutdown.")
+    shutdown_logging()
 
 # --- Конец Исправления ---
 
@@ -89,6 +99,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Корневой span запроса (app.services.tracing): его продолжают SQL-запросы и вызовы back-ai.
+    Id трассы возвращается в X-Trace-Id - по нему медленный ответ находится в экспорте.
+    """
+    with tracing.span(f"{request.method} {request.url.path}", kind="server",
+                      traceparent=request.headers.get("traceparent"), request_id=request_id.get()) as span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            span.rename(f"{request.method} {route.path}")
+        span.set_attribute("status_code", response.status_code)
+        if response.status_code >= 500:
+            span.set_error(f"HTTP {response.status_code}")
+        trace_id = tracing.current_trace_id()
+        if trace_id:
+            response.headers["X-Trace-Id"] = trace_id
+        return response
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """X-Request-ID клиента (или новый) - в записях лога запроса (app.core.log), в вызовах back-ai и в ответе."""
+    rid = request_id_from_header(request.headers.get(REQUEST_ID_HEADER))
+    request_id.set(rid)
+    response = await call_next(request)
+    response.headers[REQUEST_ID_HEADER] = rid
+    return response
+
 # Подключение роутера API v1
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
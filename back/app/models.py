@@ -216,6 +216,20 @@ class QuizQuestion(Base):
     options = Column(JSON, nullable=False)
     quiz = relationship("Quiz", back_populates="questions")
 
+class QuizJob(Base):
+    """Фоновая генерация тестов по треку (services/quiz_jobs.py); items обновляются по мере готовности."""
+    __tablename__ = "quiz_jobs"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    track_id = Column(UUID(as_uuid=True), ForeignKey("onboarding_tracks.id", ondelete="CASCADE"), nullable=False)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=False)
+    status = Column(String(50), nullable=False, default="pending") # pending, running, completed, failed
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    items = Column(JSON, nullable=False, default=list) # schemas.QuizJobItem по каждому источнику
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
 class UserQuizAttempt(Base):
     __tablename__ = "user_quiz_attempts"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -293,4 +307,13 @@ class Tool(Base):
     api_endpoint = Column(String(1024), nullable=False)
     api_method = Column(Enum(ToolApiMethodEnum), nullable=False)
     parameters_schema = Column(JSON, nullable=True)
-    track = relationship("OnboardingTrack", back_populates="tools")
\ No newline at end of file
+    track = relationship("OnboardingTrack", back_populates="tools")
+
+
+# --- Лимиты запросов ---
+class RateLimitBucket(Base):
+    """Token bucket лимита запросов к RAG; общий для всех воркеров back (см. services/rate_limit.py)."""
+    __tablename__ = "rate_limit_buckets"
+    key = Column(String(255), primary_key=True) # "user:<id>", "session:<id>", "ip:<адрес>"
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
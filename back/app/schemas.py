@@ -236,6 +236,31 @@ class QuizAttemptResult(BaseModel):
     xp_earned: int
     message: str
 
+class TrackQuizGenerateRequest(BaseModel):
+    overwrite: bool = False # Перезаписывать тесты у задач, где они уже есть
+
+class QuizJobItem(BaseModel):
+    source_id: UUID
+    source_name: str
+    status: str = "pending" # pending, completed, failed
+    quiz_id: Optional[UUID] = None
+    task_ids: List[UUID] = []
+    error: Optional[str] = None
+
+class QuizJobStatus(BaseModel):
+    id: UUID
+    track_id: UUID
+    organization_id: UUID
+    status: str = "pending" # pending, running, completed, failed
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    items: List[QuizJobItem] = []
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
 # --- 5. Mentor Actions ---
 class TaskReviewRequest(BaseModel):
     comment: Optional[str] = None
@@ -263,6 +288,9 @@ class TicketResolvedResponse(BaseModel):
 class QueryRequest(BaseModel):
     question: str
     session_id: UUID
+    # Вопрос по текущему шагу: поиск только по файлам этапа/задачи
+    stage_id: Optional[UUID] = None
+    task_id: Optional[UUID] = None
 
 class QueryResponseSource(BaseModel):
     name: str
@@ -273,6 +301,8 @@ class QueryResponse(BaseModel):
     answer: str
     sources: List[QueryResponseSource]
     ticket_id: Optional[UUID] = None
+    emotion: str = "neutral" # эмоция аватара: neutral | happy | thinking
+    retry_after: Optional[int] = None # виджет: сервис перегружен, повторить вопрос через N секунд
 
 class PublicQueryRequest(BaseModel):
     workspace_id: UUID
@@ -336,6 +366,8 @@ class AudioQueryResponse(BaseModel):
     answer: str
     sources: List[QueryResponseSource] = []
     ticket_id: Optional[UUID] = None
+    emotion: str = "neutral"
+    retry_after: Optional[int] = None
 
 class ToolCreate(BaseModel):
     name: str
@@ -3,52 +3,187 @@ from fastapi import HTTPException, status
 from uuid import UUID
 from typing import List, Tuple, Optional, Dict, Any
 import asyncio
-import json
+import logging
+import random
+import time
 
 from app.core.config import settings
-from app.core.database import AsyncSessionFactory
-from app import schemas, models
+from app.core.log import REQUEST_ID_HEADER, request_id
+from app import schemas
+from app.services import tracing
+
+logger = logging.getLogger(__name__)
+
+class AIServiceBusy(HTTPException):
+    """back-ai отклонил запрос из-за перегрузки (503 с Retry-After) и повторы не помогли."""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI service is busy, please retry later",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+def _retry_after(response: httpx.Response) -> int:
+    try:
+        return max(1, int(response.headers.get("Retry-After", "1")))
+    except ValueError:
+        return 1
+
 
 class AIClient:
     def __init__(self, base_url: str):
         self.base_url = base_url
-        self.client = httpx.AsyncClient(base_url=str(base_url), timeout=300.0)
-        print(f"[AI Client] Initialized for {self.base_url}")
+        self.client = httpx.AsyncClient(base_url=str(base_url), timeout=settings.AI_DEFAULT_TIMEOUT_SECONDS)
+        logger.info(f"AI client initialized for {self.base_url}")
 
-    async def _post(self, endpoint: str, json_data: dict) -> dict:
-        try:
-            response = await self.client.post(endpoint, json=json_data, timeout=300.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"[AI Client] Error POST {endpoint}: {e}")
-            raise HTTPException(status_code=503, detail=f"AI Service unavailable: {e}")
+    async def _post(self, endpoint: str, json_data: dict, timeout: Optional[float] = None) -> dict:
+        """
+        timeout - дедлайн операции (по умолчанию AI_DEFAULT_TIMEOUT_SECONDS), общий для всех попыток.
+        Отказ по перегрузке (503 + Retry-After) повторяется с backoff и джиттером, пока укладываемся в дедлайн.
+        """
+        with tracing.span(f"POST {endpoint}", kind="client", peer_service="back-ai") as span:
+            return await self._post_with_retries(endpoint, json_data, timeout, span)
 
-    async def process_file(self, workspace_id: UUID, source_id: UUID, file_path: str, filename: str):
+    async def _post_with_retries(self, endpoint: str, json_data: dict, timeout: Optional[float], span) -> dict:
+        deadline = time.monotonic() + (timeout or settings.AI_DEFAULT_TIMEOUT_SECONDS)
+        attempt = 0
+        # back-ai продолжает трассу запроса (его span-ы - дочерние к этому вызову) и пишет в лог тот же request_id
+        headers = {}
+        traceparent = tracing.current_traceparent()
+        if traceparent:
+            headers["traceparent"] = traceparent
+        if request_id.get():
+            headers[REQUEST_ID_HEADER] = request_id.get()
+        while True:
+            try:
+                response = await self.client.post(
+                    endpoint, json=json_data, headers=headers, timeout=max(deadline - time.monotonic(), 1.0)
+                )
+                span.set_attribute("status_code", response.status_code)
+                if response.status_code == 503 and "Retry-After" in response.headers:
+                    retry_after = _retry_after(response)
+                    # Джиттер разводит повторы клиентов, отклоненных одновременно
+                    delay = min(retry_after * 2 ** attempt, settings.AI_BUSY_MAX_DELAY_SECONDS) * random.uniform(1.0, 1.5)
+                    if attempt >= settings.AI_BUSY_RETRIES or time.monotonic() + delay >= deadline:
+                        raise AIServiceBusy(retry_after)
+                    logger.warning(f"{endpoint} busy, retry in {delay:.1f}s")
+                    attempt += 1
+                    span.set_attribute("busy_retries", attempt)
+                    await asyncio.sleep(delay)
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except AIServiceBusy:
+                raise
+            except Exception as e:
+                logger.error(f"Error POST {endpoint}: {e}")
+                raise HTTPException(status_code=503, detail=f"AI Service unavailable: {e}")
+
+    async def process_file(self, workspace_id: UUID, source_id: UUID, file_path: str, filename: str, organization_id: Optional[UUID] = None):
         payload = {"workspace_id": str(workspace_id), "source_id": str(source_id), "file_path": file_path, "filename": filename}
-        await self._post(f"{settings.API_V1_STR_AI}/process-file", payload)
+        if organization_id: payload["organization_id"] = str(organization_id)
+        await self._post(f"{settings.API_V1_STR_AI}/process-file", payload, timeout=settings.AI_GENERATION_TIMEOUT_SECONDS)
 
-    async def process_qa(self, workspace_id: UUID, source_id: UUID, qa_in: Any):
+    async def process_qa(self, workspace_id: UUID, source_id: UUID, qa_in: Any, organization_id: Optional[UUID] = None):
         payload = {"workspace_id": str(workspace_id), "source_id": str(source_id), "qa_in": qa_in.model_dump()}
-        await self._post(f"{settings.API_V1_STR_AI}/process-qa", payload)
+        if organization_id: payload["organization_id"] = str(organization_id)
+        await self._post(f"{settings.API_V1_STR_AI}/process-qa", payload, timeout=settings.AI_GENERATION_TIMEOUT_SECONDS)
 
-    async def process_article(self, workspace_id: UUID, source_id: UUID, article_in: Any):
+    async def process_article(self, workspace_id: UUID, source_id: UUID, article_in: Any, organization_id: Optional[UUID] = None):
         payload = {"workspace_id": str(workspace_id), "source_id": str(source_id), "article_in": article_in.model_dump()}
-        await self._post(f"{settings.API_V1_STR_AI}/process-article", payload)
+        if organization_id: payload["organization_id"] = str(organization_id)
+        await self._post(f"{settings.API_V1_STR_AI}/process-article", payload, timeout=settings.AI_GENERATION_TIMEOUT_SECONDS)
 
-    async def delete_embeddings(self, collection_name: str, source_id: UUID):
-        payload = {"collection_name": collection_name, "source_id": str(source_id)}
+    async def delete_embeddings(
+            self, collection_name: Optional[str], source_id: UUID, organization_id: Optional[UUID] = None,
+            workspace_ids: Optional[List[UUID]] = None
+    ):
+        payload = {
+            "collection_name": collection_name,
+            "source_id": str(source_id),
+            "workspace_ids": [str(w) for w in workspace_ids or []],
+        }
+        if organization_id: payload["organization_id"] = str(organization_id)
         await self._post(f"{settings.API_V1_STR_AI}/delete-embeddings", payload)
 
+    async def set_source_membership(
+            self, organization_id: Optional[UUID], source_id: UUID,
+            track_ids: List[UUID], stage_ids: List[UUID], task_ids: List[UUID],
+            previous_track_ids: Optional[List[UUID]] = None
+    ) -> dict:
+        payload = {
+            "organization_id": str(organization_id) if organization_id else None,
+            "source_id": str(source_id),
+            "track_ids": [str(i) for i in track_ids],
+            "stage_ids": [str(i) for i in stage_ids],
+            "task_ids": [str(i) for i in task_ids],
+            "previous_track_ids": [str(i) for i in previous_track_ids or []],
+        }
+        return await self._post(f"{settings.API_V1_STR_AI}/source-membership", payload)
+
+    async def migrate_vector_layout(self, workspace_organizations: Dict[UUID, UUID], delete_old: bool = False) -> dict:
+        payload = {
+            "workspace_organizations": {str(k): str(v) for k, v in workspace_organizations.items()},
+            "delete_old": delete_old
+        }
+        return await self._post(f"{settings.API_V1_STR_AI}/migrate-layout", payload, timeout=settings.AI_GENERATION_TIMEOUT_SECONDS)
+
+    async def clone_workspace(
+            self, source_workspace_id: UUID, target_workspace_id: UUID, organization_id: Optional[UUID] = None
+    ) -> dict:
+        payload = {
+            "source_workspace_id": str(source_workspace_id),
+            "target_workspace_id": str(target_workspace_id),
+            "organization_id": str(organization_id) if organization_id else None
+        }
+        return await self._post(f"{settings.API_V1_STR_AI}/workspaces/clone", payload, timeout=settings.AI_GENERATION_TIMEOUT_SECONDS)
+
+    async def synthesize_faq(self, workspace_id: UUID, source_id: UUID, organization_id: Optional[UUID] = None) -> dict:
+        payload = {"workspace_id": str(workspace_id), "source_id": str(source_id)}
+        if organization_id: payload["organization_id"] = str(organization_id)
+        return await self._post(f"{settings.API_V1_STR_AI}/faq/synthesize", payload)
+
+    async def list_faq(
+            self, workspace_id: UUID, source_id: Optional[UUID] = None, status: Optional[str] = None,
+            organization_id: Optional[UUID] = None
+    ) -> List[Dict[str, Any]]:
+        payload = {
+            "workspace_id": str(workspace_id),
+            "source_id": str(source_id) if source_id else None,
+            "organization_id": str(organization_id) if organization_id else None,
+            "status": status
+        }
+        return await self._post(f"{settings.API_V1_STR_AI}/faq/list", payload)
+
+    async def review_faq(self, workspace_id: UUID, items: List[Dict[str, Any]], organization_id: Optional[UUID] = None) -> dict:
+        payload = {
+            "workspace_id": str(workspace_id),
+            "organization_id": str(organization_id) if organization_id else None,
+            "items": items
+        }
+        return await self._post(f"{settings.API_V1_STR_AI}/faq/review", payload)
+
     async def answer_query(
-            self, workspace_id: UUID, question: str, session_id: UUID
+            self, workspace_id: UUID, question: str, session_id: UUID, organization_id: Optional[UUID] = None,
+            history: Optional[List[Dict[str, str]]] = None, instructions: Optional[str] = None,
+            extra_workspace_ids: Optional[List[UUID]] = None, source_ids: Optional[List[UUID]] = None
     ) -> Tuple[str, List[schemas.QueryResponseSource], str]: 
         payload = {
             "workspace_id": str(workspace_id),
             "question": question,
-            "session_id": str(session_id)
+            "session_id": str(session_id),
+            "history": history or [],
+            "instructions": instructions,
+            "extra_workspace_ids": [str(w) for w in extra_workspace_ids or []],
+            "source_ids": [str(s) for s in source_ids or []]
         }
-        response_json = await self._post(f"{settings.API_V1_STR_AI}/query", json_data=payload)
+        if organization_id: payload["organization_id"] = str(organization_id)
+        response_json = await self._post(
+            f"{settings.API_V1_STR_AI}/query", json_data=payload, timeout=settings.AI_QUERY_TIMEOUT_SECONDS
+        )
         answer = response_json.get("answer", "Ошибка AI")
         sources_data = response_json.get("sources", [])
         emotion = response_json.get("emotion", "neutral") 
@@ -56,17 +191,26 @@ class AIClient:
         return answer, sources, emotion
 
     # --- ПЕРЕИМЕНОВАЛИ МЕТОД В v2 ЧТОБЫ СБРОСИТЬ КЭШ ---
-    async def generate_quiz_v2(self, text_content: str) -> List[Dict[str, Any]]:
-        print(f"[AI Client] Requesting quiz generation v2...")
+    async def generate_quiz_v2(
+            self, text_content: str, file_path: Optional[str] = None, filename: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        logger.debug("Requesting quiz generation")
         payload = {"text_content": text_content, "difficulty": "medium"}
+        if file_path:
+            payload.update({"file_path": file_path, "filename": filename})
         
         try:
-            response = await self._post(f"{settings.API_V1_STR_AI}/generate-quiz", json_data=payload)
+            response = await self._post(
+                f"{settings.API_V1_STR_AI}/generate-quiz", json_data=payload, timeout=settings.AI_GENERATION_TIMEOUT_SECONDS
+            )
             questions = response.get("questions", [])
-            print(f"[AI Client] Received {len(questions)} questions")
+            logger.debug("Received %s questions", len(questions))
             return questions
+        except (AIServiceBusy, asyncio.CancelledError):
+            # Перегрузку (с Retry-After) и отмену отдаем вызывающему, а не превращаем в пустой тест
+            raise
         except Exception as e:
-            print(f"[AI Client] Gen Error: {e}")
+            logger.error(f"Quiz generation failed: {e}")
             return []
 
 ai_client = AIClient(base_url=settings.AI_SERVICE_URL)
\ No newline at end of file
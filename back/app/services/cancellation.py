@@ -0,0 +1,55 @@
+"""
+Отмена долгих вызовов AI-сервиса, если клиент закрыл соединение (закрыл чат, обновил страницу).
+
+Отмена задачи закрывает исходящее соединение AIClient, back-ai видит разрыв и так же
+прерывает генерацию в Ollama - ответ, который никто не прочитает, не занимает LLM.
+"""
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Dict, TypeVar
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DISCONNECT_POLL_SECONDS = 0.5
+# nginx-код "клиент закрыл запрос": ответ все равно никто не получит
+CLIENT_CLOSED_REQUEST = 499
+
+
+class CancellationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def record(self, operation: str):
+        with self._lock:
+            self._counts[operation] = self._counts.get(operation, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+cancellation_stats = CancellationStats()
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], operation: str) -> T:
+    """Ждет awaitable, пока клиент на связи; при разрыве отменяет ее и отвечает 499."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                cancellation_stats.record(operation)
+                logger.info(f"Client disconnected, {operation} cancelled")
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionFactory
+from app.services.ai_client import ai_client
+from app import schemas, models
+
+logger = logging.getLogger(__name__)
+
+_running: set = set() # Ссылки на asyncio.Task, чтобы их не собрал GC
+
+BULK_SOURCE_TYPES = (models.KnowledgeSourceTypeEnum.ARTICLE, models.KnowledgeSourceTypeEnum.FILE)
+
+
+def source_quiz_input(source: models.KnowledgeSource) -> Tuple[str, Optional[str]]:
+    """Возвращает (текст, путь к файлу) для генерации теста по источнику."""
+    content = source.content or {}
+    if source.type == models.KnowledgeSourceTypeEnum.QNA:
+        return f"Вопрос: {content.get('question', '')}\nОтвет: {content.get('answer', '')}", None
+    if source.type == models.KnowledgeSourceTypeEnum.ARTICLE:
+        return content.get("content", ""), None
+    return "", source.file_path
+
+
+async def create_generated_quiz(
+        db: AsyncSession, title: str, source_name: str, ai_questions: List[Dict[str, Any]]
+) -> models.Quiz:
+    """Сохраняет сгенерированные AI вопросы как новый тест (без commit)."""
+    db_quiz = models.Quiz(title=title, description=f"Сгенерировано по источнику {source_name}", pass_threshold=0.7)
+    db.add(db_quiz)
+    await db.flush()
+
+    for i, q_data in enumerate(ai_questions):
+        options_with_ids = []
+        for idx, opt in enumerate(q_data['options']):
+            options_with_ids.append({"id": idx + 1, "text": opt['text'], "is_correct": opt['is_correct']})
+        db_q = models.QuizQuestion(quiz_id=db_quiz.id, text=q_data['question_text'], order=i + 1, options=options_with_ids)
+        db.add(db_q)
+    return db_quiz
+
+
+def plan_track_quizzes(track: models.OnboardingTrack, overwrite: bool) -> Tuple[List[models.KnowledgeSource], Dict[UUID, UUID]]:
+    """
+    Решает, какой ARTICLE/FILE источник достанется каждой QUIZ-задаче трека,
+    и возвращает только выбранные источники - тест без задачи никому не нужен.
+    Приоритет: файлы задачи -> файлы этапа -> файлы трека.
+    """
+    def eligible(files) -> List[models.KnowledgeSource]:
+        return [f for f in files if f.type in BULK_SOURCE_TYPES]
+
+    track_files = eligible(track.files)
+    sources: Dict[UUID, models.KnowledgeSource] = {}
+    task_to_source: Dict[UUID, UUID] = {}
+
+    for stage in track.stages:
+        stage_files = eligible(stage.files)
+        for task in stage.tasks:
+            if task.type != models.TaskTypeEnum.QUIZ or (task.quiz_id and not overwrite):
+                continue
+            candidates = eligible(task.files) + stage_files + track_files
+            if not candidates:
+                continue
+            # Стараемся раздать разным задачам разные источники
+            chosen = next((c for c in candidates if c.id not in sources), candidates[0])
+            sources.setdefault(chosen.id, chosen)
+            task_to_source[task.id] = chosen.id
+
+    return list(sources.values()), task_to_source
+
+
+async def get_job(db: AsyncSession, job_id: UUID, organization_id: UUID) -> Optional[models.QuizJob]:
+    """Задача, если она запущена по треку этой организации."""
+    job = await db.get(models.QuizJob, job_id)
+    if job is None or job.organization_id != organization_id:
+        return None
+    return job
+
+
+async def start_track_quiz_job(db: AsyncSession, track: models.OnboardingTrack, overwrite: bool) -> models.QuizJob:
+    """Сохраняет задачу и запускает генерацию в фоне. Трек должен быть загружен с файлами."""
+    sources, task_to_source = plan_track_quizzes(track, overwrite)
+
+    job = models.QuizJob(
+        track_id=track.id,
+        organization_id=track.organization_id,
+        total=len(sources),
+        items=[
+            schemas.QuizJobItem(
+                source_id=s.id,
+                source_name=s.name,
+                task_ids=[t for t, src in task_to_source.items() if src == s.id]
+            ).model_dump(mode="json")
+            for s in sources
+        ]
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+
+    inputs = {s.id: source_quiz_input(s) for s in sources}
+    task = asyncio.create_task(_run_job(job.id, inputs))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return job
+
+
+def _set_item(job: models.QuizJob, index: int, **changes):
+    # JSON-колонку нужно присвоить заново, изменения внутри списка SQLAlchemy не отслеживает
+    items = list(job.items)
+    items[index] = {**items[index], **changes}
+    job.items = items
+
+
+async def _run_job(job_id: UUID, inputs: Dict[UUID, Tuple[str, Optional[str]]]):
+    semaphore = asyncio.Semaphore(settings.AI_QUIZ_CONCURRENCY)
+    # Одна сессия не допускает конкурентных запросов, поэтому запись в БД сериализуем
+    db_lock = asyncio.Lock()
+
+    async with AsyncSessionFactory() as db:
+        job = await db.get(models.QuizJob, job_id)
+        try:
+            job.status = "running"
+            await db.commit()
+
+            async def process(index: int, item: schemas.QuizJobItem):
+                text_content, file_path = inputs[item.source_id]
+                try:
+                    if not file_path and len(text_content) < 50:
+                        raise ValueError("Source content too short")
+                    async with semaphore:
+                        questions = await ai_client.generate_quiz_v2(
+                            text_content, file_path=file_path, filename=item.source_name
+                        )
+                    if not questions:
+                        raise ValueError("AI failed to generate questions (empty result)")
+
+                    async with db_lock:
+                        try:
+                            db_quiz = await create_generated_quiz(db, f"Тест: {item.source_name}", item.source_name, questions)
+                            if item.task_ids:
+                                task_q = select(models.Task).where(models.Task.id.in_(item.task_ids))
+                                for task in (await db.execute(task_q)).scalars().all():
+                                    task.quiz_id = db_quiz.id
+                            # Тест и статус источника в задаче сохраняются вместе
+                            _set_item(job, index, status="completed", quiz_id=str(db_quiz.id))
+                            job.completed += 1
+                            await db.commit()
+                        except Exception:
+                            await db.rollback()
+                            await db.refresh(job)
+                            raise
+                except Exception as e:
+                    async with db_lock:
+                        _set_item(job, index, status="failed", error=str(e))
+                        job.failed += 1
+                        await db.commit()
+
+            items = [schemas.QuizJobItem(**item) for item in job.items]
+            await asyncio.gather(*(process(i, item) for i, item in enumerate(items)))
+
+            job.status = "completed" if job.completed or not job.total else "failed"
+        except Exception as e:
+            logger.error(f"Quiz job {job_id} failed: {e}")
+            await db.rollback()
+            await db.refresh(job)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.now()
+            await db.commit()
@@ -0,0 +1,149 @@
+"""
+Лимиты запросов к RAG (чат трека и публичный виджет) по алгоритму token bucket.
+
+Ключи ведер:
+    - "user:<id>"    - авторизованный пользователь, лимит по роли (RATE_LIMIT_ROLES_JSON);
+    - "session:<id>" - сессия публичного виджета;
+    - "ip:<адрес>"   - все публичные сессии с одного адреса (защита от скрипта, меняющего session_id).
+Лимит задается в запросах в минуту; емкость ведра (допустимый всплеск) - RATE_LIMIT_BURST_FRACTION от него.
+
+Ведра хранятся в Postgres (rate_limit_buckets): пополнение и списание - один атомарный UPDATE под
+блокировкой строки, поэтому лимит общий для всех воркеров и реплик back. Если БД недоступна,
+запрос пропускается - лимит не должен ронять чат.
+"""
+import logging
+import math
+import threading
+import time
+from typing import Dict, Optional
+from uuid import UUID
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import AsyncSessionFactory
+from app import models
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_INTERVAL_SECONDS = 600
+# Ведро, к которому не обращались час, давно полное - строку можно удалить
+IDLE_BUCKET_TTL = "1 hour"
+
+_ENSURE_BUCKET = text("""
+    INSERT INTO rate_limit_buckets (key, tokens, updated_at)
+    VALUES (:key, CAST(:capacity AS float8), clock_timestamp())
+    ON CONFLICT (key) DO NOTHING
+""")
+
+_TAKE_TOKEN = text("""
+    UPDATE rate_limit_buckets AS b
+    SET tokens = CASE WHEN r.refilled >= 1 THEN r.refilled - 1 ELSE r.refilled END,
+        updated_at = r.now
+    FROM (
+        SELECT key,
+               LEAST(CAST(:capacity AS float8),
+                     tokens + EXTRACT(EPOCH FROM clock_timestamp() - updated_at)::float8 * CAST(:rate AS float8)) AS refilled,
+               clock_timestamp() AS now
+        FROM rate_limit_buckets
+        WHERE key = :key
+        FOR UPDATE
+    ) AS r
+    WHERE b.key = r.key
+    RETURNING r.refilled
+""")
+
+_CLEANUP = text(f"DELETE FROM rate_limit_buckets WHERE updated_at < clock_timestamp() - INTERVAL '{IDLE_BUCKET_TTL}'")
+
+
+class RateLimitStats:
+    """Счетчики текущего процесса (у каждого воркера свои) по типам лимитов."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._allowed: Dict[str, int] = {}
+        self._throttled: Dict[str, int] = {}
+        self.store_errors = 0
+
+    def record(self, scope: str, allowed: bool):
+        counts = self._allowed if allowed else self._throttled
+        with self._lock:
+            counts[scope] = counts.get(scope, 0) + 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "allowed": dict(self._allowed),
+                "throttled": dict(self._throttled),
+                "store_errors": self.store_errors,
+            }
+
+
+rate_limit_stats = RateLimitStats()
+_last_cleanup = time.monotonic()
+
+
+async def take_token(key: str, per_minute: int) -> Optional[int]:
+    """Списывает токен из ведра key. None - запрос разрешен, иначе - через сколько секунд повторить."""
+    global _last_cleanup
+    capacity = max(1.0, per_minute * settings.RATE_LIMIT_BURST_FRACTION)
+    rate = per_minute / 60.0
+    params = {"key": key, "capacity": capacity, "rate": rate}
+    try:
+        async with AsyncSessionFactory() as session:
+            await session.execute(_ENSURE_BUCKET, params)
+            refilled = (await session.execute(_TAKE_TOKEN, params)).scalar_one()
+            if time.monotonic() - _last_cleanup > CLEANUP_INTERVAL_SECONDS:
+                _last_cleanup = time.monotonic()
+                await session.execute(_CLEANUP)
+            await session.commit()
+    except Exception as e:
+        rate_limit_stats.store_errors += 1
+        logger.error(f"Bucket store error for {key}: {e}")
+        return None
+    if refilled >= 1:
+        return None
+    return max(1, math.ceil((1 - refilled) / rate))
+
+
+def _throttled(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Too many requests, retry in {retry_after}s",
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+async def _enforce(scope: str, key: str, per_minute: int):
+    if not settings.RATE_LIMIT_ENABLED or per_minute <= 0:
+        return
+    retry_after = await take_token(key, per_minute)
+    rate_limit_stats.record(scope, retry_after is None)
+    if retry_after is not None:
+        logger.info(f"{key} throttled, retry in {retry_after}s")
+        raise _throttled(retry_after)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+
+async def enforce_user_limit(user: models.User):
+    """Лимит авторизованного пользователя по его роли (роль без лимита в настройках - самый строгий)."""
+    roles = settings.RATE_LIMIT_ROLES
+    role = user.role.value if user.role else models.UserRoleEnum.UNCONFIRMED.value
+    per_minute = roles.get(role, min(roles.values(), default=0))
+    await _enforce(f"user:{role}", f"user:{user.id}", per_minute)
+
+
+async def enforce_public_limit(session_id: UUID, request: Optional[Request] = None):
+    """Лимиты виджета: сначала адрес клиента (общий для всех его сессий), затем сессия."""
+    ip = client_ip(request) if request else None
+    if ip:
+        await _enforce("ip", f"ip:{ip}", settings.RATE_LIMIT_PUBLIC_IP_PER_MINUTE)
+    await _enforce("session", f"session:{session_id}", settings.RATE_LIMIT_PUBLIC_SESSION_PER_MINUTE)
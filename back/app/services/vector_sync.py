@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+from uuid import UUID
+
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.database import AsyncSessionFactory
+from app.services.ai_client import ai_client
+from app import models, schemas
+
+logger = logging.getLogger(__name__)
+
+_running: set = set() # Ссылки на asyncio.Task фоновой индексации, чтобы их не собрал GC
+
+
+async def track_source_ids(db: AsyncSession, track_id: UUID) -> Set[UUID]:
+    """Все источники, привязанные к треку, его этапам и задачам."""
+    query = union(
+        select(models.track_files.c.source_id).where(models.track_files.c.track_id == track_id),
+        select(models.stage_files.c.source_id)
+        .join(models.Stage, models.Stage.id == models.stage_files.c.stage_id)
+        .where(models.Stage.track_id == track_id),
+        select(models.task_files.c.source_id)
+        .join(models.Task, models.Task.id == models.task_files.c.task_id)
+        .join(models.Stage, models.Stage.id == models.Task.stage_id)
+        .where(models.Stage.track_id == track_id),
+    )
+    return set((await db.execute(query)).scalars().all())
+
+
+async def scope_source_ids(db: AsyncSession, stage_id: Optional[UUID] = None, task_id: Optional[UUID] = None) -> List[UUID]:
+    """Файлы задачи (если их нет - файлы ее этапа) или файлы этапа. Пустой список - ограничения нет."""
+    if task_id:
+        result = await db.execute(select(models.task_files.c.source_id).where(models.task_files.c.task_id == task_id))
+        source_ids = list(result.scalars().all())
+        if source_ids:
+            return source_ids
+        stage_id = (await db.execute(select(models.Task.stage_id).where(models.Task.id == task_id))).scalar_one_or_none()
+    if stage_id:
+        result = await db.execute(select(models.stage_files.c.source_id).where(models.stage_files.c.stage_id == stage_id))
+        return list(result.scalars().all())
+    return []
+
+
+def _source_query(source_ids: List[UUID], reload: bool = True):
+    query = (
+        select(models.KnowledgeSource)
+        .where(models.KnowledgeSource.id.in_(source_ids))
+        .options(
+            selectinload(models.KnowledgeSource.tracks),
+            selectinload(models.KnowledgeSource.stages),
+            selectinload(models.KnowledgeSource.tasks).selectinload(models.Task.stage),
+        )
+    )
+    # Связи могли измениться в этой же сессии - перечитываем их из БД
+    return query.execution_options(populate_existing=True) if reload else query
+
+
+async def load_source(db: AsyncSession, source_id: UUID) -> Optional[models.KnowledgeSource]:
+    """Источник со связями, по которым считаются его базы знаний (source_scope_ids)."""
+    return (await db.execute(_source_query([source_id]))).scalar_one_or_none()
+
+
+def source_organization_id(source: models.KnowledgeSource) -> Optional[UUID]:
+    return source.organization_id or next((t.organization_id for t in source.tracks), None)
+
+
+def source_scope_ids(source: models.KnowledgeSource) -> Set[UUID]:
+    """Базы знаний, в которых ищется источник: его треки или (без треков) вся организация."""
+    # Файл этапа/задачи входит и в поисковую область трека
+    track_ids = {t.id for t in source.tracks}
+    track_ids |= {s.track_id for s in source.stages}
+    track_ids |= {t.stage.track_id for t in source.tasks}
+    organization_id = source_organization_id(source)
+    # Источник без треков - общий документ организации: его база знаний имеет id организации
+    if not track_ids and organization_id:
+        track_ids = {organization_id}
+    return track_ids
+
+
+async def source_scopes(db: AsyncSession, source_ids: Iterable[UUID]) -> Dict[UUID, Set[UUID]]:
+    """Текущие базы знаний источников - снимок до изменения связей для sync_source_membership."""
+    source_ids = list(source_ids)
+    if not source_ids:
+        return {}
+    # Без перечитывания: объекты сессии, которые endpoint сейчас изменит, не трогаем
+    sources = (await db.execute(_source_query(source_ids, reload=False))).scalars().all()
+    return {source.id: source_scope_ids(source) for source in sources}
+
+
+async def sync_source_membership(
+        db: AsyncSession, source_ids: Iterable[UUID], previous_scopes: Optional[Dict[UUID, Set[UUID]]] = None
+):
+    """
+    Передает в back-ai актуальную принадлежность источников трекам/этапам/задачам; ошибки не прерывают запрос.
+    previous_scopes - базы знаний до изменения (source_scopes): в раскладке "workspace" back-ai копирует чанки
+    в новые базы и удаляет из отвязанных. Базы, в которые копировать нечего, индексируются заново.
+    """
+    source_ids = list(source_ids)
+    if not source_ids:
+        return
+
+    previous_scopes = previous_scopes or {}
+    for source in (await db.execute(_source_query(source_ids))).scalars().all():
+        organization_id = source_organization_id(source)
+        membership = dict(
+            organization_id=organization_id,
+            source_id=source.id,
+            track_ids=list(source_scope_ids(source)),
+            stage_ids=[s.id for s in source.stages],
+            task_ids=[t.id for t in source.tasks],
+        )
+        try:
+            result = await ai_client.set_source_membership(
+                **membership, previous_track_ids=list(previous_scopes.get(source.id, ()))
+            )
+            missing = [UUID(w) for w in (result or {}).get("missing_track_ids", [])]
+            for workspace_id in missing:
+                await _ingest(source, workspace_id, organization_id)
+            if missing:
+                # Новые чанки получили только флаг трека - добавляем флаги этапов и задач
+                await ai_client.set_source_membership(**membership)
+        except Exception as e:
+            logger.error(f"Failed to sync source {source.id}: {e}")
+
+
+async def _ingest(source: models.KnowledgeSource, workspace_id: UUID, organization_id: Optional[UUID]):
+    content = source.content or {}
+    if source.type == models.KnowledgeSourceTypeEnum.QNA:
+        qa_in = schemas.KnowledgeSourceCreateQA(question=content.get("question", ""), answer=content.get("answer", ""))
+        await ai_client.process_qa(workspace_id, source.id, qa_in, organization_id=organization_id)
+    elif source.type == models.KnowledgeSourceTypeEnum.ARTICLE:
+        article_in = schemas.KnowledgeSourceCreateArticle(title=source.name, content=content.get("content", ""))
+        await ai_client.process_article(workspace_id, source.id, article_in, organization_id=organization_id)
+    else:
+        await ai_client.process_file(workspace_id, source.id, source.file_path, source.name, organization_id=organization_id)
+
+
+async def index_source(source_id: UUID):
+    """
+    Индексирует источник в back-ai и обновляет статус (фоновая задача). Эмбеддинги считаются один раз,
+    в остальные базы знаний источника чанки копирует sync_source_membership.
+    Общий документ организации попадает в базу знаний организации: workspace_{organization_id}
+    в раскладке "workspace" и флаг track_{organization_id} в раскладке "organization".
+    """
+    async with AsyncSessionFactory() as db:
+        source = (await db.execute(_source_query([source_id]))).scalar_one_or_none()
+        if source is None:
+            return
+        organization_id = source_organization_id(source)
+        indexed_into = next(iter(source_scope_ids(source)), None)
+        try:
+            if indexed_into is not None:
+                await _ingest(source, indexed_into, organization_id)
+            source.status = models.KnowledgeSourceStatusEnum.COMPLETED
+        except Exception as e:
+            logger.error(f"Failed to index source {source_id}: {e}")
+            source.status = models.KnowledgeSourceStatusEnum.FAILED
+        await db.commit()
+        if source.status == models.KnowledgeSourceStatusEnum.COMPLETED and indexed_into is not None:
+            # Связи могли измениться, пока шла индексация
+            await sync_source_membership(db, [source_id], {source_id: {indexed_into}})
+
+
+def schedule_index_source(source_id: UUID):
+    """Запускает index_source в фоне (источник должен быть уже сохранен в БД)."""
+    task = asyncio.create_task(index_source(source_id))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def delete_source_embeddings(db: AsyncSession, source_id: UUID):
+    """Удаляет чанки источника из всех его баз знаний и из базы организации; ошибки не прерывают запрос."""
+    source = await load_source(db, source_id)
+    if source is None:
+        return
+    organization_id = source_organization_id(source)
+    # В раскладке "organization" back-ai сам выбирает коллекцию организации
+    workspace_ids = source_scope_ids(source) | ({organization_id} if organization_id else set())
+    try:
+        await ai_client.delete_embeddings(None, source_id, organization_id=organization_id, workspace_ids=list(workspace_ids))
+    except Exception as e:
+        logger.error(f"Failed to delete embeddings of source {source_id}: {e}")
@@ -0,0 +1,118 @@
+"""
+Данные для нагрузочного теста (back-ai/benchmarks/load.py) в Postgres из DATABASE_URL.
+
+Запуск из каталога back (лучше на отдельной, одноразовой базе):
+    python -m benchmarks.seed --employees 20 --articles 12 --out /tmp/kb-load/seed.json
+
+Создает организацию, трек, HR-пользователя, сотрудников трека и статьи базы знаний, привязанные
+к треку. Тексты статей детерминированы (--seed), поэтому прогоны сравнимы между собой. Каждый запуск
+создает новую организацию с уникальными email - старые данные не трогаются.
+В --out пишутся id, access-токены пользователей и тексты статей (их индексирует в back-ai load.py).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import uuid
+from datetime import timedelta
+
+from app.core.database import AsyncSessionFactory, Base, engine
+from app.core.security import create_access_token, get_password_hash
+from app import models
+
+TOPICS = ["отпуск", "командировки", "охрана труда", "пропускной режим", "медицинский осмотр",
+          "обучение", "больничный", "удаленная работа", "премирование", "наставничество"]
+SENTENCES = [
+    "Порядок по теме «{topic}» утвержден приказом и обязателен для всех сотрудников.",
+    "Заявление по вопросу «{topic}» подается через портал не позднее чем за {days} рабочих дней.",
+    "Согласование по теме «{topic}» выполняет непосредственный руководитель, затем отдел кадров.",
+    "Если по теме «{topic}» возникли вопросы, обратитесь к наставнику или в службу поддержки.",
+    "Нарушение правил по теме «{topic}» рассматривается комиссией в течение {days} дней.",
+    "Документы по теме «{topic}» хранятся в разделе регламентов корпоративного портала.",
+]
+QUESTIONS = [f"Как оформить {topic}?" for topic in TOPICS] + [f"Кто согласует {topic}?" for topic in TOPICS]
+PASSWORD = "loadtest"
+
+
+def article_text(rng: random.Random, topic: str, paragraphs: int) -> str:
+    return "\n\n".join(
+        " ".join(rng.choice(SENTENCES).format(topic=topic, days=rng.randint(2, 14)) for _ in range(6))
+        for _ in range(paragraphs)
+    )
+
+
+async def seed(args) -> dict:
+    rng = random.Random(args.seed)
+    run = uuid.uuid4().hex[:8]
+    token_ttl = timedelta(hours=args.token_hours)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionFactory() as db:
+        organization = models.Organization(name=f"Load test {run}")
+        db.add(organization)
+        await db.flush()
+        track = models.OnboardingTrack(organization_id=organization.id, name="Нагрузочный тест",
+                                       description="Трек для нагрузочного теста")
+        db.add(track)
+        await db.flush()
+
+        hashed_password = get_password_hash(PASSWORD)
+        hr = models.User(full_name="Load HR", email=f"hr-{run}@loadtest.local", hashed_password=hashed_password,
+                         role=models.UserRoleEnum.HR, organization_id=organization.id)
+        employees = [
+            models.User(full_name=f"Load Employee {i}", email=f"employee-{run}-{i}@loadtest.local",
+                        hashed_password=hashed_password, role=models.UserRoleEnum.EMPLOYEE,
+                        organization_id=organization.id, track_id=track.id)
+            for i in range(args.employees)
+        ]
+        sources = []
+        for i in range(args.articles):
+            topic = TOPICS[i % len(TOPICS)]
+            title = f"Регламент: {topic} ({i + 1})"
+            content = article_text(rng, topic, args.paragraphs)
+            sources.append(models.KnowledgeSource(
+                organization_id=organization.id, type=models.KnowledgeSourceTypeEnum.ARTICLE,
+                status=models.KnowledgeSourceStatusEnum.COMPLETED, name=title,
+                content={"title": title, "content": content}
+            ))
+        db.add_all([hr, *employees, *sources])
+        await db.flush()
+        await db.execute(models.track_files.insert(), [{"track_id": track.id, "source_id": s.id} for s in sources])
+        await db.commit()
+
+    await engine.dispose()
+    return {
+        "organization_id": str(organization.id),
+        "track_id": str(track.id),
+        "hr_token": create_access_token({"sub": str(hr.id)}, token_ttl),
+        "employee_tokens": [create_access_token({"sub": str(u.id)}, token_ttl) for u in employees],
+        "sources": [{"id": str(s.id), "title": s.content["title"], "content": s.content["content"]} for s in sources],
+        "questions": QUESTIONS,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=20)
+    parser.add_argument("--articles", type=int, default=12)
+    parser.add_argument("--paragraphs", type=int, default=6, help="Абзацев в статье (по 6 предложений)")
+    parser.add_argument("--token-hours", type=float, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="seed.json")
+    args = parser.parse_args()
+
+    data = asyncio.run(seed(args))
+    directory = os.path.dirname(args.out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"Seeded organization {data['organization_id']}: track {data['track_id']}, "
+          f"{len(data['employee_tokens'])} employees, {len(data['sources'])} articles -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
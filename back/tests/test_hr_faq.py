@@ -0,0 +1,72 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app import models
+from app.core.config import settings
+from app.core.database import AsyncSessionFactory, engine
+from app.services import vector_sync
+from app.services.ai_client import ai_client
+
+
+@pytest.fixture
+def faq_calls(monkeypatch, tmp_path):
+    """Подменяет back-ai: индексация ничего не делает, вызовы синтеза FAQ запоминаются."""
+    calls = []
+
+    async def process_file(*args, **kwargs):
+        pass
+
+    async def set_source_membership(*args, **kwargs):
+        return {"missing_track_ids": []}
+
+    async def synthesize_faq(workspace_id, source_id, organization_id=None):
+        calls.append((workspace_id, source_id, organization_id))
+        return {"status": "SCHEDULED"}
+
+    monkeypatch.setattr(ai_client, "process_file", process_file)
+    monkeypatch.setattr(ai_client, "set_source_membership", set_source_membership)
+    monkeypatch.setattr(ai_client, "synthesize_faq", synthesize_faq)
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    return calls
+
+
+async def _hr_user():
+    async with AsyncSessionFactory() as db:
+        organization = models.Organization(name="Org")
+        db.add(organization)
+        await db.flush()
+        user = models.User(full_name="HR", email=f"{uuid4()}@example.com", hashed_password="x",
+                           role=models.UserRoleEnum.HR, organization_id=organization.id)
+        db.add(user)
+        await db.commit()
+        return user
+
+
+def test_faq_synthesis_uses_source_knowledge_base(api, faq_calls):
+    async def scenario():
+        user, stranger = await _hr_user(), await _hr_user()
+        async with api(user) as client:
+            upload = await client.post("/api/v1/knowledge/upload", files={"file": ("vacation.txt", b"text")})
+            source_id = upload.json()["id"]
+            await asyncio.gather(*vector_sync._running)
+
+            # Общий документ организации: его база знаний - id организации
+            response = await client.post(f"/api/v1/hr/faq/{source_id}/synthesize")
+            assert response.status_code == 202, response.text
+            assert [(str(w), str(s), o) for w, s, o in faq_calls] == [
+                (str(user.organization_id), source_id, user.organization_id)
+            ]
+
+            track = (await client.post("/api/v1/quests/tracks", json={"name": "Track", "file_ids": [source_id]})).json()
+            await client.post(f"/api/v1/hr/faq/{source_id}/synthesize")
+            assert str(faq_calls[-1][0]) == track["id"]
+
+        # Источник другой организации не виден
+        async with api(stranger) as client:
+            assert (await client.post(f"/api/v1/hr/faq/{source_id}/synthesize")).status_code == 404
+            assert (await client.get("/api/v1/hr/faq", params={"source_id": source_id})).status_code == 404
+        await engine.dispose()
+
+    asyncio.run(scenario())
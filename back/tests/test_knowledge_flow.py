@@ -0,0 +1,129 @@
+import asyncio
+from uuid import UUID, uuid4
+
+import pytest
+
+from app import models, schemas
+from app.core.config import settings
+from app.core.database import AsyncSessionFactory, engine
+from app.services import vector_sync
+from app.services.ai_client import ai_client
+
+
+class WorkspaceLayoutAI:
+    """back-ai в раскладке "workspace": какие источники лежат в каждой базе знаний (workspace_{id})."""
+
+    def __init__(self):
+        self.workspaces = {}
+        self.embedded = []
+
+    def holders(self, source_id):
+        return {w for w, sources in self.workspaces.items() if source_id in sources}
+
+    async def process_file(self, workspace_id, source_id, file_path, filename, organization_id=None):
+        self.embedded.append((str(workspace_id), str(source_id)))
+        self.workspaces.setdefault(str(workspace_id), set()).add(str(source_id))
+
+    async def set_source_membership(self, organization_id, source_id, track_ids, stage_ids, task_ids, previous_track_ids=None):
+        source_id, wanted = str(source_id), {str(t) for t in track_ids}
+        has_chunks = bool(self.holders(source_id))
+        for workspace_id in wanted if has_chunks else ():
+            self.workspaces.setdefault(workspace_id, set()).add(source_id)
+        for workspace_id in {str(t) for t in previous_track_ids or []} - wanted:
+            self.workspaces.get(workspace_id, set()).discard(source_id)
+        return {"chunks": int(has_chunks), "missing_track_ids": [] if has_chunks else sorted(wanted)}
+
+    async def delete_embeddings(self, collection_name, source_id, organization_id=None, workspace_ids=None):
+        for workspace_id in [*(workspace_ids or []), organization_id]:
+            self.workspaces.get(str(workspace_id), set()).discard(str(source_id))
+
+    async def answer_query(self, workspace_id, question, session_id, organization_id=None, history=None,
+                           instructions=None, extra_workspace_ids=None, source_ids=None):
+        found = set()
+        for w in [workspace_id, *(extra_workspace_ids or [])]:
+            found |= self.workspaces.get(str(w), set())
+        if source_ids:
+            found &= {str(s) for s in source_ids}
+        return "ok", [schemas.QueryResponseSource(name=s, text_chunk="") for s in sorted(found)], "neutral"
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    fake = WorkspaceLayoutAI()
+    for name in ("process_file", "set_source_membership", "delete_embeddings", "answer_query"):
+        monkeypatch.setattr(ai_client, name, getattr(fake, name))
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    return fake
+
+
+async def _hr_user():
+    async with AsyncSessionFactory() as db:
+        organization = models.Organization(name="Org")
+        db.add(organization)
+        await db.flush()
+        user = models.User(full_name="HR", email=f"{uuid4()}@example.com", hashed_password="x",
+                           role=models.UserRoleEnum.HR, organization_id=organization.id)
+        db.add(user)
+        await db.commit()
+        return user
+
+
+async def _indexed():
+    await asyncio.gather(*vector_sync._running)
+
+
+async def _found(client, track_id, **scope):
+    response = await client.post(f"/api/v1/workspaces/{track_id}/query",
+                                 json={"question": "Как оформить отпуск?", "session_id": str(uuid4()), **scope})
+    assert response.status_code == 200, response.text
+    return {s["name"] for s in response.json()["sources"]}
+
+
+def test_upload_attach_query_delete(api, backend):
+    async def scenario():
+        user = await _hr_user()
+        organization_id = str(user.organization_id)
+        async with api(user) as client:
+            upload = await client.post("/api/v1/knowledge/upload", files={"file": ("vacation.txt", b"text")})
+            source_id = upload.json()["id"]
+            await _indexed()
+            # Новый файл - общий документ организации
+            assert backend.holders(source_id) == {organization_id}
+
+            track = (await client.post("/api/v1/quests/tracks", json={"name": "Track", "file_ids": [source_id]})).json()
+            # Привязка к треку копирует чанки в базу трека (без повторной индексации) и убирает из базы организации
+            assert backend.holders(source_id) == {track["id"]}
+            assert backend.embedded == [(organization_id, source_id)]
+            assert await _found(client, track["id"]) == {source_id}
+
+            update = await client.put(f"/api/v1/quests/tracks/{track['id']}", json={"name": "Track", "file_ids": []})
+            assert update.status_code == 200
+            # Отвязали - документ снова общий и по-прежнему находится для сотрудника трека
+            assert backend.holders(source_id) == {organization_id}
+            assert await _found(client, track["id"]) == {source_id}
+
+            await client.put(f"/api/v1/quests/tracks/{track['id']}", json={"name": "Track", "file_ids": [source_id]})
+            assert (await client.delete(f"/api/v1/knowledge/files/{source_id}")).status_code == 204
+            assert backend.holders(source_id) == set()
+            assert await _found(client, track["id"]) == set()
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_membership_reindexes_workspaces_without_chunks(api, backend):
+    async def scenario():
+        user = await _hr_user()
+        async with api(user) as client:
+            upload = await client.post("/api/v1/knowledge/upload", files={"file": ("vacation.txt", b"text")})
+            source_id = upload.json()["id"]
+            await _indexed()
+            # Индекс потерян (например, back-ai был недоступен при загрузке)
+            backend.workspaces.clear()
+
+            track = (await client.post("/api/v1/quests/tracks", json={"name": "Track", "file_ids": [source_id]})).json()
+            assert backend.holders(source_id) == {track["id"]}
+        await engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app import models
+from app.core.config import settings
+from app.core.database import AsyncSessionFactory, engine
+from app.services import quiz_jobs, vector_sync
+from app.services.ai_client import AIServiceBusy, ai_client
+
+
+def test_quiz_generation_passes_busy_to_caller(monkeypatch):
+    async def busy(*args, **kwargs):
+        raise AIServiceBusy(5)
+
+    monkeypatch.setattr(ai_client, "_post", busy)
+    with pytest.raises(AIServiceBusy):
+        asyncio.run(ai_client.generate_quiz_v2("text" * 20))
+
+
+def test_quiz_generation_failure_gives_empty_result(monkeypatch):
+    async def broken(*args, **kwargs):
+        raise ValueError("bad response")
+
+    monkeypatch.setattr(ai_client, "_post", broken)
+    assert asyncio.run(ai_client.generate_quiz_v2("text" * 20)) == []
+
+
+def _source(kind=models.KnowledgeSourceTypeEnum.FILE):
+    return SimpleNamespace(id=uuid4(), type=kind, name="doc")
+
+
+def _task(kind=models.TaskTypeEnum.QUIZ, files=()):
+    return SimpleNamespace(id=uuid4(), type=kind, quiz_id=None, files=list(files))
+
+
+def test_plan_generates_only_for_quiz_tasks():
+    track_file, spare_file, reading_file = _source(), _source(models.KnowledgeSourceTypeEnum.ARTICLE), _source()
+    quiz, reading = _task(), _task(models.TaskTypeEnum.READING, [reading_file])
+    track = SimpleNamespace(
+        files=[track_file, spare_file],
+        stages=[SimpleNamespace(files=[], tasks=[quiz, reading])]
+    )
+
+    sources, task_to_source = quiz_jobs.plan_track_quizzes(track, overwrite=False)
+
+    # Источники без QUIZ-задач (лишний файл трека, файл задачи на чтение) не генерируются
+    assert [s.id for s in sources] == [track_file.id]
+    assert task_to_source == {quiz.id: track_file.id}
+
+
+QUESTIONS = [{"question_text": "Q?", "options": [{"text": "A", "is_correct": True}, {"text": "B", "is_correct": False}]}]
+
+
+@pytest.fixture
+def generated(monkeypatch, tmp_path):
+    async def process_file(*args, **kwargs):
+        pass
+
+    async def set_source_membership(*args, **kwargs):
+        return {"missing_track_ids": []}
+
+    async def generate_quiz_v2(text_content, file_path=None, filename=None):
+        return QUESTIONS
+
+    monkeypatch.setattr(ai_client, "process_file", process_file)
+    monkeypatch.setattr(ai_client, "set_source_membership", set_source_membership)
+    monkeypatch.setattr(ai_client, "generate_quiz_v2", generate_quiz_v2)
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+
+
+def test_track_job_status_is_stored(api, generated):
+    async def scenario():
+        async with AsyncSessionFactory() as db:
+            organization = models.Organization(name="Org")
+            db.add(organization)
+            await db.flush()
+            user = models.User(full_name="HR", email=f"{uuid4()}@example.com", hashed_password="x",
+                               role=models.UserRoleEnum.HR, organization_id=organization.id)
+            db.add(user)
+            await db.commit()
+
+        async with api(user) as client:
+            file_ids = []
+            for name in ("a.txt", "b.txt"):
+                file_ids.append((await client.post("/api/v1/knowledge/upload", files={"file": (name, b"text")})).json()["id"])
+            await asyncio.gather(*vector_sync._running)
+            stage = {"title": "Stage", "order": 1, "tasks": [{"title": "Quiz", "type": "quiz", "order": 1}]}
+            track = (await client.post("/api/v1/quests/tracks", json={"name": "Track", "file_ids": file_ids, "stages": [stage]})).json()
+
+            started = await client.post(f"/api/v1/quizzes/generate-track/{track['id']}")
+            assert started.status_code == 202, started.text
+            await asyncio.gather(*quiz_jobs._running)
+
+            job = (await client.get(f"/api/v1/quizzes/jobs/{started.json()['id']}")).json()
+        await engine.dispose()
+        return track, job
+
+    track, job = asyncio.run(scenario())
+    assert (job["status"], job["total"], job["completed"]) == ("completed", 1, 1)
+    task_id = track["stages"][0]["tasks"][0]["id"]
+    assert job["items"][0]["task_ids"] == [task_id] and job["items"][0]["quiz_id"]
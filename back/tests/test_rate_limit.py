@@ -0,0 +1,94 @@
+import asyncio
+import os
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app import models
+from app.services import rate_limit
+
+
+@pytest.fixture
+def taken(monkeypatch):
+    """Подменяет хранилище ведер: take_token отвечает по очереди из retry_after, ключи и лимиты запоминаются."""
+    calls, answers = [], []
+
+    async def take_token(key, per_minute):
+        calls.append((key, per_minute))
+        return answers.pop(0) if answers else None
+
+    monkeypatch.setattr(rate_limit, "take_token", take_token)
+    return SimpleNamespace(calls=calls, answers=answers)
+
+
+def _user(role):
+    return models.User(id=uuid4(), role=role)
+
+
+def test_user_limit_depends_on_role(taken):
+    user = _user(models.UserRoleEnum.HR)
+    asyncio.run(rate_limit.enforce_user_limit(user))
+    assert taken.calls == [(f"user:{user.id}", settings.RATE_LIMIT_ROLES["hr"])]
+
+
+def test_role_without_limit_gets_the_strictest(taken, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ROLES_JSON", '{"admin": 120, "employee": 30}')
+    asyncio.run(rate_limit.enforce_user_limit(_user(models.UserRoleEnum.MENTOR)))
+    assert taken.calls[0][1] == 30
+
+
+def test_throttled_request_gets_429_with_retry_after(taken):
+    taken.answers.append(7)
+    with pytest.raises(HTTPException) as throttled:
+        asyncio.run(rate_limit.enforce_user_limit(_user(models.UserRoleEnum.EMPLOYEE)))
+    assert throttled.value.status_code == 429
+    assert throttled.value.headers["Retry-After"] == "7"
+
+
+def test_public_limit_checks_ip_before_session(taken):
+    session_id = uuid4()
+    request = SimpleNamespace(headers={}, client=SimpleNamespace(host="10.0.0.5"))
+    asyncio.run(rate_limit.enforce_public_limit(session_id, request))
+    assert [key for key, _ in taken.calls] == ["ip:10.0.0.5", f"session:{session_id}"]
+
+
+def test_disabled_limits_do_not_touch_the_store(taken, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    asyncio.run(rate_limit.enforce_public_limit(uuid4()))
+    assert taken.calls == []
+
+
+def test_store_error_lets_the_request_through(monkeypatch):
+    def unavailable():
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(rate_limit, "AsyncSessionFactory", unavailable)
+    errors = rate_limit.rate_limit_stats.store_errors
+    assert asyncio.run(rate_limit.take_token("user:test", 60)) is None
+    assert rate_limit.rate_limit_stats.store_errors == errors + 1
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL is not set")
+def test_bucket_allows_burst_then_throttles():
+    from app.core.database import engine
+
+    per_minute = 60 # емкость ведра - per_minute * RATE_LIMIT_BURST_FRACTION
+    capacity = int(per_minute * settings.RATE_LIMIT_BURST_FRACTION)
+    key = f"test:{uuid4()}"
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(models.RateLimitBucket.__table__.create, checkfirst=True)
+        try:
+            allowed = [await rate_limit.take_token(key, per_minute) for _ in range(capacity)]
+            return allowed, await rate_limit.take_token(key, per_minute)
+        finally:
+            await engine.dispose()
+
+    allowed, throttled = asyncio.run(scenario())
+    assert allowed == [None] * capacity
+    # Пополнение - токен в секунду: следующий запрос через 1 секунду
+    assert throttled == 1
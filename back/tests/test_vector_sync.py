@@ -0,0 +1,49 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app import models
+from app.services import vector_sync
+
+
+def _source(**kwargs):
+    return models.KnowledgeSource(id=uuid4(), name="doc.pdf", type=models.KnowledgeSourceTypeEnum.FILE, file_path="/tmp/doc.pdf", **kwargs)
+
+
+def test_source_without_tracks_belongs_to_organization():
+    organization_id = uuid4()
+    source = _source(organization_id=organization_id)
+    assert vector_sync.source_scope_ids(source) == {organization_id}
+
+
+def test_stage_and_task_files_belong_to_their_track():
+    organization_id = uuid4()
+    track = models.OnboardingTrack(id=uuid4(), organization_id=organization_id)
+    stage = models.Stage(id=uuid4(), track_id=uuid4())
+    task = models.Task(id=uuid4(), stage=models.Stage(id=uuid4(), track_id=uuid4()))
+    source = _source(tracks=[track], stages=[stage], tasks=[task])
+
+    assert vector_sync.source_scope_ids(source) == {track.id, stage.track_id, task.stage.track_id}
+    assert vector_sync.source_organization_id(source) == organization_id
+
+
+@pytest.mark.parametrize("source_type, method", [
+    (models.KnowledgeSourceTypeEnum.FILE, "process_file"),
+    (models.KnowledgeSourceTypeEnum.ARTICLE, "process_article"),
+    (models.KnowledgeSourceTypeEnum.QNA, "process_qa"),
+])
+def test_organization_source_is_ingested_into_organization_knowledge_base(monkeypatch, source_type, method):
+    calls = []
+
+    async def record(workspace_id, source_id, *args, organization_id=None):
+        calls.append((workspace_id, source_id, organization_id))
+
+    monkeypatch.setattr(vector_sync.ai_client, method, record)
+    organization_id = uuid4()
+    source = _source(organization_id=organization_id)
+    source.type = source_type
+    source.content = {"content": "text", "question": "q", "answer": "a"}
+
+    asyncio.run(vector_sync._ingest(source, organization_id, organization_id))
+    assert calls == [(organization_id, source.id, organization_id)]